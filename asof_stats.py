@@ -0,0 +1,277 @@
+import argparse
+import zipfile
+
+import numpy as np
+
+from atomic_files import atomic_file
+from btts_matrix import BttsMatrix
+from data_paths import add_data_arguments, data_dir_from_args, data_files
+from match_store import load_match_store, reuse_or_rebuild
+from predictions import team_esely
+from stats_kernel import store_arrays
+from windowed_stats import add_window_arguments
+
+# "As of" statistics at any point of the match history.
+#
+# Every team and head-to-head pairing keeps the store rows of its matches and running
+# (prefix) sums of its counters after each of them. A statistic as of a match_ID, or
+# over a range of match_IDs, is then the difference of two prefix sums found by binary
+# search, instead of a rerun of the scripts on a truncated formatted_results.json.
+# New results extend the arrays in place. The index is saved to asof_index.npz in the
+# data folder, so a script only reads it and adds the results that came since.
+
+# Counters kept per team, named as in TeamAggregates; OMSZ is the number of prefix sums
+TEAM_COUNTERS = ("MCSGM", "TotalWins", "TotalDraws", "TotalLosses", "GoalsFor", "GoalsAgainst")
+
+# Pairings are keyed by home_id * PAIR_STRIDE + away_id (team IDs are int8)
+PAIR_STRIDE = 128
+
+
+# Rows of a 1- or 2-dimensional array that grows by appending, with doubling capacity
+class GrowingArray:
+    def __init__(self, width=None, dtype=np.int64):
+        shape = (16,) if width is None else (16, width)
+        self.data = np.zeros(shape, dtype=dtype)
+        self.length = 0
+
+    def append(self, values):
+        end = self.length + len(values)
+        if end > len(self.data):
+            grown = np.zeros((max(end, 2 * len(self.data)),) + self.data.shape[1:], dtype=self.data.dtype)
+            grown[:self.length] = self.data[:self.length]
+            self.data = grown
+        self.data[self.length:end] = values
+        self.length = end
+
+    @property
+    def values(self):
+        return self.data[:self.length]
+
+
+# Store rows of one team's or pairing's matches and its counters summed up to each of them
+class PrefixSeries:
+    def __init__(self, width):
+        self.rows = GrowingArray()
+        self.sums = GrowingArray(width)
+        # Leading zero row, the sums before the first match
+        self.sums.append(np.zeros((1, width), dtype=np.int64))
+
+    def extend(self, rows, values):
+        self.sums.append(self.sums.values[-1] + np.cumsum(values, axis=0))
+        self.rows.append(rows)
+
+    # (matches, counter sums) over the store rows [start, end)
+    def between(self, start, end):
+        rows = self.rows.values
+        first, last = np.searchsorted(rows, (start, end))
+        sums = self.sums.values
+        return int(last - first), sums[last] - sums[first]
+
+
+# Append each group of `keys` to its series, rows in match order
+def extend_series(table, keys, rows, values):
+    order = np.lexsort((rows, keys))
+    keys, rows, values = keys[order], rows[order], values[order]
+    group_keys, starts = np.unique(keys, return_index=True)
+    ends = np.append(starts[1:], keys.size)
+    for key, start, end in zip(group_keys.tolist(), starts, ends):
+        series = table.get(key)
+        if series is None:
+            series = table[key] = PrefixSeries(values.shape[1])
+        series.extend(rows[start:end], values[start:end])
+
+
+class AsOfIndex:
+    def __init__(self):
+        self.match_ids = GrowingArray()
+        # team_id -> PrefixSeries of TEAM_COUNTERS
+        self.teams = {}
+        # home_id * PAIR_STRIDE + away_id -> PrefixSeries of the both-scored count
+        self.pairs = {}
+
+    @property
+    def rows(self):
+        return self.match_ids.length
+
+    @property
+    def last_match_id(self):
+        return int(self.match_ids.values[-1]) if self.rows else 0
+
+    # Add the rows of a match store from row `start` on
+    def extend(self, matches, start=None):
+        start = self.rows if start is None else start
+        match_ids, home_ids, away_ids, home_goals, away_goals = (
+            np.asarray(column[start:], dtype=np.int64) for column in store_arrays(matches))
+        if not match_ids.size:
+            return self
+        rows = np.arange(start, start + match_ids.size)
+        both = (home_goals > 0) & (away_goals > 0)
+        home_win = home_goals > away_goals
+        away_win = home_goals < away_goals
+        draw = home_goals == away_goals
+
+        home_values = np.column_stack((both, home_win, draw, away_win, home_goals, away_goals))
+        away_values = np.column_stack((both, away_win, draw, home_win, away_goals, home_goals))
+        extend_series(self.teams, np.concatenate((home_ids, away_ids)), np.concatenate((rows, rows)),
+                      np.concatenate((home_values, away_values)).astype(np.int64))
+        extend_series(self.pairs, home_ids * PAIR_STRIDE + away_ids, rows, both.astype(np.int64)[:, None])
+        self.match_ids.append(match_ids)
+        return self
+
+    # Store row range of the matches after match_ID `since` up to and including `until`
+    # (None: from the first, or up to the last match)
+    def row_range(self, until=None, since=None):
+        match_ids = self.match_ids.values
+        end = self.rows if until is None else int(np.searchsorted(match_ids, until, side='right'))
+        start = 0 if since is None else int(np.searchsorted(match_ids, since, side='right'))
+        return start, max(start, end)
+
+    # TeamAggregates-style counters of a team over a range of match_IDs
+    def team_counts(self, team_id, until=None, since=None):
+        counts = {"OMSZ": 0, **dict.fromkeys(TEAM_COUNTERS, 0)}
+        series = self.teams.get(team_id)
+        if series is not None:
+            matches, sums = series.between(*self.row_range(until, since))
+            counts["OMSZ"] = matches
+            counts.update(zip(TEAM_COUNTERS, sums.tolist()))
+        return counts
+
+    # {team_id: counters} of every team that played in the range
+    def all_team_counts(self, until=None, since=None):
+        counts = {team_id: self.team_counts(team_id, until, since) for team_id in self.teams}
+        return {team_id: team for team_id, team in counts.items() if team["OMSZ"]}
+
+    # (both_score, matches) of a home/away pairing over a range of match_IDs
+    def pair_counts(self, home_id, away_id, until=None, since=None):
+        series = self.pairs.get(home_id * PAIR_STRIDE + away_id)
+        if series is None:
+            return 0, 0
+        matches, sums = series.between(*self.row_range(until, since))
+        return int(sums[0]), matches
+
+    # Head-to-head matrix over a range of match_IDs
+    def head_to_head(self, until=None, since=None):
+        start, end = self.row_range(until, since)
+        pairs = {}
+        for key, series in self.pairs.items():
+            matches, sums = series.between(start, end)
+            if matches:
+                pairs[divmod(key, PAIR_STRIDE)] = {"matches": matches, "both_score": int(sums[0])}
+        return BttsMatrix.from_pairs(pairs)
+
+    # Arrays for np.savez: the series of all teams and of all pairings concatenated
+    def to_arrays(self):
+        arrays = {"match_ids": self.match_ids.values}
+        for name, table, width in (("teams", self.teams, len(TEAM_COUNTERS)), ("pairs", self.pairs, 1)):
+            keys = sorted(table)
+            arrays[f"{name}_keys"] = np.array(keys, dtype=np.int64)
+            arrays[f"{name}_lengths"] = np.array([table[key].rows.length for key in keys], dtype=np.int64)
+            arrays[f"{name}_rows"] = np.concatenate([np.zeros(0, dtype=np.int64)]
+                                                    + [table[key].rows.values for key in keys])
+            # Without the leading zero row of each series
+            arrays[f"{name}_sums"] = np.concatenate([np.zeros((0, width), dtype=np.int64)]
+                                                    + [table[key].sums.values[1:] for key in keys])
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        index = cls()
+        index.match_ids.append(arrays["match_ids"])
+        for name, table, width in (("teams", index.teams, len(TEAM_COUNTERS)), ("pairs", index.pairs, 1)):
+            lengths, rows, sums = arrays[f"{name}_lengths"], arrays[f"{name}_rows"], arrays[f"{name}_sums"]
+            if sums.shape != (rows.size, width) or lengths.sum() != rows.size:
+                raise ValueError(f"inconsistent {name} series")
+            ends = np.cumsum(lengths)
+            for key, start, end in zip(arrays[f"{name}_keys"].tolist(), (ends - lengths).tolist(), ends.tolist()):
+                series = table[key] = PrefixSeries(width)
+                series.rows.append(rows[start:end])
+                series.sums.append(sums[start:end])
+        return index
+
+
+# Index of a match store, or the given index extended with the rows appended since it was built
+def update_asof_index(matches, index=None):
+    if index is None:
+        return AsOfIndex().extend(matches)
+    return reuse_or_rebuild(index, matches, AsOfIndex, "as-of index").extend(matches)
+
+
+# Load the saved index, starting empty when there is none
+def load_asof_index(file_path):
+    try:
+        with np.load(file_path) as data:
+            return AsOfIndex.from_arrays({name: data[name] for name in data.files})
+    except FileNotFoundError:
+        return AsOfIndex()
+    except (ValueError, KeyError, OSError, zipfile.BadZipFile) as e:
+        print(f"Warning: Ignoring unreadable as-of index {file_path}. Reason: {e}")
+        return AsOfIndex()
+
+
+def save_asof_index(index, file_path):
+    with atomic_file(file_path, binary=True) as f:
+        np.savez(f, **index.to_arrays())
+
+
+# Bring the saved index of a formatted_results.json up to date and return it
+def update_asof_index_file(formatted_results_path, index_path):
+    loaded = load_asof_index(index_path)
+    previous_rows = loaded.rows
+    with load_match_store(formatted_results_path) as matches:
+        index = update_asof_index(matches, loaded)
+    if index is not loaded or index.rows != previous_rows:
+        try:
+            save_asof_index(index, index_path)
+        except IOError as e:
+            print(f"Error: Could not save as-of index to {index_path}. Reason: {e}")
+    return index
+
+
+# Esély per team and the head-to-head matrix of a formatted_results.json as of a match_ID;
+# with `index_path` the index is read from (and kept up to date in) that file
+def as_of_features(formatted_results_path, until, since=None, index_path=None):
+    if index_path is None:
+        with load_match_store(formatted_results_path) as matches:
+            index = update_asof_index(matches)
+    else:
+        index = update_asof_index_file(formatted_results_path, index_path)
+    return team_esely(index.all_team_counts(until, since)), index.head_to_head(until, since)
+
+
+# --as-of MATCH_ID of a plain script's command line, None when it is not given. It cannot be
+# combined with --window or --half-life.
+def script_as_of():
+    parser = argparse.ArgumentParser(add_help=False)
+    add_window_arguments(parser).add_argument("--as-of", type=int)
+    args, _ = parser.parse_known_args()
+    return args.as_of
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Team and head-to-head statistics as of a point in the match history.")
+    add_data_arguments(parser)
+    parser.add_argument("--as-of", type=int, help="last match_ID to count (default: the whole history)")
+    parser.add_argument("--since", type=int, help="only count the matches after this match_ID")
+    parser.add_argument("--team", type=int, action="append", default=[], help="team ID to report (repeatable)")
+    parser.add_argument("--pair", type=int, nargs=2, action="append", default=[], metavar=("HOME_ID", "AWAY_ID"),
+                        help="home/away pairing to report (repeatable)")
+    args = parser.parse_args()
+
+    files = data_files(data_dir_from_args(args))
+    index = update_asof_index_file(files["formatted_results"], files["asof_index"])
+    start, end = index.row_range(args.as_of, args.since)
+    print(f"Matches {start + 1}-{end} of {index.rows}")
+    for team_id in args.team or sorted(index.teams):
+        counts = index.team_counts(team_id, args.as_of, args.since)
+        esely = counts["MCSGM"] / counts["OMSZ"] * 100 if counts["OMSZ"] else 0
+        print(f"Team {team_id}: Esély {esely:.2f}% ({counts['MCSGM']}/{counts['OMSZ']}), "
+              f"W/D/L {counts['TotalWins']}/{counts['TotalDraws']}/{counts['TotalLosses']}, "
+              f"goals {counts['GoalsFor']}:{counts['GoalsAgainst']}")
+    for home_id, away_id in args.pair:
+        both_score, played = index.pair_counts(home_id, away_id, args.as_of, args.since)
+        percentage = both_score / played * 100 if played else 0
+        print(f"{home_id} vs {away_id}: {both_score}/{played} - {percentage:.2f}%")
+
+
+if __name__ == "__main__":
+    main()
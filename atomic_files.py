@@ -0,0 +1,45 @@
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+# Whole-file writes that readers never see half-done.
+#
+# The content goes to a temporary file next to the target, which then replaces it. The
+# scripts, the daemon and the watcher can write into the same data folder at the same
+# time, so every writer gets its own uniquely named temporary file.
+
+
+# Open a temporary file for `file_path`; it replaces the target when the block succeeds
+# and is removed when it fails
+@contextmanager
+def atomic_file(file_path, binary=False):
+    file_path = Path(file_path)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{file_path.name}.", suffix=".tmp", dir=file_path.parent)
+    try:
+        os.chmod(tmp_path, 0o644)
+        if binary:
+            f = os.fdopen(fd, 'wb')
+        else:
+            f = os.fdopen(fd, 'w', encoding='utf-8')
+        with f:
+            yield f
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def write_text_atomic(file_path, text):
+    with atomic_file(file_path) as f:
+        f.write(text)
+
+
+# json.dump into `file_path`; keyword arguments go to json.dump
+def dump_json_atomic(data, file_path, **kwargs):
+    with atomic_file(file_path) as f:
+        json.dump(data, f, **kwargs)
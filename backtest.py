@@ -0,0 +1,187 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from batch_scorer import BatchScorer
+from btts_matrix import BttsMatrix
+from data_paths import add_data_arguments, data_dir_from_args, data_files
+from match_store import load_match_store
+from prediction_config import default_prediction_config, load_prediction_config, scorer_options
+from stats_kernel import store_arrays
+
+# Walk-forward backtest of the prediction formulas.
+#
+# formatted_results.json is replayed round by round. Every round is predicted from the
+# matches before it only, then its results are added to running count arrays, so each
+# step costs O(round) instead of O(history). The rounds are split into folds that run
+# in a process pool; a fold starts from the counts of its prefix.
+
+# The virtual league plays eight fixtures per round
+ROUND_SIZE = 8
+# Rounds that are only learned from, so the first predictions have some history
+WARMUP_ROUNDS = 10
+# Predicted percentages are clipped to [floor, 1 - floor] for the Brier score and log-loss
+PROBABILITY_FLOOR = 0.01
+TOP_PREDICTIONS = 3
+
+
+# Scorer options of each evaluated formula. The penalties and team adjustments are those of
+# prediction_config.json, or the built-in ones without a config path.
+def backtest_variants(prediction_config_path=None):
+    if prediction_config_path is None:
+        formula, logikai = default_prediction_config("formula"), default_prediction_config("logikai")
+    else:
+        formula = load_prediction_config(prediction_config_path, "formula")
+        logikai = load_prediction_config(prediction_config_path, "logikai")
+    return {
+        "esely_only": None,
+        "head_to_head_only": None,
+        "formula": {"penalty_teams": None},
+        "formula_penalties": scorer_options(formula, adjustments=False),
+        "logikai": scorer_options(logikai),
+    }
+
+
+# Both-scored and match counts per team and per (home_id, away_id) of a slice of matches
+def count_matches(home_ids, away_ids, both_scored, size):
+    team_matches = np.bincount(home_ids, minlength=size) + np.bincount(away_ids, minlength=size)
+    team_both = np.bincount(home_ids, both_scored, minlength=size) + np.bincount(away_ids, both_scored, minlength=size)
+    pair_index = home_ids * size + away_ids
+    pair_matches = np.bincount(pair_index, minlength=size * size).reshape(size, size)
+    pair_both = np.bincount(pair_index, both_scored, minlength=size * size).reshape(size, size)
+    return team_matches, team_both.astype(np.int64), pair_matches, pair_both.astype(np.int64)
+
+
+# Yield (home_ids, away_ids, both_scored, esely, head_to_head) for each round from
+# first_round to last_round, with the Esély and head-to-head percentage arrays of the
+# matches before the round
+def walk_forward(formatted_results_path, first_round, last_round, round_size=ROUND_SIZE):
+    with load_match_store(formatted_results_path) as matches:
+        _, home_ids, away_ids, home_goals, away_goals = (np.array(column, dtype=np.intp) for column in store_arrays(matches))
+    both_scored = ((home_goals > 0) & (away_goals > 0)).astype(np.intp)
+    size = int(max(home_ids.max(initial=0), away_ids.max(initial=0))) + 1
+
+    start = first_round * round_size
+    team_matches, team_both, pair_matches, pair_both = count_matches(
+        home_ids[:start], away_ids[:start], both_scored[:start], size)
+
+    for round_index in range(first_round, last_round):
+        round_slice = slice(round_index * round_size, (round_index + 1) * round_size)
+        home, away, outcome = home_ids[round_slice], away_ids[round_slice], both_scored[round_slice]
+        if not home.size:
+            break
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            esely = np.where(team_matches > 0, team_both / team_matches * 100, 0)
+            btts = np.where(pair_matches > 0, pair_both / pair_matches * 100, 0)
+        yield home, away, outcome, esely, btts
+
+        # Learn the round
+        np.add.at(team_matches, home, 1)
+        np.add.at(team_matches, away, 1)
+        np.add.at(team_both, home, outcome)
+        np.add.at(team_both, away, outcome)
+        np.add.at(pair_matches, (home, away), 1)
+        np.add.at(pair_both, (home, away), outcome)
+
+
+# Per-fixture features of every complete round after the warm-up, as flat arrays
+def round_features(formatted_results_path, warmup_rounds=WARMUP_ROUNDS, round_size=ROUND_SIZE):
+    with load_match_store(formatted_results_path) as matches:
+        rounds = len(matches) // round_size
+    columns = {"home_ids": [], "away_ids": [], "both_scored": [], "home_esely": [], "away_esely": [], "head_to_head": []}
+    for home, away, outcome, esely, btts in walk_forward(formatted_results_path, warmup_rounds, rounds, round_size):
+        for name, values in zip(columns, (home, away, outcome, esely[home], esely[away], btts[home, away])):
+            columns[name].append(values)
+    features = {name: np.concatenate(values) if values else np.zeros(0) for name, values in columns.items()}
+    features["round_size"] = round_size
+    return features
+
+
+# Sums of the metrics of each variant over one fold of rounds
+def backtest_fold(formatted_results_path, first_round, last_round, round_size, variants):
+    size = None
+    scorers = {}
+    totals = {name: {"predictions": 0, "brier": 0.0, "log_loss": 0.0, "top_hits": 0, "top_predictions": 0}
+              for name in variants}
+
+    for home, away, outcome, esely, btts in walk_forward(formatted_results_path, first_round, last_round, round_size):
+        if size is None:
+            size = esely.size
+            scorers = {name: BatchScorer({}, BttsMatrix(), max_team_id=size - 1, **options)
+                       for name, options in variants.items() if options is not None}
+
+        # Predict the round from the counts of the matches before it
+        percentages = {
+            "esely_only": (esely[home] + esely[away]) / 2,
+            "head_to_head_only": btts[home, away],
+        }
+        for name, scorer in scorers.items():
+            scorer.esely[:size] = esely
+            scorer.btts[:size, :size] = btts
+            percentages[name] = scorer.score(home, away)["percentage"]
+
+        for name, percentage in percentages.items():
+            probability = np.clip(percentage / 100, PROBABILITY_FLOOR, 1 - PROBABILITY_FLOOR)
+            total = totals[name]
+            total["predictions"] += home.size
+            total["brier"] += float(((probability - outcome) ** 2).sum())
+            total["log_loss"] -= float(np.where(outcome == 1, np.log(probability), np.log(1 - probability)).sum())
+            top = np.argsort(-percentage, kind='stable')[:TOP_PREDICTIONS]
+            total["top_hits"] += int(outcome[top].sum())
+            total["top_predictions"] += top.size
+    return totals
+
+
+# Replay the history in `folds` folds over `workers` processes and return the metrics per
+# variant; `prediction_config_path` gives the tuned penalties and adjustments
+def run_backtest(formatted_results_path, workers=1, folds=None, warmup_rounds=WARMUP_ROUNDS, round_size=ROUND_SIZE,
+                 prediction_config_path=None):
+    variants = backtest_variants(prediction_config_path)
+    with load_match_store(formatted_results_path) as matches:
+        rounds = -(-len(matches) // round_size)
+    folds = max(1, min(folds or workers, rounds - warmup_rounds)) if rounds > warmup_rounds else 0
+    bounds = np.linspace(warmup_rounds, rounds, folds + 1).astype(int) if folds else []
+    jobs = [(formatted_results_path, int(first), int(last), round_size, variants)
+            for first, last in zip(bounds[:-1], bounds[1:])]
+
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(backtest_fold, *zip(*jobs)))
+    else:
+        results = [backtest_fold(*job) for job in jobs]
+
+    metrics = {}
+    for name in variants:
+        total = {key: sum(result[name][key] for result in results) for key in
+                 ("predictions", "brier", "log_loss", "top_hits", "top_predictions")}
+        predictions = max(total["predictions"], 1)
+        metrics[name] = {
+            "predictions": total["predictions"],
+            "brier": total["brier"] / predictions,
+            "log_loss": total["log_loss"] / predictions,
+            "top3_hit_rate": total["top_hits"] / max(total["top_predictions"], 1) * 100,
+        }
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay the match history and score the prediction formulas.")
+    add_data_arguments(parser)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes to replay with")
+    parser.add_argument("--folds", type=int, help="number of folds (default: one per worker)")
+    parser.add_argument("--warmup", type=int, default=WARMUP_ROUNDS, help="rounds learned before predicting")
+    args = parser.parse_args()
+
+    files = data_files(data_dir_from_args(args))
+    metrics = run_backtest(files["formatted_results"], args.workers, args.folds, args.warmup,
+                           prediction_config_path=files["prediction_config"])
+    for name, values in metrics.items():
+        print(f"{name}: {values['predictions']} predictions, Brier {values['brier']:.4f}, "
+              f"log-loss {values['log_loss']:.4f}, top-3 hit rate {values['top3_hit_rate']:.2f}%")
+
+
+if __name__ == "__main__":
+    main()
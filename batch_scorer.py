@@ -0,0 +1,132 @@
+import argparse
+import json
+
+import numpy as np
+
+from btts_matrix import BttsMatrix
+from data_paths import add_data_arguments, data_dir_from_args, data_files
+from incremental_stats import update_snapshot
+from prediction_config import load_prediction_config, scorer_options
+from predictions import PENALTY_TEAMS, STRONG_BOOST, UNPREDICTABLE_PENALTY, team_esely
+from teams import load_team_registry
+
+# Vectorised "what-if" scoring of any number of fixtures at once.
+#
+# Team Esély, penalties and strong/unpredictable membership become lookup vectors and
+# the head-to-head percentages a matrix, so scoring N (home_id, away_id) pairs is a
+# handful of gathers and masked adds instead of N dict lookups.
+
+
+class BatchScorer:
+    def __init__(self, esely, btts_matrix, penalty_teams=PENALTY_TEAMS, strong_teams=(), unpredictable_teams=(),
+                 strong_boost=STRONG_BOOST, unpredictable_penalty=UNPREDICTABLE_PENALTY, max_team_id=0):
+        ids = list(esely) + list(penalty_teams or {}) + list(strong_teams) + list(unpredictable_teams)
+        self.size = max([max_team_id, btts_matrix.size] + ids) + 1
+
+        self.esely = np.zeros(self.size)
+        for team_id, value in esely.items():
+            self.esely[team_id] = value
+
+        # Head-to-head percentages indexed by [home_id, away_id], 0 for unplayed pairings
+        self.btts = np.zeros((self.size, self.size))
+        if btts_matrix.size:
+            size = btts_matrix.size
+            both_score = np.frombuffer(btts_matrix.both_score, dtype=np.int32).reshape(size, size)
+            matches = np.frombuffer(btts_matrix.matches, dtype=np.int32).reshape(size, size)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                self.btts[1:size + 1, 1:size + 1] = np.where(matches > 0, both_score / matches * 100, 0)
+
+        self.penalty = np.zeros(self.size)
+        for team_id, penalty in (penalty_teams or {}).items():
+            self.penalty[team_id] = penalty
+        self.strong = np.zeros(self.size, dtype=bool)
+        self.strong[list(strong_teams)] = True
+        self.unpredictable = np.zeros(self.size, dtype=bool)
+        self.unpredictable[list(unpredictable_teams)] = True
+        self.strong_boost = strong_boost
+        self.unpredictable_penalty = unpredictable_penalty
+
+    # Score arrays of home and away team IDs. Returns the combined Esély (after the
+    # strong/unpredictable adjustments), the head-to-head percentage and the final
+    # probability after penalties, each as a vector.
+    def score(self, home_ids, away_ids):
+        home_ids = np.asarray(home_ids, dtype=np.intp)
+        away_ids = np.asarray(away_ids, dtype=np.intp)
+        # An unknown team scores like a team without history; the other team keeps its own values
+        home_known = (home_ids >= 0) & (home_ids < self.size)
+        away_known = (away_ids >= 0) & (away_ids < self.size)
+        home_ids = np.where(home_known, home_ids, 0)
+        away_ids = np.where(away_known, away_ids, 0)
+
+        combined_esely = (self.esely[home_ids] + self.esely[away_ids]) / 2
+        combined_esely += np.where(self.strong[home_ids] | self.strong[away_ids], self.strong_boost, 0)
+        combined_esely -= np.where(self.unpredictable[home_ids] | self.unpredictable[away_ids],
+                                   self.unpredictable_penalty, 0)
+        both_teams_to_score = np.where(home_known & away_known, self.btts[home_ids, away_ids], 0)
+        final_probability = (combined_esely + both_teams_to_score) / 2
+        final_probability -= self.penalty[home_ids] + self.penalty[away_ids]
+        return {
+            "combined_esely": combined_esely,
+            "both_teams_to_score": both_teams_to_score,
+            "percentage": final_probability,
+        }
+
+
+# Build a scorer from the aggregates of a history
+def scorer_from_aggregates(aggregates, **options):
+    return BatchScorer(team_esely(aggregates.teams), BttsMatrix.from_pairs(aggregates.pairs), **options)
+
+
+# Every ordered (home_id, away_id) pairing of distinct teams
+def all_pairings(team_ids):
+    team_ids = np.asarray(sorted(team_ids), dtype=np.intp)
+    home_ids, away_ids = np.meshgrid(team_ids, team_ids, indexing='ij')
+    different = home_ids != away_ids
+    return home_ids[different], away_ids[different]
+
+
+# Odds board of every pairing, best first
+def odds_board(scorer, team_ids):
+    home_ids, away_ids = all_pairings(team_ids)
+    scores = scorer.score(home_ids, away_ids)
+    order = np.argsort(-scores["percentage"], kind='stable')
+    return [
+        {
+            "home_team_id": int(home_ids[i]),
+            "away_team_id": int(away_ids[i]),
+            "combined_esely": float(scores["combined_esely"][i]),
+            "both_teams_to_score": float(scores["both_teams_to_score"][i]),
+            "percentage": float(scores["percentage"][i]),
+        }
+        for i in order
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score every possible pairing of the league in one call.")
+    add_data_arguments(parser)
+    parser.add_argument("--logikai", action="store_true",
+                        help="apply the strong/unpredictable team adjustments of winmi/logikaiprediction.py")
+    args = parser.parse_args()
+
+    files = data_files(data_dir_from_args(args))
+    aggregates = update_snapshot(files["formatted_results"], files["snapshot"])
+    config = load_prediction_config(files["prediction_config"], "logikai" if args.logikai else "formula")
+    options = scorer_options(config, adjustments=args.logikai)
+    board = odds_board(scorer_from_aggregates(aggregates, **options), aggregates.teams)
+
+    output_file = files["odds_board"]
+    try:
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(board, f, ensure_ascii=False, indent=4)
+        print(f"Odds board for {len(board)} pairings has been saved to {output_file}")
+    except IOError as e:
+        print(f"Error: Could not save the odds board to {output_file}. Reason: {e}")
+    team_id_map, _ = load_team_registry(files["team_data"])
+    for entry in board[:3]:
+        print(f"{team_id_map.get(entry['home_team_id'])} vs {team_id_map.get(entry['away_team_id'])}"
+              f" - {entry['percentage']:.2f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import gc
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+# Shared modules live in the parent directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from match_store import COLUMNS, Match, MatchStore, convert_json_to_store, store_path_for
+
+# Memory per match and load time of the history kept as
+#   the dicts of json.load(formatted_results.json),
+#   a list of Match records (__slots__) built from them,
+#   the columnar match store.
+#
+# Usage: python benchmarks/bench_match_records.py [match count ...]
+# (default 10^4 10^5 10^6; 10^7 needs several GB of memory for the dict layout)
+
+
+# Write a formatted_results.json of random 16-team results
+def write_synthetic_json(json_path, count, seed=1):
+    rng = np.random.default_rng(seed)
+    home_ids = rng.integers(1, 17, count)
+    away_ids = (home_ids - 1 + rng.integers(1, 16, count)) % 16 + 1
+    home_goals = rng.poisson(1.4, count)
+    away_goals = rng.poisson(1.1, count)
+    with open(json_path, 'w', encoding='utf-8') as f:
+        f.write("[\n")
+        for index in range(count):
+            record = Match(index + 1, int(home_ids[index]), int(away_ids[index]),
+                           int(home_goals[index]), int(away_goals[index])).to_record()
+            f.write(("    " if index == 0 else ",\n    ") + json.dumps(record, ensure_ascii=False))
+        f.write("\n]")
+
+
+# Wall time of a call and the memory its result keeps alive
+def measure(function):
+    gc.collect()
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    del result
+    gc.collect()
+    tracemalloc.start()
+    result = function()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return elapsed, retained, result
+
+
+def load_dicts(json_path):
+    with open(json_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_records(json_path):
+    return [Match.from_record(record) for record in load_dicts(json_path)]
+
+
+def run(directory, count):
+    json_path = Path(directory) / f"results_{count}.json"
+    write_synthetic_json(json_path, count)
+
+    dict_time, dict_bytes, matches = measure(lambda: load_dicts(json_path))
+    del matches
+    record_time, record_bytes, records = measure(lambda: load_records(json_path))
+    del records
+
+    convert_start = time.perf_counter()
+    convert_json_to_store(json_path)
+    convert_time = time.perf_counter() - convert_start
+    open_start = time.perf_counter()
+    with MatchStore(store_path_for(json_path)) as store:
+        open_time = time.perf_counter() - open_start
+        # The columns are mapped files, not heap objects
+        store_bytes = sum(len(getattr(store, name)) * getattr(store, name).itemsize for name, _ in COLUMNS)
+
+    print(f"{count} matches:")
+    print(f"  json.load dicts    {dict_time * 1000:10.1f} ms  {dict_bytes / count:7.1f} bytes/match")
+    print(f"  Match records      {record_time * 1000:10.1f} ms  {record_bytes / count:7.1f} bytes/match")
+    print(f"  match store        {open_time * 1000:10.1f} ms  {store_bytes / count:7.1f} bytes/match"
+          f"  (one-off conversion {convert_time * 1000:.1f} ms)")
+    json_path.unlink()
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or [10 ** 4, 10 ** 5, 10 ** 6]
+    with tempfile.TemporaryDirectory() as directory:
+        for count in counts:
+            run(directory, count)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+# Shared modules live in the parent directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from match_store import open_match_store
+from simulator import GoalModel, simulate_round, simulate_season
+
+# Throughput of the Monte Carlo simulator in simulations per second, for one round of
+# eight fixtures and for a whole 240-fixture virtual season, with one process and with
+# a process pool.
+#
+# Usage: python benchmarks/bench_simulator.py [formatted_results.json] [round simulations] [season simulations]
+
+ROUND_FIXTURES = ([2, 15, 7, 12, 8, 6, 4, 5], [16, 14, 9, 3, 1, 10, 11, 13])
+
+
+def run(label, simulate, count):
+    start = time.perf_counter()
+    simulate(count)
+    elapsed = time.perf_counter() - start
+    print(f"{label}: {count} simulations in {elapsed:.2f} s, {count / elapsed:,.0f} simulations/s")
+
+
+def main():
+    json_path = sys.argv[1] if len(sys.argv) > 1 else str(Path(__file__).resolve().parent.parent / "formatted_results.json")
+    round_count = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000_000
+    season_count = int(sys.argv[3]) if len(sys.argv) > 3 else 100_000
+    workers = os.cpu_count() or 1
+
+    with open_match_store(json_path) as matches:
+        models = {"poisson": GoalModel.fit(matches, dixon_coles=False), "dixon-coles": GoalModel.fit(matches)}
+
+    for name, model in models.items():
+        for processes in sorted({1, workers}):
+            run(f"{name} round, {processes} process(es)",
+                lambda count: simulate_round(model, *ROUND_FIXTURES, count, processes, seed=1), round_count)
+            run(f"{name} season, {processes} process(es)",
+                lambda count: simulate_season(model, range(1, 17), count, processes, seed=1), season_count)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Shared modules live in the parent directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from match_store import MatchStore, STORE_VERSION, open_match_store, write_columns, write_meta
+from stats_kernel import compute_aggregates
+from team_aggregates import TeamAggregates
+
+# Compare the per-match TeamAggregates loop with the vectorised stats kernel.
+#
+# Usage: python benchmarks/bench_stats_kernel.py [formatted_results.json] [synthetic match count]
+
+
+# Build a store of random 16-team results in a temporary directory
+def synthetic_store(directory, count, seed=1):
+    rng = np.random.default_rng(seed)
+    home_ids = rng.integers(1, 17, count, dtype=np.int8)
+    away_ids = ((home_ids - 1 + rng.integers(1, 16, count, dtype=np.int8)) % 16 + 1).astype(np.int8)
+    columns = {
+        "match_id": np.arange(1, count + 1, dtype=np.int32),
+        "home_id": home_ids,
+        "away_id": away_ids,
+        "home_goals": rng.poisson(1.4, count).astype(np.int8),
+        "away_goals": rng.poisson(1.1, count).astype(np.int8),
+    }
+    store_path = Path(directory) / "synthetic.store"
+    store_path.mkdir()
+    write_columns(store_path, columns)
+    write_meta(store_path, {"version": STORE_VERSION, "byteorder": sys.byteorder, "rows": count})
+    return MatchStore(store_path)
+
+
+# Best wall time of `repeat` runs
+def best_time(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None or elapsed < best else best
+    return best, result
+
+
+def loop_aggregates(matches):
+    aggregates = TeamAggregates()
+    aggregates.add_matches(matches)
+    return aggregates
+
+
+def run(label, matches, repeat):
+    loop_time, loop_result = best_time(lambda: loop_aggregates(matches), repeat)
+    kernel_time, kernel_result = best_time(lambda: compute_aggregates(matches), repeat)
+    same = (loop_result.teams == kernel_result.teams and list(loop_result.teams) == list(kernel_result.teams)
+            and loop_result.pairs == kernel_result.pairs)
+    print(f"{label}: {len(matches)} matches, loop {loop_time * 1000:.1f} ms, "
+          f"kernel {kernel_time * 1000:.1f} ms, speedup {loop_time / kernel_time:.1f}x, identical: {same}")
+
+
+def main():
+    json_path = sys.argv[1] if len(sys.argv) > 1 else str(Path(__file__).resolve().parent.parent / "formatted_results.json")
+    synthetic_count = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000_000
+
+    with open_match_store(json_path) as matches:
+        run("formatted_results.json", matches, repeat=5)
+
+    with tempfile.TemporaryDirectory() as directory:
+        with synthetic_store(directory, synthetic_count) as matches:
+            run("synthetic", matches, repeat=1)
+
+
+if __name__ == "__main__":
+    main()
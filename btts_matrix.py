@@ -0,0 +1,96 @@
+import array
+import json
+
+import numpy as np
+
+from atomic_files import dump_json_atomic
+
+# Dense head-to-head "both teams scored" matrix.
+#
+# Cell [home_id - 1][away_id - 1] holds how many times the pairing was played with
+# home_id at home and in how many of those matches both teams scored. It replaces
+# regex lookups in both_teams_score_stats.txt with a constant-time index.
+
+
+class BttsMatrix:
+    def __init__(self, size=0, both_score=None, matches=None):
+        self.size = size
+        # Flat row-major N x N counts
+        self.both_score = array.array('i', both_score or [0] * (size * size))
+        self.matches = array.array('i', matches or [0] * (size * size))
+
+    # Build the matrix from {(home_id, away_id): {"matches": n, "both_score": n}}
+    @classmethod
+    def from_pairs(cls, pairs):
+        size = max((max(home_id, away_id) for home_id, away_id in pairs), default=0)
+        matrix = cls(size)
+        for (home_id, away_id), pair in pairs.items():
+            if home_id < 1 or away_id < 1:
+                continue
+            index = (home_id - 1) * size + away_id - 1
+            matrix.both_score[index] = pair["both_score"]
+            matrix.matches[index] = pair["matches"]
+        return matrix
+
+    def _index(self, home_id, away_id):
+        if 1 <= home_id <= self.size and 1 <= away_id <= self.size:
+            return (home_id - 1) * self.size + away_id - 1
+        return None
+
+    # (both_score, matches) for a pairing, (0, 0) if it was never played
+    def counts(self, home_id, away_id):
+        index = self._index(home_id, away_id)
+        if index is None:
+            return 0, 0
+        return self.both_score[index], self.matches[index]
+
+    # Percentage of the pairing's matches where both teams scored
+    def percentage(self, home_id, away_id):
+        both_score, matches = self.counts(home_id, away_id)
+        return both_score / matches * 100 if matches > 0 else 0
+
+    # Percentages for a whole round of (home_id, away_id) pairs in one gather
+    def percentages(self, pairs):
+        ids = np.asarray(pairs, dtype=np.intp).reshape(-1, 2)
+        home_ids, away_ids = ids[:, 0], ids[:, 1]
+        known = (home_ids >= 1) & (home_ids <= self.size) & (away_ids >= 1) & (away_ids <= self.size)
+        index = np.where(known, (home_ids - 1) * self.size + away_ids - 1, 0)
+        both_score = np.frombuffer(self.both_score, dtype=np.int32)
+        matches = np.frombuffer(self.matches, dtype=np.int32)
+        if not matches.size:
+            return [0.0] * len(ids)
+        played = known & (matches[index] > 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(played, both_score[index] / matches[index] * 100, 0.0).tolist()
+
+    def to_dict(self):
+        rows = range(0, self.size * self.size, self.size or 1)
+        return {
+            "size": self.size,
+            "both_score": [list(self.both_score[start:start + self.size]) for start in rows],
+            "matches": [list(self.matches[start:start + self.size]) for start in rows],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        size = int(data["size"])
+        both_score = [value for row in data["both_score"] for value in row]
+        matches = [value for row in data["matches"] for value in row]
+        if len(both_score) != size * size or len(matches) != size * size:
+            raise ValueError(f"Matrix data does not match its size {size}")
+        return cls(size, both_score, matches)
+
+
+# Save the matrix as a JSON sidecar of both_teams_score_stats.txt
+def write_btts_matrix(matrix, file_path):
+    dump_json_atomic(matrix.to_dict(), file_path)
+
+
+# Error-handled matrix loading, an empty matrix when the sidecar is unusable
+def load_btts_matrix(file_path):
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return BttsMatrix.from_dict(json.load(f))
+    except (FileNotFoundError, json.JSONDecodeError, KeyError, ValueError, TypeError) as e:
+        print(f"Error: Unable to load {file_path}. Reason: {e}")
+        return BttsMatrix()
@@ -0,0 +1,115 @@
+import argparse
+import os
+import re
+from pathlib import Path
+
+# Where every script finds its input files and writes its outputs.
+#
+# A data directory holds the files of one league (formatted_results.json,
+# upcoming_round_matches.txt, ...). Leagues live side by side under a data root: the
+# default league uses the root itself and any other league a subdirectory named after
+# it, as winmi/ does. The directory is resolved, first match wins, from
+#   --data-dir, or --league/--data-root on the command line,
+#   PREDICTION_DATA_DIR, or PREDICTION_LEAGUE/PREDICTION_DATA_ROOT in the environment,
+#   the script's own default league (winmi/logikaiprediction.py uses winmi),
+#   the folder of the scripts.
+
+DATA_DIR_ENV = "PREDICTION_DATA_DIR"
+DATA_ROOT_ENV = "PREDICTION_DATA_ROOT"
+LEAGUE_ENV = "PREDICTION_LEAGUE"
+DEFAULT_DATA_ROOT = Path(__file__).resolve().parent
+
+LEAGUE_NAME = re.compile(r'^[\w.-]+$')
+
+# File name of every artifact inside a data directory
+ARTIFACTS = {
+    "round_pairings": 'upcoming_round_matches.txt',
+    "team_data": 'vsport_teamdata.json',
+    "results_feed": 'csvjson3.json',
+    "ingest_state": 'ingest_state.json',
+    "formatted_results": 'formatted_results.json',
+    "snapshot": 'stats_snapshot.json',
+    "feature_cache": 'feature_cache.json',
+    "windowed_snapshot": 'windowed_snapshot.json',
+    "asof_index": 'asof_index.npz',
+    "ratings": 'ratings_checkpoints.json',
+    "upcoming_matches": 'upcoming_matches.json',
+    "pluszpont": 'pluszpont.txt',
+    "team_statistics": 'team_statistics.csv',
+    "both_teams_score_stats": 'both_teams_score_stats.txt',
+    "both_teams_score_matrix": 'both_teams_score_matrix.json',
+    "prediction_config": 'prediction_config.json',
+    "odds_board": 'odds_board.json',
+    "simulation": 'simulation.json',
+    "score_cube": 'score_cube.json',
+    "market_board": 'market_board.json',
+    "prediction_sequence": 'prediction_sequence.txt',
+    "prediction_archive": 'prediction_archive.jsonl',
+    "database": 'matches.db',
+}
+
+
+def data_root(root=None):
+    return Path(root or os.environ.get(DATA_ROOT_ENV) or DEFAULT_DATA_ROOT)
+
+
+# Data directory of a league; None is the default league in the root itself
+def league_dir(league=None, root=None):
+    if not league:
+        return data_root(root)
+    if not LEAGUE_NAME.match(league) or league in ('.', '..'):
+        raise ValueError(f"Invalid league name: {league!r}")
+    return data_root(root) / league
+
+
+# `default_league` only applies when neither the arguments nor the environment name a league
+def resolve_data_dir(data_dir=None, league=None, root=None, default_league=None):
+    if data_dir:
+        return Path(data_dir)
+    if not league and not root and os.environ.get(DATA_DIR_ENV):
+        return Path(os.environ[DATA_DIR_ENV])
+    return league_dir(league or os.environ.get(LEAGUE_ENV) or default_league, root)
+
+
+# Paths of the files read and written inside a data directory
+def data_files(data_dir=None):
+    data_dir = resolve_data_dir(data_dir)
+    files = {name: data_dir / file_name for name, file_name in ARTIFACTS.items()}
+    # Numbered prediction files and per-team reports go straight into the directory
+    files["predictions"] = data_dir
+    files["data_dir"] = data_dir
+    return files
+
+
+# Leagues under a data root: the root itself (None) and every subdirectory with a history
+def list_leagues(root=None):
+    root = data_root(root)
+    leagues = []
+    if (root / ARTIFACTS["formatted_results"]).exists():
+        leagues.append(None)
+    if root.is_dir():
+        leagues.extend(sorted(entry.name for entry in root.iterdir()
+                              if entry.is_dir() and LEAGUE_NAME.match(entry.name)
+                              and (entry / ARTIFACTS["formatted_results"]).exists()))
+    return leagues
+
+
+# `league` is the script's default league, used when neither --league nor the environment sets one
+def add_data_arguments(parser, league=None):
+    parser.add_argument("--data-dir", help=f"folder with the input and output files (overrides ${DATA_DIR_ENV})")
+    parser.add_argument("--league", help=f"league subfolder of the data root (${LEAGUE_ENV})")
+    parser.add_argument("--data-root", help=f"folder holding the leagues (${DATA_ROOT_ENV})")
+    parser.set_defaults(default_league=league)
+
+
+def data_dir_from_args(args):
+    return resolve_data_dir(args.data_dir, args.league, args.data_root, getattr(args, "default_league", None))
+
+
+# Data files of a plain script: the data options are read from the command line and
+# anything else on it is left alone
+def script_data_files(league=None):
+    parser = argparse.ArgumentParser(add_help=False)
+    add_data_arguments(parser, league)
+    args, _ = parser.parse_known_args()
+    return data_files(data_dir_from_args(args))
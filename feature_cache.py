@@ -0,0 +1,132 @@
+import json
+import zlib
+from pathlib import Path
+
+from atomic_files import dump_json_atomic
+from btts_matrix import BttsMatrix
+from data_paths import script_data_files
+from incremental_stats import update_snapshot
+from match_store import load_match_store, source_fingerprint
+from predictions import team_esely
+from ratings import update_ratings
+
+# On-disk cache of the team features the prediction scripts read.
+#
+# feature_cache.json holds the Esély of every team, the head-to-head matrix, the most
+# frequent opponents and the current ratings, together with the key they were computed
+# for: the size and mtime of formatted_results.json and a checksum of the code that
+# computes them. A run whose key matches reads the file and does no aggregation at all;
+# otherwise the features are rebuilt from the aggregate snapshot and the rating
+# checkpoints, which only fold in the new results, and the cache is rewritten.
+
+FEATURE_CACHE_VERSION = 1
+TOP_OPPONENTS = 3
+
+# Modules whose code produces the cached features; editing one invalidates the cache
+FEATURE_MODULES = (
+    "feature_cache.py", "incremental_stats.py", "stats_kernel.py", "team_aggregates.py",
+    "ratings.py", "predictions.py", "btts_matrix.py", "match_store.py",
+)
+
+
+# Checksum of the feature code
+def code_fingerprint():
+    checksum = 0
+    for module in FEATURE_MODULES:
+        with open(Path(__file__).resolve().parent / module, 'rb') as f:
+            checksum = zlib.crc32(f.read(), checksum)
+    return checksum
+
+
+# Key of the features of a formatted_results.json; None when the file cannot be checked
+def feature_key(formatted_results_path):
+    try:
+        source = source_fingerprint(formatted_results_path)
+    except FileNotFoundError:
+        return None
+    return {"version": FEATURE_CACHE_VERSION, "code": code_fingerprint(), "source": source}
+
+
+# Compute the features from the aggregate snapshot and the rating checkpoints
+def compute_team_features(files):
+    aggregates = update_snapshot(files["formatted_results"], files["snapshot"])
+    with load_match_store(files["formatted_results"]) as matches:
+        ratings = update_ratings(matches, files["ratings"])
+    return {
+        "rows": aggregates.rows,
+        "last_match_id": aggregates.last_match_id,
+        "esely": team_esely(aggregates.teams),
+        "btts_matrix": BttsMatrix.from_pairs(aggregates.pairs),
+        "top_opponents": {team_id: aggregates.top_opponents(team_id, TOP_OPPONENTS) for team_id in aggregates.teams},
+        "ratings": {team_id: {key: team[key] for key in ("elo", "rating", "rd")}
+                    for team_id, team in ratings.teams.items()},
+    }
+
+
+def features_to_dict(features, key):
+    return {
+        "key": key,
+        "rows": features["rows"],
+        "last_match_id": features["last_match_id"],
+        "esely": [[team_id, esely] for team_id, esely in features["esely"].items()],
+        "btts_matrix": features["btts_matrix"].to_dict(),
+        "top_opponents": [[team_id, [list(opponent) for opponent in opponents]]
+                          for team_id, opponents in features["top_opponents"].items()],
+        "ratings": [[team_id, rating] for team_id, rating in features["ratings"].items()],
+    }
+
+
+def features_from_dict(data):
+    return {
+        "rows": int(data["rows"]),
+        "last_match_id": int(data["last_match_id"]),
+        "esely": {int(team_id): float(esely) for team_id, esely in data["esely"]},
+        "btts_matrix": BttsMatrix.from_dict(data["btts_matrix"]),
+        "top_opponents": {int(team_id): [(int(opponent_id), int(matches)) for opponent_id, matches in opponents]
+                          for team_id, opponents in data["top_opponents"]},
+        "ratings": {int(team_id): {key: float(value) for key, value in rating.items()}
+                    for team_id, rating in data["ratings"]},
+    }
+
+
+# Cached features whose key matches, None when there are none
+def read_feature_cache(file_path, key):
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get("key") != key:
+            return None
+        return features_from_dict(data)
+    except FileNotFoundError:
+        return None
+    except (json.JSONDecodeError, KeyError, ValueError, TypeError) as e:
+        print(f"Warning: Ignoring unreadable feature cache {file_path}. Reason: {e}")
+        return None
+
+
+def save_feature_cache(features, key, file_path):
+    dump_json_atomic(features_to_dict(features, key), file_path)
+
+
+# Team features of a data folder, from the cache when formatted_results.json is unchanged
+def load_team_features(files):
+    key = feature_key(files["formatted_results"])
+    if key is not None:
+        features = read_feature_cache(files["feature_cache"], key)
+        if features is not None:
+            return features
+    features = compute_team_features(files)
+    # A history that changed while it was being read is cached on the next run
+    if key is not None and key == feature_key(files["formatted_results"]):
+        try:
+            save_feature_cache(features, key, files["feature_cache"])
+        except IOError as e:
+            print(f"Error: Could not save feature cache to {files['feature_cache']}. Reason: {e}")
+    return features
+
+
+if __name__ == "__main__":
+    files = script_data_files()
+    features = load_team_features(files)
+    print(f"Team features of {features['rows']} matches (last match_ID {features['last_match_id']}) "
+          f"are cached in {files['feature_cache']}")
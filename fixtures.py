@@ -0,0 +1,117 @@
+import json
+import re
+
+# Upcoming round fixtures: parsing upcoming_round_matches.txt into the
+# upcoming_matches.json records and finding the "+ 5 %" top opponent pairings.
+
+# Whitespace and "# ..." comments between the tokens of the pairing list
+_GAP = r"(?:\s|#[^\n]*)*"
+# A quoted team name without escapes
+_NAME = r"""(?:'([^'\\\n]*)'|"([^"\\\n]*)")"""
+_SKIP = re.compile(_GAP)
+_LIST_START = re.compile(_GAP + r"\[")
+_LIST_END = re.compile(_GAP + r"\]" + _GAP + r"\Z")
+_PAIRING = re.compile(_GAP + r"\(" + _GAP + _NAME + _GAP + "," + _GAP + _NAME + _GAP + ",?" + _GAP + r"\)"
+                      + _GAP + "(,?)")
+
+
+# Parse the pairing list of upcoming_round_matches.txt:
+#   header line
+#   merkozesek = [
+#     ('Brentford', 'Wolverhampton'),   # comment
+#     ...
+#   ]
+# Only a list of quoted (home, away) name pairs is accepted; anything else raises
+# ValueError with the line it was found on.
+def parse_round_pairings(content):
+    _, separator, body = content.partition('=')
+    if not separator:
+        raise ValueError("no '=' before the pairing list")
+    offset = len(content) - len(body)
+
+    def error(position, message):
+        line = content.count("\n", 0, offset + _SKIP.match(body, position).end()) + 1
+        return ValueError(f"{message} on line {line}")
+
+    start = _LIST_START.match(body)
+    if not start:
+        raise error(0, "expected '['")
+    pairings = []
+    position, separated = start.end(), True
+    while not _LIST_END.match(body, position):
+        pairing = _PAIRING.match(body, position)
+        if not pairing:
+            raise error(position, "expected a ('home team', 'away team') pair or the closing ']'")
+        if not separated:
+            raise error(position, "missing ',' between pairs")
+        home_single, home_double, away_single, away_double, comma = pairing.groups()
+        pairings.append((home_double if home_single is None else home_single,
+                         away_double if away_single is None else away_single))
+        position, separated = pairing.end(), bool(comma)
+    return pairings
+
+
+# Read the match pairings from the text file with error handling
+def load_round_pairings(input_file_path):
+    try:
+        with open(input_file_path, 'r', encoding='utf-8') as file:
+            return parse_round_pairings(file.read())
+    except FileNotFoundError:
+        print(f"Error: The file '{input_file_path}' was not found.")
+    except ValueError as e:
+        print(f"Error: Failed to parse the file '{input_file_path}'. Reason: {e}")
+    return []
+
+
+# Turn (home team, away team) name pairs into upcoming match records
+def build_match_list(pairings, team_ids):
+    match_list = []
+    for index, (home_team, away_team) in enumerate(pairings, start=1):
+        # Check if the teams are valid and exist in the team_ids dictionary
+        if home_team not in team_ids:
+            print(f"Error: Home team '{home_team}' not found in team list. Skipping match.")
+            continue
+        if away_team not in team_ids:
+            print(f"Error: Away team '{away_team}' not found in team list. Skipping match.")
+            continue
+
+        # Create a dictionary for the match information
+        match_list.append({
+            "match_number": index,
+            "home_team": home_team,
+            "away_team": away_team,
+            "home_team_id": team_ids[home_team],
+            "away_team_id": team_ids[away_team]
+        })
+    return match_list
+
+
+# "+ 5 %" lines for fixtures where one team is among the other's top opponents.
+# `rivals` is a rivalry_index.RivalryIndex; each pairing is listed once, either way round.
+def find_pluszpont(match_list, rivals):
+    pluszpont_content = []
+    listed = set()
+    for match in match_list:
+        pairing = frozenset((match["home_team_id"], match["away_team_id"]))
+        if pairing in listed:
+            continue
+        for team, opponent, team_id, opponent_id in (
+                (match["home_team"], match["away_team"], match["home_team_id"], match["away_team_id"]),
+                (match["away_team"], match["home_team"], match["away_team_id"], match["home_team_id"])):
+            if rivals.is_rival(team_id, opponent_id):
+                pluszpont_content.append(f"{team} - {opponent} : + 5 %")
+                listed.add(pairing)
+                break
+    return pluszpont_content
+
+
+# Save the upcoming match records to upcoming_matches.json
+def write_match_list(match_list, output_file_path):
+    with open(output_file_path, 'w', encoding='utf-8') as json_file:
+        json.dump(match_list, json_file, ensure_ascii=False, indent=4)
+
+
+# Save the pluszpont lines to a text file
+def write_pluszpont(pluszpont_content, pluszpont_file_path):
+    with open(pluszpont_file_path, 'w', encoding='utf-8') as txt_file:
+        txt_file.write("\n".join(pluszpont_content))
@@ -0,0 +1,157 @@
+import argparse
+from functools import lru_cache
+
+import numpy as np
+
+from asof_stats import PAIR_STRIDE, GrowingArray
+from data_paths import add_data_arguments, data_dir_from_args, data_files
+from match_store import load_match_store, reuse_or_rebuild
+from stats_kernel import store_arrays
+
+# Head-to-head meetings of every pairing, indexed by store row.
+#
+# Each (home_id, away_id) pairing, and each unordered pair of teams, maps to the sorted
+# store rows of its matches. A filtered head-to-head question (last N meetings, reverse
+# fixtures included, only matches with 3+ goals, ...) reads just those rows instead of
+# scanning the whole history. Summaries of frequent queries are memoised until new
+# results are added.
+
+# Summaries kept by the query cache
+QUERY_CACHE_SIZE = 1024
+
+# Which meetings of a pairing a query covers, seen from the first team
+VENUES = ("home", "away", "both")
+
+
+class HeadToHeadIndex:
+    def __init__(self):
+        # Copies of the store columns the filters read, indexed by store row
+        self.match_ids = GrowingArray(dtype=np.int32)
+        self.home_ids = GrowingArray(dtype=np.int8)
+        self.home_goals = GrowingArray(dtype=np.int8)
+        self.away_goals = GrowingArray(dtype=np.int8)
+        # home_id * PAIR_STRIDE + away_id -> rows with home_id at home
+        self.pairs = {}
+        # min_id * PAIR_STRIDE + max_id -> rows of the pair at either venue
+        self.teams = {}
+        self.summary = lru_cache(maxsize=QUERY_CACHE_SIZE)(self._summary)
+
+    @property
+    def rows(self):
+        return self.match_ids.length
+
+    @property
+    def last_match_id(self):
+        return int(self.match_ids.values[-1]) if self.rows else 0
+
+    # Add the rows of a match store from row `start` on
+    def extend(self, matches, start=None):
+        start = self.rows if start is None else start
+        match_ids, home_ids, away_ids, home_goals, away_goals = (column[start:] for column in store_arrays(matches))
+        if not match_ids.size:
+            return self
+        rows = np.arange(start, start + match_ids.size)
+        home_keys = home_ids.astype(np.int64)
+        away_keys = away_ids.astype(np.int64)
+        for table, keys in ((self.pairs, home_keys * PAIR_STRIDE + away_keys),
+                            (self.teams, np.minimum(home_keys, away_keys) * PAIR_STRIDE + np.maximum(home_keys, away_keys))):
+            order = np.argsort(keys, kind='stable')
+            group_keys, starts = np.unique(keys[order], return_index=True)
+            for key, rows_of_key in zip(group_keys.tolist(), np.split(rows[order], starts[1:])):
+                table.setdefault(key, GrowingArray()).append(rows_of_key)
+        self.match_ids.append(match_ids)
+        self.home_ids.append(home_ids)
+        self.home_goals.append(home_goals)
+        self.away_goals.append(away_goals)
+        self.summary.cache_clear()
+        return self
+
+    # Sorted store rows of the meetings of team_id and opponent_id that pass the filters:
+    #   venue        "home" (team_id at home), "away" (the reverse fixture) or "both"
+    #   until        only matches up to and including this match_ID
+    #   min_goals    only matches with at least this many goals
+    #   both_scored  only matches where both teams scored (True) or did not (False)
+    #   last         only the most recent N of the remaining meetings
+    def meetings(self, team_id, opponent_id, venue="both", until=None, min_goals=None, both_scored=None, last=None):
+        if venue == "home":
+            rows = self.pairs.get(team_id * PAIR_STRIDE + opponent_id)
+        elif venue == "away":
+            rows = self.pairs.get(opponent_id * PAIR_STRIDE + team_id)
+        elif venue == "both":
+            rows = self.teams.get(min(team_id, opponent_id) * PAIR_STRIDE + max(team_id, opponent_id))
+        else:
+            raise ValueError(f"Unknown venue {venue!r}, choose one of {VENUES}")
+        if rows is None:
+            return np.zeros(0, dtype=np.int64)
+        rows = rows.values
+        if until is not None:
+            rows = rows[:np.searchsorted(self.match_ids.values[rows], until, side='right')]
+        if min_goals is not None or both_scored is not None:
+            home_goals = self.home_goals.values[rows]
+            away_goals = self.away_goals.values[rows]
+            keep = np.ones(rows.size, dtype=bool)
+            if min_goals is not None:
+                keep &= home_goals.astype(np.int64) + away_goals >= min_goals
+            if both_scored is not None:
+                keep &= ((home_goals > 0) & (away_goals > 0)) == both_scored
+            rows = rows[keep]
+        if last is not None:
+            rows = rows[max(rows.size - last, 0):]
+        return rows
+
+    # Counts of the filtered meetings from team_id's side; memoised through `summary`
+    def _summary(self, team_id, opponent_id, venue="both", until=None, min_goals=None, both_scored=None, last=None):
+        rows = self.meetings(team_id, opponent_id, venue, until, min_goals, both_scored, last)
+        at_home = self.home_ids.values[rows] == team_id
+        home_goals = self.home_goals.values[rows].astype(np.int64)
+        away_goals = self.away_goals.values[rows].astype(np.int64)
+        goals_for = np.where(at_home, home_goals, away_goals)
+        goals_against = np.where(at_home, away_goals, home_goals)
+        matches = int(rows.size)
+        both_score = int(((home_goals > 0) & (away_goals > 0)).sum())
+        return {
+            "matches": matches,
+            "both_score": both_score,
+            "percentage": both_score / matches * 100 if matches else 0,
+            "wins": int((goals_for > goals_against).sum()),
+            "draws": int((goals_for == goals_against).sum()),
+            "losses": int((goals_for < goals_against).sum()),
+            "goals_for": int(goals_for.sum()),
+            "goals_against": int(goals_against.sum()),
+            "match_ids": self.match_ids.values[rows].tolist(),
+        }
+
+
+# Index of a match store, or the given index extended with the rows appended since it was built
+def update_head_to_head_index(matches, index=None):
+    if index is None:
+        return HeadToHeadIndex().extend(matches)
+    return reuse_or_rebuild(index, matches, HeadToHeadIndex, "head-to-head index").extend(matches)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Filtered head-to-head record of two teams.")
+    add_data_arguments(parser)
+    parser.add_argument("team_id", type=int)
+    parser.add_argument("opponent_id", type=int)
+    parser.add_argument("--venue", choices=VENUES, default="both",
+                        help="home: team_id at home, away: the reverse fixture, both: either (default)")
+    parser.add_argument("--until", type=int, help="last match_ID to consider")
+    parser.add_argument("--min-goals", type=int, help="only matches with at least this many goals")
+    parser.add_argument("--both-scored", choices=("yes", "no"), help="only matches where both teams scored, or did not")
+    parser.add_argument("--last", type=int, help="only the most recent N meetings")
+    args = parser.parse_args()
+
+    files = data_files(data_dir_from_args(args))
+    with load_match_store(files["formatted_results"]) as matches:
+        index = update_head_to_head_index(matches)
+    both_scored = None if args.both_scored is None else args.both_scored == "yes"
+    summary = index.summary(args.team_id, args.opponent_id, args.venue, args.until, args.min_goals, both_scored, args.last)
+    print(f"{args.team_id} vs {args.opponent_id} ({args.venue}): {summary['matches']} matches, "
+          f"both scored {summary['both_score']} - {summary['percentage']:.2f}%, "
+          f"W/D/L {summary['wins']}/{summary['draws']}/{summary['losses']}, "
+          f"goals {summary['goals_for']}:{summary['goals_against']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import json
+
+from atomic_files import dump_json_atomic
+from btts_matrix import BttsMatrix, write_btts_matrix
+from data_paths import script_data_files
+from match_store import load_match_store, reuse_or_rebuild
+from ratings import update_ratings
+from stats_kernel import compute_aggregates
+from team_aggregates import TeamAggregates, write_both_teams_score_stats, write_team_statistics_csv
+from teams import load_team_registry
+
+
+# Load the persisted aggregate snapshot, starting empty when there is none
+def load_snapshot(file_path):
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return TeamAggregates.from_dict(json.load(f))
+    except FileNotFoundError:
+        return TeamAggregates()
+    except (json.JSONDecodeError, KeyError, ValueError, TypeError) as e:
+        print(f"Warning: Ignoring unreadable snapshot {file_path}. Reason: {e}")
+        return TeamAggregates()
+
+
+# Save the snapshot via a temporary file so a crash never leaves it half-written
+def save_snapshot(aggregates, file_path):
+    dump_json_atomic(aggregates.to_dict(), file_path)
+
+
+# Fold the matches appended since the snapshot was taken into it
+def update_aggregates(aggregates, matches):
+    aggregates = reuse_or_rebuild(aggregates, matches, TeamAggregates, "snapshot")
+    rows = aggregates.rows
+    if rows == 0:
+        # Nothing to build on, compute the whole history in one vectorised pass
+        return compute_aggregates(matches)
+    aggregates.add_matches(matches.iter_from(rows))
+    return aggregates
+
+
+# Bring the snapshot for a formatted_results.json up to date and return the aggregates
+def update_snapshot(formatted_results_path, snapshot_path):
+    aggregates = load_snapshot(snapshot_path)
+    with load_match_store(formatted_results_path) as matches:
+        if not len(matches):
+            print("No past matches found. Keeping the existing snapshot.")
+            return aggregates
+        previous_rows = aggregates.rows
+        previous_match_id = aggregates.last_match_id
+        aggregates = update_aggregates(aggregates, matches)
+    if aggregates.rows != previous_rows or aggregates.last_match_id != previous_match_id:
+        try:
+            save_snapshot(aggregates, snapshot_path)
+        except IOError as e:
+            print(f"Error: Could not save snapshot to {snapshot_path}. Reason: {e}")
+    print(f"Statistics are up to date with match_ID {aggregates.last_match_id} ({aggregates.rows} matches).")
+    return aggregates
+
+
+# Main function
+def main():
+    # Define file paths (data folder from --data-dir/--league or the environment)
+    files = script_data_files()
+    formatted_results_path = files["formatted_results"]
+    snapshot_path = files["snapshot"]
+    ratings_path = files["ratings"]
+    csv_file_path = files["team_statistics"]
+    text_file_path = files["both_teams_score_stats"]
+    matrix_file_path = files["both_teams_score_matrix"]
+
+    aggregates = update_snapshot(formatted_results_path, snapshot_path)
+
+    # Replay ratings from the latest checkpoint
+    with load_match_store(formatted_results_path) as matches:
+        ratings = update_ratings(matches, ratings_path)
+
+    # Rewrite the derived files from the updated aggregates
+    try:
+        team_id_map, _ = load_team_registry(files["team_data"])
+        write_team_statistics_csv(aggregates.teams, csv_file_path, team_id_map, ratings)
+        print(f"Team statistics have been saved to {csv_file_path}")
+    except IOError as e:
+        print(f"Error writing CSV file: {e}")
+    try:
+        write_both_teams_score_stats(aggregates.pairs, text_file_path)
+        print(f"Both teams score statistics have been saved to {text_file_path}")
+    except IOError as e:
+        print(f"Error writing to file: {e}")
+    try:
+        write_btts_matrix(BttsMatrix.from_pairs(aggregates.pairs), matrix_file_path)
+        print(f"Both teams score matrix has been saved to {matrix_file_path}")
+    except IOError as e:
+        print(f"Error writing to file: {e}")
+
+
+if __name__ == "__main__":
+    main()
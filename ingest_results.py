@@ -0,0 +1,268 @@
+import argparse
+import codecs
+import json
+import sqlite3
+import zlib
+from collections import deque
+from contextlib import closing
+from pathlib import Path
+
+from atomic_files import dump_json_atomic
+from data_paths import add_data_arguments, data_dir_from_args, data_files
+from match_store import Match, append_matches, open_match_store
+from sqlite_store import open_database, sync_matches, write_teams
+from teams import load_team_registry
+
+# Streaming ingestion of the raw results feed (csvjson3.json) into formatted_results.json.
+#
+# Feed records look like {"Hazai csapat;Vendég csapat ;Eredmeny": "Nottingham;Tottenham ;1:0"}.
+# The feed is parsed one array element at a time, converted to the normalized record
+# layout and appended to formatted_results.json and its match store in batches. The
+# byte offset and checksum of the consumed feed prefix are saved to ingest_state.json
+# after every batch, so re-running the ingestion on a feed that only grew picks up where
+# it stopped, even after the (regenerable) match store was deleted.
+#
+# ingest_state.json is runtime state of a data folder and is not shipped. A history
+# that was not built by this ingestion is refused until an operator who has checked
+# that it holds the whole feed runs --mark-ingested.
+
+BATCH_SIZE = 1000
+CHUNK_SIZE = 1 << 16
+
+
+# Yield (element, end_byte_offset) for each element of the top-level JSON array in a file.
+# `start_offset` is 0 or the end offset of a previously yielded element.
+def iter_json_array(file_path, start_offset=0):
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    with open(file_path, 'rb') as f:
+        f.seek(start_offset)
+        buffer = ""
+        pos = 0
+        # Byte offset of buffer[mark]
+        mark = 0
+        mark_offset = start_offset
+        state = "start" if start_offset == 0 else "after_value"
+
+        def fill():
+            nonlocal buffer, pos, mark
+            chunk = f.read(CHUNK_SIZE)
+            # Drop text that was already consumed before growing the buffer
+            buffer = buffer[mark:] + text_decoder.decode(chunk, final=not chunk)
+            pos -= mark
+            mark = 0
+            return bool(chunk)
+
+        while True:
+            while True:
+                while pos < len(buffer) and buffer[pos].isspace():
+                    pos += 1
+                if pos < len(buffer) or not fill():
+                    break
+            if pos >= len(buffer):
+                raise ValueError(f"Unexpected end of {file_path}")
+            char = buffer[pos]
+            if state == "start":
+                if char != '[':
+                    raise ValueError(f"{file_path} does not contain a JSON array")
+                pos += 1
+                state = "first"
+                continue
+            if char == ']' and state in ("first", "after_value"):
+                return
+            if state == "after_value":
+                if char != ',':
+                    raise ValueError(f"Expected ',' in {file_path} near byte {mark_offset}")
+                pos += 1
+                state = "value"
+                continue
+            while True:
+                try:
+                    element, end = decoder.raw_decode(buffer, pos)
+                    break
+                except json.JSONDecodeError:
+                    if not fill():
+                        raise
+            mark_offset += len(buffer[mark:end].encode('utf-8'))
+            mark = pos = end
+            state = "after_value"
+            yield element, mark_offset
+
+
+# CRC32 of the first `length` bytes of a file, read in chunks
+def prefix_crc(file_path, length):
+    crc = 0
+    with open(file_path, 'rb') as f:
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+            length -= len(chunk)
+    return crc
+
+
+# Split a feed record into (home team, away team, home goals, away goals)
+def parse_feed_record(record):
+    if not isinstance(record, dict) or len(record) != 1:
+        raise ValueError("expected a single-key object")
+    home_team, away_team, result = (part.strip() for part in next(iter(record.values())).split(';'))
+    home_goals, away_goals = (int(goals) for goals in result.split(':'))
+    return home_team, away_team, home_goals, away_goals
+
+
+# Normalized formatted_results.json record
+def normalized_record(match_id, home_id, away_id, home_goals, away_goals):
+    return Match(match_id, home_id, away_id, home_goals, away_goals).to_record()
+
+
+# Ingestion progress per feed file name, {} when nothing was ingested yet
+def load_ingest_state(state_path):
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_ingest_state(state, state_path):
+    dump_json_atomic(state, state_path, ensure_ascii=False, indent=4)
+
+
+# (match_id, (home_id, away_id, home_goals, away_goals)) of the history rows after match_ID `last_match_id`
+def rows_after(formatted_results_path, last_match_id):
+    with open_match_store(formatted_results_path) as store:
+        return deque((row[0], tuple(row[1:])) for row in store if row[0] > last_match_id)
+
+
+# Ingest the part of the feed that has not been ingested yet; returns the number of new matches.
+# Team names are resolved with `team_ids`, by default the registry of the results' data folder.
+#
+# The progress (byte offset, record count and CRC of the consumed feed prefix, and the last
+# match_ID it accounts for) is kept in ingest_state.json next to the history and saved after
+# every batch. History rows past that match_ID, left by a run that stopped between appending
+# a batch and saving the progress, are matched against the next feed records instead of
+# being appended again.
+def ingest_feed(feed_path, formatted_results_path, batch_size=BATCH_SIZE, team_ids=None, state_path=None):
+    feed_key = Path(feed_path).name
+    files = data_files(Path(formatted_results_path).parent)
+    state_path = state_path or files["ingest_state"]
+    if team_ids is None:
+        _, team_ids = load_team_registry(files["team_data"])
+    if Path(formatted_results_path).exists():
+        with open_match_store(formatted_results_path) as store:
+            next_match_id = store.last_match_id() + 1
+    else:
+        next_match_id = 1
+    ingest_state = load_ingest_state(state_path)
+    progress = ingest_state.get(feed_key)
+    if progress is None:
+        if next_match_id > 1:
+            print(f"Error: {formatted_results_path} already holds matches, but {state_path} does not record which "
+                  f"records of {feed_key} they came from. Refusing to ingest it again. Only after checking that the "
+                  "history holds every record of the feed, record that by hand with: "
+                  "python ingest_results.py --mark-ingested")
+            return 0
+        progress = {"offset": 0, "records": 0, "crc": 0, "last_match_id": 0}
+
+    if progress["offset"] and prefix_crc(feed_path, progress["offset"]) != progress["crc"]:
+        print(f"Error: {feed_path} no longer starts with the {progress['records']} records ingested earlier. "
+              "Refusing to ingest it again.")
+        return 0
+    pending = rows_after(formatted_results_path, progress["last_match_id"]) if (
+        next_match_id - 1 != progress["last_match_id"]) else deque()
+    accounted_id = progress["last_match_id"]
+
+    ingested = 0
+    batch = []
+
+    def commit(end_offset):
+        nonlocal batch, progress
+        with open(feed_path, 'rb') as f:
+            f.seek(progress["offset"])
+            crc = zlib.crc32(f.read(end_offset - progress["offset"]), progress["crc"])
+        if batch:
+            append_matches(formatted_results_path, batch)
+        progress = {"offset": end_offset, "records": progress["records"] + consumed, "crc": crc,
+                    "last_match_id": accounted_id}
+        ingest_state[feed_key] = progress
+        save_ingest_state(ingest_state, state_path)
+        batch = []
+
+    consumed = 0
+    end_offset = progress["offset"]
+    for record, end_offset in iter_json_array(feed_path, progress["offset"]):
+        consumed += 1
+        try:
+            home_team, away_team, home_goals, away_goals = parse_feed_record(record)
+            home_id = team_ids[home_team]
+            away_id = team_ids[away_team]
+        except (KeyError, ValueError) as e:
+            print(f"Warning: Invalid feed record {record}. Reason: {e}")
+        else:
+            if pending:
+                match_id, row = pending.popleft()
+                if row != (home_id, away_id, home_goals, away_goals):
+                    raise ValueError(f"match_ID {match_id} of {formatted_results_path} is not the next record of {feed_key}")
+                accounted_id = match_id
+            else:
+                batch.append(normalized_record(next_match_id, home_id, away_id, home_goals, away_goals))
+                accounted_id = next_match_id
+                next_match_id += 1
+                ingested += 1
+        if consumed >= batch_size:
+            commit(end_offset)
+            consumed = 0
+    if pending:
+        raise ValueError(f"{formatted_results_path} has matches after match_ID {accounted_id} that are not in {feed_key}")
+    if consumed:
+        commit(end_offset)
+    return ingested
+
+
+# Record the whole feed as ingested without appending anything, for a history that was
+# built from it before the progress was kept in ingest_state.json
+def mark_feed_ingested(feed_path, formatted_results_path, state_path=None):
+    state_path = state_path or data_files(Path(formatted_results_path).parent)["ingest_state"]
+    records, offset = 0, 0
+    for _, offset in iter_json_array(feed_path):
+        records += 1
+    with open_match_store(formatted_results_path) as store:
+        last_match_id = store.last_match_id()
+    ingest_state = load_ingest_state(state_path)
+    ingest_state[Path(feed_path).name] = {
+        "offset": offset, "records": records, "crc": prefix_crc(feed_path, offset), "last_match_id": last_match_id}
+    save_ingest_state(ingest_state, state_path)
+    return records
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest the new records of the results feed.")
+    add_data_arguments(parser)
+    parser.add_argument("paths", nargs="*", metavar="PATH", help="explicit <feed.json> <formatted_results.json>")
+    parser.add_argument("--database", action="store_true", help="also copy the new matches into the SQLite database")
+    parser.add_argument("--mark-ingested", action="store_true",
+                        help="record the whole feed as already ingested; run by hand, only for a history "
+                             "known to hold every record of it")
+    args = parser.parse_args()
+    files = data_files(data_dir_from_args(args))
+    feed_path = files["results_feed"]
+    formatted_results_path = files["formatted_results"]
+    if len(args.paths) == 2:
+        feed_path, formatted_results_path = args.paths
+    elif args.paths:
+        parser.error("expected both the feed and the formatted_results.json path")
+    try:
+        if args.mark_ingested:
+            count = mark_feed_ingested(feed_path, formatted_results_path)
+            print(f"Recorded {count} records of {feed_path} as ingested into {formatted_results_path}")
+        else:
+            count = ingest_feed(feed_path, formatted_results_path)
+            print(f"Ingested {count} new matches from {feed_path} into {formatted_results_path}")
+            if args.database:
+                with closing(open_database(files["database"])) as connection:
+                    added = sync_matches(connection, formatted_results_path)
+                    write_teams(connection, load_team_registry(files["team_data"])[0])
+                print(f"Added {added} matches to {files['database']}")
+    except (FileNotFoundError, ValueError, sqlite3.Error) as e:
+        print(f"Error: Unable to ingest {feed_path}. Reason: {e}")
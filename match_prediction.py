@@ -1,29 +1,11 @@
 import json
 import csv
-import os
 from collections import defaultdict
 
-# Load both teams score stats from text file
-def load_both_teams_score_stats(file_path):
-    both_teams_score_stats = {}
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                parts = line.strip().split()
-                if len(parts) >= 6:
-                    home_id = int(parts[2])
-                    away_id = int(parts[4])
-                    both_score = int(parts[5].split('/')[0])
-                    total_matches = int(parts[5].split('/')[1])
-                    both_teams_score_stats[(home_id, away_id)] = {
-                        "both_score": both_score,
-                        "total_matches": total_matches
-                    }
-            print(f"Successfully loaded both teams score statistics for {len(both_teams_score_stats)} matches.")
-        return both_teams_score_stats
-    except FileNotFoundError:
-        print(f"Error: {file_path} not found.")
-        return {}
+from btts_matrix import load_btts_matrix
+from data_paths import script_data_files
+from incremental_stats import update_snapshot
+from predictions import write_predictions
 
 # Load upcoming matches from JSON file
 def load_upcoming_matches(file_path):
@@ -62,20 +44,12 @@ def load_team_statistics(file_path):
         print(f"Error: Failed to read CSV from {file_path}: {e}")
         return {}
 
-# Process past matches to update team statistics
-def process_past_matches(past_matches, team_stats):
-    for match in past_matches:
-        home_id = match["Hazai csapat ID"]
-        away_id = match["Vendég Csapat ID"]
-        home_goals = match["Hazai csapat gólszám"]
-        away_goals = match["Vendég Csapat gólszám"]
-        # Update total match count
-        team_stats[home_id]["OMSZ"] += 1
-        team_stats[away_id]["OMSZ"] += 1
-        # Check if both teams scored
-        if home_goals > 0 and away_goals > 0:
-            team_stats[home_id]["MCSGM"] += 1
-            team_stats[away_id]["MCSGM"] += 1
+# Update team statistics from the incrementally maintained aggregates of past matches
+def process_past_matches(aggregates, team_stats):
+    for team_id, counts in aggregates.teams.items():
+        # Total match count and matches where both teams scored
+        team_stats[team_id]["OMSZ"] += counts["OMSZ"]
+        team_stats[team_id]["MCSGM"] += counts["MCSGM"]
     # Calculate Esély for each team
     for team_id, stats in team_stats.items():
         if stats["OMSZ"] > 0:
@@ -84,7 +58,7 @@ def process_past_matches(past_matches, team_stats):
             stats["Esély"] = 0
 
 # Function to calculate predictions based on combined stats
-def calculate_predictions(matches, team_stats, both_teams_score_stats):
+def calculate_predictions(matches, team_stats, btts_matrix):
     predictions = []
     for match in matches:
         home_team_id = match["home_team_id"]
@@ -93,42 +67,37 @@ def calculate_predictions(matches, team_stats, both_teams_score_stats):
         home_esély = team_stats[home_team_id]["Esély"]
         away_esély = team_stats[away_team_id]["Esély"]
         combined_esély = (home_esély + away_esély) / 2
-        # Get both teams score stats
-        both_teams_to_score = 0.0
-        if (home_team_id, away_team_id) in both_teams_score_stats:
-            stats = both_teams_score_stats[(home_team_id, away_team_id)]
-            both_teams_to_score = stats["both_score"] / stats["total_matches"] * 100
+        # Get both teams score stats from the head-to-head matrix
+        both_teams_to_score = btts_matrix.percentage(home_team_id, away_team_id)
         # Final combined probability
         final_probability = (combined_esély + both_teams_to_score) / 2
         predictions.append({
             "match": f"{match['home_team']} vs {match['away_team']}",
+            "home_team_id": home_team_id,
+            "away_team_id": away_team_id,
             "percentage": final_probability
         })
     print(f"Calculated predictions for {len(predictions)} matches.")
     return predictions
 
-# Save predictions to a text file
-def save_predictions(predictions, file_path):
+# Save predictions to the next numbered prediction file of the data folder and archive them
+def save_predictions(predictions, base_path):
     try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            for i, prediction in enumerate(predictions):
-                if i < 3:
-                    f.write(f"Top {i+1}: {prediction['match']} - {prediction['percentage']:.2f}%\n")
-                else:
-                    f.write(f"{prediction['match']} - {prediction['percentage']:.2f}%\n")
-        print(f"Predictions saved to {file_path}")
+        output_file = write_predictions(predictions, [], base_path, "match_prediction")
+        print(f"Predictions saved to {output_file}")
     except IOError as e:
-        print(f"Error: Could not save predictions to {file_path}. Reason: {e}")
+        print(f"Error: Could not save predictions to {base_path}. Reason: {e}")
 
 # Main function
 def main():
-    # Define file paths
-    upcoming_matches_path = "D:\\2024.10.10-ASZTALMENTÉS!!!!\\pyhton_gyakorlas\\upcoming_matches.json"
-    team_statistics_path = "D:\\2024.10.10-ASZTALMENTÉS!!!!\\pyhton_gyakorlas\\team_statistics.csv"
-    both_teams_score_stats_path = "D:\\2024.10.10-ASZTALMENTÉS!!!!\\pyhton_gyakorlas\\both_teams_score_stats.txt"
-    formatted_results_path = "D:\\2024.10.10-ASZTALMENTÉS!!!!\\pyhton_gyakorlas\\formatted_results.json"
-    predictions_output_base_path = "D:\\2024.10.10-ASZTALMENTÉS!!!!\\pyhton_gyakorlas\\"
-    predictions_output_file = "prediction1.txt"
+    # Define file paths (data folder from --data-dir/--league or the environment)
+    files = script_data_files()
+    upcoming_matches_path = files["upcoming_matches"]
+    team_statistics_path = files["team_statistics"]
+    both_teams_score_matrix_path = files["both_teams_score_matrix"]
+    formatted_results_path = files["formatted_results"]
+    snapshot_path = files["snapshot"]
+    predictions_output_base_path = files["predictions"]
 
     # Load data
     upcoming_matches = load_upcoming_matches(upcoming_matches_path)
@@ -141,29 +110,26 @@ def main():
         print("No team statistics found. Exiting.")
         return
 
-    both_teams_score_stats = load_both_teams_score_stats(both_teams_score_stats_path)
-    if not both_teams_score_stats:
+    btts_matrix = load_btts_matrix(both_teams_score_matrix_path)
+    if not btts_matrix.size:
         print("No both teams score stats found. Exiting.")
         return
+    print(f"Successfully loaded both teams score statistics for {btts_matrix.size} teams.")
 
-    # Load past match data
-    try:
-        with open(formatted_results_path, 'r', encoding='utf-8') as f:
-            past_matches = json.load(f)
-            print(f"Successfully loaded {len(past_matches)} past matches.")
-    except FileNotFoundError:
-        print(f"Error: {formatted_results_path} not found.")
+    # Fold newly appended past matches into the aggregate snapshot
+    aggregates = update_snapshot(formatted_results_path, snapshot_path)
+    if not aggregates.rows:
+        print("No past matches found. Exiting.")
         return
 
     # Process past matches to update team statistics
-    process_past_matches(past_matches, team_stats)
+    process_past_matches(aggregates, team_stats)
 
     # Calculate predictions
-    predictions = calculate_predictions(upcoming_matches, team_stats, both_teams_score_stats)
+    predictions = calculate_predictions(upcoming_matches, team_stats, btts_matrix)
 
     # Save predictions to file
-    output_file = os.path.join(predictions_output_base_path, predictions_output_file)
-    save_predictions(predictions, output_file)
+    save_predictions(predictions, predictions_output_base_path)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,6 +1,9 @@
 import json
-from collections import defaultdict
-from pathlib import Path
+
+from data_paths import script_data_files
+from feature_cache import load_team_features
+from teams import load_team_registry
+from windowed_stats import script_window, windowed_features
 
 # Error-handled file loading
 def load_file(file_path, default_value):
@@ -11,70 +14,29 @@ def load_file(file_path, default_value):
         print(f"Error: Unable to load {file_path}. Reason: {e}")
         return default_value
 
-# Load files with error handling
-both_teams_score_stats = load_file('D:\\2024.10.10-ASZTALMENTÉS!!!!\\pyhton_gyakorlas\\chatgpt\\both_teams_score_stats.txt', "")
-past_matches = load_file('D:\\2024.10.10-ASZTALMENTÉS!!!!\\pyhton_gyakorlas\\chatgpt\\formatted_results.json', [])
-
-# Define the team names and their corresponding IDs
-team_names = {
-    1: "Aston Oroszlán",
-    2: "Brentford",
-    3: "Brighton",
-    4: "Chelsea",
-    5: "Crystal Palace",
-    6: "Everton",
-    7: "Fulham",
-    8: "London Ágyúk",
-    9: "Liverpool",
-    10: "Manchester Kék",
-    11: "Newcastle",
-    12: "Nottingham",
-    13: "Tottenham",
-    14: "Vörös Ördögök",
-    15: "West Ham",
-    16: "Wolverhampton"
-}
-
-# Initialize team statistics
-team_stats = defaultdict(lambda: {
-    "OMSZ": 0,  # Total number of matches
-    "MCSGM": 0,  # Matches where both teams scored
-    "Esély": 0,   # Probability
-    "Ellenfelek": defaultdict(int)  # Opponents match count
-})
-
-# Process each past match to update statistics
-for match in past_matches:
-    try:
-        home_id = int(match["Hazai csapat ID"])
-        away_id = int(match["Vendég Csapat ID"])
-        home_goals = int(match["Hazai csapat gólszám"])
-        away_goals = int(match["Vendég Csapat gólszám"])
-        
-        # Update match statistics
-        team_stats[home_id]["OMSZ"] += 1
-        team_stats[away_id]["OMSZ"] += 1
-        
-        team_stats[home_id]["Ellenfelek"][away_id] += 1
-        team_stats[away_id]["Ellenfelek"][home_id] += 1
-        
-        if home_goals > 0 and away_goals > 0:
-            team_stats[home_id]["MCSGM"] += 1
-            team_stats[away_id]["MCSGM"] += 1
-    except (KeyError, ValueError) as e:
-        print(f"Warning: Invalid match data {match}. Reason: {e}")
-
-# Calculate Esély for each team
-for team_id, stats in team_stats.items():
-    stats["Esély"] = (stats["MCSGM"] / stats["OMSZ"]) * 100 if stats["OMSZ"] > 0 else 0
-
-# Sort opponents for each team by match count
-for team_id, stats in team_stats.items():
-    sorted_ellenfelek = sorted(stats["Ellenfelek"].items(), key=lambda x: x[1], reverse=True)
-    team_stats[team_id]["Top 3 Ellenfelek"] = sorted_ellenfelek[:3]
+# Load files with error handling (data folder from --data-dir/--league or the environment)
+files = script_data_files()
+both_teams_score_stats = load_file(str(files["both_teams_score_stats"]), "")
+
+# Team names of the league, by team ID
+team_names, _ = load_team_registry(files["team_data"])
+
+# Esély and most frequent opponents from the feature cache, recomputed only when new results arrived.
+# With --window N (or --half-life H) the Esély only counts each team's last N matches.
+features = load_team_features(files)
+team_esely = features["esely"]
+window, half_life = script_window()
+if window is not None or half_life is not None:
+    team_esely, _ = windowed_features(files["formatted_results"], files["windowed_snapshot"], window, half_life)
+team_stats = {}
+for team_id, esely in team_esely.items():
+    team_stats[team_id] = {
+        "Esély": esely,
+        "Top 3 Ellenfelek": features["top_opponents"][team_id][:3]
+    }
 
 # Write the results to individual files for each team
-output_folder = Path('D:/2024.10.10-ASZTALMENTÉS!!!!/pyhton_gyakorlas/chatgpt/')
+output_folder = files["data_dir"]
 output_folder.mkdir(parents=True, exist_ok=True)
 
 for team_id, stats in team_stats.items():
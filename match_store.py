@@ -0,0 +1,426 @@
+import array
+import json
+import mmap
+import os
+import sys
+import zlib
+from pathlib import Path
+
+from atomic_files import atomic_file, dump_json_atomic
+
+# Columnar, memory-mapped copy of formatted_results.json.
+#
+# The store is a directory next to the JSON file (formatted_results.store/) holding
+# one raw binary file per column plus a small meta.json. Opening the store maps the
+# column files instead of parsing the JSON, so load time and resident memory do not
+# grow with the history.
+
+STORE_VERSION = 1
+
+# Column name -> array typecode (i = int32, b = int8)
+# match_id is int32 rather than int16 so the history can grow past 32767 matches
+COLUMNS = (
+    ("match_id", "i"),
+    ("home_id", "b"),
+    ("away_id", "b"),
+    ("home_goals", "b"),
+    ("away_goals", "b"),
+)
+
+META_FILE = "meta.json"
+
+# Largest values that fit the int32 and int8 columns
+INT32_MAX = 2 ** 31 - 1
+INT8_MAX = 127
+
+
+# Directory of the columnar store that belongs to a formatted_results.json file
+def store_path_for(json_path):
+    json_path = Path(json_path)
+    return json_path.with_suffix(".store")
+
+
+# Format a numeric match ID the way formatted_results.json does ("0001", "12968")
+def format_match_id(match_id):
+    return f"{match_id:04d}"
+
+
+# Fingerprint of the source JSON, used to detect when the store is stale
+def source_fingerprint(json_path):
+    stat = os.stat(json_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+# One match of the history. formatted_results.json also stores the result string and
+# the both-scored flag; both are derived from the goals here instead of kept per match.
+class Match:
+    __slots__ = ("match_id", "home_id", "away_id", "home_goals", "away_goals")
+
+    def __init__(self, match_id, home_id, away_id, home_goals, away_goals):
+        self.match_id = match_id
+        self.home_id = home_id
+        self.away_id = away_id
+        self.home_goals = home_goals
+        self.away_goals = away_goals
+
+    # Validated match from a formatted_results.json record; raises ValueError for bad rows
+    @classmethod
+    def from_record(cls, record):
+        try:
+            match = cls(
+                int(record["match_ID"]),
+                int(record["Hazai csapat ID"]),
+                int(record["Vendég Csapat ID"]),
+                int(record["Hazai csapat gólszám"]),
+                int(record["Vendég Csapat gólszám"]),
+            )
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"missing or malformed field {e}") from None
+        if not 0 <= match.match_id <= INT32_MAX:
+            raise ValueError("match_ID out of range")
+        if not (1 <= match.home_id <= INT8_MAX and 1 <= match.away_id <= INT8_MAX):
+            raise ValueError("team ID out of range")
+        if not (0 <= match.home_goals <= INT8_MAX and 0 <= match.away_goals <= INT8_MAX):
+            raise ValueError("goal count out of range")
+        return match
+
+    @property
+    def both_scored(self):
+        return self.home_goals > 0 and self.away_goals > 0
+
+    @property
+    def result(self):
+        return f"{self.home_goals}:{self.away_goals}"
+
+    # formatted_results.json record of the match
+    def to_record(self):
+        return {
+            "match_ID": format_match_id(self.match_id),
+            "Hazai csapat ID": self.home_id,
+            "Vendég Csapat ID": self.away_id,
+            "Eredmény": self.result,
+            "Hazai csapat gólszám": self.home_goals,
+            "Vendég Csapat gólszám": self.away_goals,
+            "Mindkét csapat szerzett gólt?": "Igen" if self.both_scored else "Nem"
+        }
+
+    def astuple(self):
+        return (self.match_id, self.home_id, self.away_id, self.home_goals, self.away_goals)
+
+    # Unpacks like the tuples of MatchStore iteration
+    def __iter__(self):
+        return iter(self.astuple())
+
+    def __eq__(self, other):
+        return isinstance(other, Match) and self.astuple() == other.astuple()
+
+    def __repr__(self):
+        return (f"Match({self.match_id}, {self.home_id}, {self.away_id}, "
+                f"{self.home_goals}, {self.away_goals})")
+
+
+class MatchStore:
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / META_FILE, 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != STORE_VERSION:
+            raise ValueError(f"Unsupported match store version in {self.path}: {self.meta.get('version')}")
+        if self.meta.get("byteorder") != sys.byteorder:
+            raise ValueError(f"Match store {self.path} was written with {self.meta.get('byteorder')} byte order")
+        self.count = self.meta["rows"]
+        self._maps = []
+        self._views = []
+        for name, typecode in COLUMNS:
+            setattr(self, name, self._map_column(name, typecode))
+
+    def _map_column(self, name, typecode):
+        size = self.count * array.array(typecode).itemsize
+        if size == 0:
+            # mmap cannot map an empty range
+            return memoryview(array.array(typecode))
+        with open(self.path / f"{name}.bin", 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        view = memoryview(mapped).cast(typecode)
+        self._maps.append(mapped)
+        self._views.append(view)
+        return view
+
+    def __len__(self):
+        return self.count
+
+    # Yields (match_id, home_id, away_id, home_goals, away_goals) tuples in match order
+    def __iter__(self):
+        return zip(self.match_id, self.home_id, self.away_id, self.home_goals, self.away_goals)
+
+    # Same as iterating the store, starting at row `start`
+    def iter_from(self, start):
+        return zip(self.match_id[start:], self.home_id[start:], self.away_id[start:],
+                   self.home_goals[start:], self.away_goals[start:])
+
+    def __getitem__(self, index):
+        return Match(self.match_id[index], self.home_id[index], self.away_id[index],
+                     self.home_goals[index], self.away_goals[index])
+
+    # Match records in match order, starting at row `start`
+    def records(self, start=0):
+        for row in self.iter_from(start):
+            yield Match(*row)
+
+    def last_match_id(self):
+        return self.match_id[self.count - 1] if self.count else 0
+
+    # Whether `rows` rows ending with match_ID `last_match_id` are still the start of this history
+    def has_prefix(self, rows, last_match_id):
+        return rows <= self.count and (not rows or self.match_id[rows - 1] == last_match_id)
+
+    def close(self):
+        for view in self._views:
+            view.release()
+        for mapped in self._maps:
+            mapped.close()
+        self._views = []
+        self._maps = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Read meta.json of a store, None when it is missing or unreadable
+def read_meta(store_path):
+    try:
+        with open(Path(store_path) / META_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+# Write meta.json via a temporary file so readers never see a half-written file
+def write_meta(store_path, meta):
+    dump_json_atomic(meta, Path(store_path) / META_FILE)
+
+
+# Convert the list of match dicts from formatted_results.json into column arrays,
+# skipping (with a warning) the rows Match.from_record rejects
+def matches_to_columns(matches):
+    columns = {name: array.array(typecode) for name, typecode in COLUMNS}
+    for record in matches:
+        try:
+            match = Match.from_record(record)
+        except ValueError as e:
+            print(f"Warning: Invalid match data {record}. Reason: {e}")
+            continue
+        for (name, _), value in zip(COLUMNS, match):
+            columns[name].append(value)
+    return columns
+
+
+# Number of bytes before the end of the last record that are checked for changes
+TAIL_CHECK_BYTES = 256
+
+
+# Byte offset just past the last record of a JSON array and a checksum of the bytes before it
+def json_tail(raw):
+    end = raw.rfind(b'}') + 1
+    if end <= 0:
+        return None
+    return {"offset": end, "crc": zlib.crc32(raw[max(0, end - TAIL_CHECK_BYTES):end])}
+
+
+# Tail record of a JSON file whose last array element ends at byte `offset`
+def read_tail(json_path, offset):
+    with open(json_path, 'rb') as f:
+        start = max(0, offset - TAIL_CHECK_BYTES)
+        f.seek(start)
+        return {"offset": offset, "crc": zlib.crc32(f.read(offset - start))}
+
+
+# Write a fresh set of column files. Each file is replaced rather than truncated so
+# processes that still have the old columns mapped keep reading valid data.
+def write_columns(store_path, columns):
+    for name, _ in COLUMNS:
+        with atomic_file(store_path / f"{name}.bin", binary=True) as f:
+            columns[name].tofile(f)
+
+
+# Append rows to the column files of an existing store
+def append_columns(store_path, rows, columns):
+    store_path = Path(store_path)
+    for name, typecode in COLUMNS:
+        with open(store_path / f"{name}.bin", 'r+b') as f:
+            # Drop bytes left behind by an append that never reached meta.json
+            f.truncate(rows * array.array(typecode).itemsize)
+            f.seek(0, os.SEEK_END)
+            columns[name].tofile(f)
+    return rows + len(columns["match_id"])
+
+
+# Build the columnar store from formatted_results.json
+def convert_json_to_store(json_path, store_path=None):
+    store_path = Path(store_path) if store_path else store_path_for(json_path)
+    fingerprint = source_fingerprint(json_path)
+    with open(json_path, 'rb') as f:
+        raw = f.read()
+    columns = matches_to_columns(json.loads(raw.decode('utf-8')))
+    tail = json_tail(raw)
+    del raw
+
+    store_path.mkdir(parents=True, exist_ok=True)
+    write_columns(store_path, columns)
+    write_meta(store_path, {
+        "version": STORE_VERSION,
+        "byteorder": sys.byteorder,
+        "rows": len(columns["match_id"]),
+        "source": fingerprint,
+        "tail": tail,
+    })
+    return store_path
+
+
+# Parse the records appended to a JSON array after byte offset `offset`
+def parse_appended_records(json_path, offset):
+    with open(json_path, 'rb') as f:
+        f.seek(offset)
+        text = f.read().decode('utf-8')
+    decoder = json.JSONDecoder()
+    records = []
+    pos = 0
+    end = 0
+    while True:
+        while pos < len(text) and text[pos].isspace():
+            pos += 1
+        if pos < len(text) and text[pos] == ']':
+            break
+        if pos >= len(text) or text[pos] != ',':
+            raise ValueError(f"Unexpected data after byte {offset} of {json_path}")
+        pos += 1
+        while pos < len(text) and text[pos].isspace():
+            pos += 1
+        record, pos = decoder.raw_decode(text, pos)
+        records.append(record)
+        end = pos
+    return records, offset + len(text[:end].encode('utf-8'))
+
+
+# Fold results appended to formatted_results.json into the store without re-reading
+# the whole file. Returns False when the file changed in any other way.
+def refresh_from_json(json_path, store_path, meta):
+    tail = meta.get("tail")
+    fingerprint = source_fingerprint(json_path)
+    if not tail or fingerprint["size"] < meta["source"]["size"]:
+        return False
+    offset = tail["offset"]
+    if read_tail(json_path, offset) != tail:
+        return False
+    try:
+        records, new_offset = parse_appended_records(json_path, offset)
+    except (ValueError, UnicodeDecodeError):
+        return False
+    columns = matches_to_columns(records)
+    if meta["rows"] and len(columns["match_id"]):
+        with MatchStore(store_path) as store:
+            if columns["match_id"][0] <= store.last_match_id():
+                return False
+    meta = dict(meta, source=fingerprint, tail=read_tail(json_path, new_offset))
+    meta["rows"] = append_columns(store_path, meta["rows"], columns)
+    write_meta(store_path, meta)
+    return True
+
+
+# Open the store for a formatted_results.json file, bringing it up to date when the JSON changed
+def open_match_store(json_path):
+    json_path = Path(json_path)
+    store_path = store_path_for(json_path)
+    meta_path = store_path / META_FILE
+    if json_path.exists():
+        meta = read_meta(store_path)
+        if meta is None or meta.get("version") != STORE_VERSION or meta.get("byteorder") != sys.byteorder:
+            convert_json_to_store(json_path, store_path)
+        elif meta.get("source") != source_fingerprint(json_path):
+            if not refresh_from_json(json_path, store_path, meta):
+                convert_json_to_store(json_path, store_path)
+    elif not meta_path.exists():
+        raise FileNotFoundError(f"Neither {json_path} nor {store_path} exists")
+    return MatchStore(store_path)
+
+
+# Lay out one match record the way json.dump(indent=4) writes formatted_results.json
+def format_record(record):
+    return "    " + json.dumps(record, ensure_ascii=False, indent=4).replace("\n", "\n    ")
+
+
+# Append match records to formatted_results.json and its store in place, without
+# rewriting the existing history. `meta_updates` are committed together with the rows.
+def append_matches(json_path, records, meta_updates=None):
+    json_path = Path(json_path)
+    store_path = store_path_for(json_path)
+    if not json_path.exists():
+        with open(json_path, 'w', encoding='utf-8') as f:
+            f.write("[]")
+    open_match_store(json_path).close()
+    meta = read_meta(store_path)
+
+    columns = matches_to_columns(records)
+    if len(columns["match_id"]) != len(records):
+        raise ValueError("Refusing to append invalid match records")
+    if records:
+        text = ",\n".join(format_record(record) for record in records)
+        tail = meta.get("tail")
+        with open(json_path, 'r+b') as f:
+            if tail:
+                f.seek(tail["offset"])
+                f.write((",\n" + text).encode('utf-8'))
+            else:
+                f.seek(0)
+                f.write(("[\n" + text).encode('utf-8'))
+            end = f.tell()
+            f.write(b"\n]")
+            f.truncate()
+        meta["tail"] = read_tail(json_path, end)
+        meta["source"] = source_fingerprint(json_path)
+        meta["rows"] = append_columns(store_path, meta["rows"], columns)
+    meta.update(meta_updates or {})
+    write_meta(store_path, meta)
+    return meta["rows"]
+
+
+# An empty in-memory store, used when the history cannot be loaded
+class EmptyMatchStore(MatchStore):
+    def __init__(self):
+        self.path = None
+        self.meta = {"version": STORE_VERSION, "byteorder": sys.byteorder, "rows": 0}
+        self.count = 0
+        self._maps = []
+        self._views = []
+        for name, typecode in COLUMNS:
+            setattr(self, name, memoryview(array.array(typecode)))
+
+
+# `state` (anything with rows and last_match_id) when it was built from the first rows of
+# `matches`, otherwise a fresh `new_state()`. `description` names the state in the warning.
+def reuse_or_rebuild(state, matches, new_state, description):
+    if matches.has_prefix(state.rows, state.last_match_id):
+        return state
+    print(f"Warning: Match history no longer matches the {description}. Rebuilding it from scratch.")
+    return new_state()
+
+
+# Error-handled store loading, mirroring the load_file helpers of the scripts
+def load_match_store(json_path):
+    try:
+        return open_match_store(json_path)
+    except (FileNotFoundError, json.JSONDecodeError, ValueError) as e:
+        print(f"Error: Unable to load {json_path}. Reason: {e}")
+        return EmptyMatchStore()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python match_store.py <formatted_results.json>")
+        sys.exit(1)
+    path = convert_json_to_store(sys.argv[1])
+    with MatchStore(path) as store:
+        print(f"Converted {len(store)} matches into {path}")
@@ -0,0 +1,338 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from backtest import PROBABILITY_FLOOR, TOP_PREDICTIONS, WARMUP_ROUNDS, round_features
+from data_paths import add_data_arguments, data_dir_from_args, data_files
+from prediction_config import FORMULAS, default_prediction_config, load_prediction_config, save_prediction_config
+
+# Search for the penalty table (and for the logikai formula the strong/unpredictable
+# adjustments) that predict the history best.
+#
+# The walk-forward features of every round (both teams' Esély and the head-to-head
+# percentage before the round) are computed once. A candidate configuration is then a
+# set of per-team vectors, and a batch of candidates is scored against all rounds in
+# one vectorised pass. The best candidate on the training rounds is checked on the
+# held-out last rounds and written to the section of its formula in
+# prediction_config.json, unless the current config does better there.
+#
+#   --formula formula   penalties only, as generate_predictions.py, the pipeline, the daemon
+#                       and the watcher apply them
+#   --formula logikai   penalties and team adjustments, as winmi/logikaiprediction.py applies them
+
+# Candidates scored per vectorised pass
+CANDIDATE_CHUNK = 128
+MAX_PENALTY = 15
+MAX_ADJUSTMENT = 10
+# Probability of a team getting a penalty, or being strong or unpredictable, in random search
+TEAM_PROBABILITY = 0.2
+ADAPTIVE_ELITE = 0.1
+ADAPTIVE_SMOOTHING = 0.7
+OBJECTIVES = {"brier": 1, "log_loss": 1, "top3_hit_rate": -1}
+
+# Features of the worker process, set once by the pool initializer
+_features = None
+
+
+def _set_features(features):
+    global _features
+    _features = features
+
+
+# Candidate arrays from a list of configs; `size` is one more than the largest team ID
+def candidates_from_configs(configs, size):
+    candidates = {
+        "penalties": np.zeros((len(configs), size)),
+        "strong": np.zeros((len(configs), size), dtype=bool),
+        "unpredictable": np.zeros((len(configs), size), dtype=bool),
+        "strong_boost": np.array([config["strong_boost"] for config in configs], dtype=float),
+        "unpredictable_penalty": np.array([config["unpredictable_penalty"] for config in configs], dtype=float),
+    }
+    for row, config in enumerate(configs):
+        for team_id, penalty in config["penalty_teams"].items():
+            candidates["penalties"][row, team_id] = penalty
+        candidates["strong"][row, list(config["strong_teams"])] = True
+        candidates["unpredictable"][row, list(config["unpredictable_teams"])] = True
+    return candidates
+
+
+# Whole numbers stay integers so the prediction files print "5 %" rather than "5.0 %"
+def _config_number(value):
+    value = round(float(value), 2)
+    return int(value) if value.is_integer() else value
+
+
+def config_from_candidates(candidates, row):
+    return {
+        "penalty_teams": {int(team_id): _config_number(penalty) for team_id, penalty in
+                          enumerate(candidates["penalties"][row]) if penalty},
+        "strong_teams": {int(team_id) for team_id in np.flatnonzero(candidates["strong"][row])},
+        "unpredictable_teams": {int(team_id) for team_id in np.flatnonzero(candidates["unpredictable"][row])},
+        "strong_boost": _config_number(candidates["strong_boost"][row]),
+        "unpredictable_penalty": _config_number(candidates["unpredictable_penalty"][row]),
+    }
+
+
+# Drop the team adjustments of candidates for a formula that does not apply them
+def restrict_to_formula(candidates, formula):
+    if formula != "logikai":
+        for name in ("strong", "unpredictable", "strong_boost", "unpredictable_penalty"):
+            candidates[name][:] = 0
+    return candidates
+
+
+# Brier score, log-loss and top-3 hit rate of each candidate over the features
+def evaluate_candidates(candidates, features=None):
+    features = _features if features is None else features
+    home, away = features["home_ids"], features["away_ids"]
+    outcome = features["both_scored"]
+    round_size = features["round_size"]
+    combined = (features["home_esely"] + features["away_esely"]) / 2
+
+    combined = (combined
+                + candidates["strong_boost"][:, None] * (candidates["strong"][:, home] | candidates["strong"][:, away])
+                - candidates["unpredictable_penalty"][:, None]
+                * (candidates["unpredictable"][:, home] | candidates["unpredictable"][:, away]))
+    percentage = (combined + features["head_to_head"]) / 2
+    percentage -= candidates["penalties"][:, home] + candidates["penalties"][:, away]
+
+    probability = np.clip(percentage / 100, PROBABILITY_FLOOR, 1 - PROBABILITY_FLOOR)
+    brier = ((probability - outcome) ** 2).mean(axis=1)
+    log_loss = -np.where(outcome == 1, np.log(probability), np.log(1 - probability)).mean(axis=1)
+
+    rounds = outcome.size // round_size
+    per_round = percentage.reshape(percentage.shape[0], rounds, round_size)
+    top = np.argsort(-per_round, axis=2, kind='stable')[:, :, :TOP_PREDICTIONS]
+    hits = np.take_along_axis(np.broadcast_to(outcome.reshape(rounds, round_size), per_round.shape), top, axis=2)
+    top3_hit_rate = hits.sum(axis=(1, 2)) / max(top.shape[1] * top.shape[2], 1) * 100
+    return {"brier": brier, "log_loss": log_loss, "top3_hit_rate": top3_hit_rate}
+
+
+# Evaluate candidates in chunks, over a process pool when workers > 1
+def evaluate_all(candidates, features, workers=1):
+    count = candidates["strong_boost"].size
+    chunks = [{name: values[start:start + CANDIDATE_CHUNK] for name, values in candidates.items()}
+              for start in range(0, count, CANDIDATE_CHUNK)]
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_set_features, initargs=(features,)) as executor:
+            results = list(executor.map(evaluate_candidates, chunks))
+    else:
+        results = [evaluate_candidates(chunk, features) for chunk in chunks]
+    return {name: np.concatenate([result[name] for result in results]) for name in OBJECTIVES}
+
+
+# Slice of the per-fixture features covering whole rounds [first_round, last_round)
+def feature_rounds(features, first_round, last_round):
+    round_size = features["round_size"]
+    part = {name: values[first_round * round_size:last_round * round_size]
+            for name, values in features.items() if name != "round_size"}
+    part["round_size"] = round_size
+    return part
+
+
+def merge_candidates(*parts):
+    return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+
+# Base config scaled: every combination of the adjustment sizes and a penalty factor
+# (only the penalty factor without `adjustments`). run_sweep passes the built-in config,
+# so an empty saved penalty table does not narrow later grids.
+def grid_candidates(base, size, adjustments=True):
+    adjustments = np.arange(0, MAX_ADJUSTMENT + 1) if adjustments else np.zeros(1)
+    scales = np.round(np.arange(0, 2.05, 0.1), 2)
+    boosts, unpredictable_penalties, penalty_scales = (grid.ravel() for grid in
+                                                       np.meshgrid(adjustments, adjustments, scales, indexing='ij'))
+    candidates = candidates_from_configs([base], size)
+    count = boosts.size
+    return {
+        "penalties": candidates["penalties"].repeat(count, axis=0) * penalty_scales[:, None],
+        "strong": candidates["strong"].repeat(count, axis=0),
+        "unpredictable": candidates["unpredictable"].repeat(count, axis=0),
+        "strong_boost": boosts.astype(float),
+        "unpredictable_penalty": unpredictable_penalties.astype(float),
+    }
+
+
+# Independent random configurations
+def random_candidates(rng, count, size):
+    strong = rng.random((count, size)) < TEAM_PROBABILITY
+    unpredictable = (rng.random((count, size)) < TEAM_PROBABILITY) & ~strong
+    penalised = rng.random((count, size)) < TEAM_PROBABILITY
+    candidates = {
+        "penalties": np.where(penalised, rng.integers(1, MAX_PENALTY + 1, (count, size)), 0).astype(float),
+        "strong": strong,
+        "unpredictable": unpredictable,
+        "strong_boost": rng.integers(0, MAX_ADJUSTMENT + 1, count).astype(float),
+        "unpredictable_penalty": rng.integers(0, MAX_ADJUSTMENT + 1, count).astype(float),
+    }
+    # Team ID 0 does not exist
+    for name in ("penalties", "strong", "unpredictable"):
+        candidates[name][:, 0] = 0
+    return candidates
+
+
+# Cross-entropy search: sample, keep the elite and move the sampling distribution towards it
+def adaptive_candidates(rng, features, workers, count, iterations, objective, size, formula="logikai"):
+    sign = OBJECTIVES[objective]
+    distribution = {
+        "penalised": np.full(size, TEAM_PROBABILITY),
+        "penalty_mean": np.full(size, MAX_PENALTY / 2),
+        "penalty_std": np.full(size, MAX_PENALTY / 4),
+        "strong": np.full(size, TEAM_PROBABILITY),
+        "unpredictable": np.full(size, TEAM_PROBABILITY),
+        "adjustment_mean": np.full(2, MAX_ADJUSTMENT / 2),
+        "adjustment_std": np.full(2, MAX_ADJUSTMENT / 4),
+    }
+    evaluated = []
+    for _ in range(iterations):
+        strong = rng.random((count, size)) < distribution["strong"]
+        unpredictable = (rng.random((count, size)) < distribution["unpredictable"]) & ~strong
+        penalised = rng.random((count, size)) < distribution["penalised"]
+        penalties = np.clip(np.round(rng.normal(distribution["penalty_mean"], distribution["penalty_std"], (count, size))),
+                            0, MAX_PENALTY)
+        adjustments = np.clip(np.round(rng.normal(distribution["adjustment_mean"], distribution["adjustment_std"],
+                                                  (count, 2))), 0, MAX_ADJUSTMENT)
+        candidates = {
+            "penalties": np.where(penalised, penalties, 0),
+            "strong": strong,
+            "unpredictable": unpredictable,
+            "strong_boost": adjustments[:, 0],
+            "unpredictable_penalty": adjustments[:, 1],
+        }
+        for name in ("penalties", "strong", "unpredictable"):
+            candidates[name][:, 0] = 0
+        restrict_to_formula(candidates, formula)
+        metrics = evaluate_all(candidates, features, workers)
+        evaluated.append((candidates, metrics))
+
+        elite = np.argsort(sign * metrics[objective], kind='stable')[:max(1, int(count * ADAPTIVE_ELITE))]
+
+        def blend(name, value):
+            distribution[name] = ADAPTIVE_SMOOTHING * value + (1 - ADAPTIVE_SMOOTHING) * distribution[name]
+
+        elite_penalised = candidates["penalties"][elite] > 0
+        blend("penalised", elite_penalised.mean(axis=0))
+        blend("strong", candidates["strong"][elite].mean(axis=0))
+        blend("unpredictable", candidates["unpredictable"][elite].mean(axis=0))
+        # Mean and spread of the penalty of each team over the elite candidates that penalise it
+        penalised_count = elite_penalised.sum(axis=0)
+        elite_penalties = np.where(elite_penalised, candidates["penalties"][elite], 0)
+        penalty_mean = np.where(penalised_count > 0, elite_penalties.sum(axis=0) / np.maximum(penalised_count, 1),
+                                distribution["penalty_mean"])
+        penalty_std = np.sqrt(np.where(elite_penalised, (candidates["penalties"][elite] - penalty_mean) ** 2, 0).sum(axis=0)
+                              / np.maximum(penalised_count, 1))
+        blend("penalty_mean", penalty_mean)
+        blend("penalty_std", np.maximum(penalty_std, 0.5))
+        elite_adjustments = np.stack((candidates["strong_boost"][elite], candidates["unpredictable_penalty"][elite]), axis=1)
+        blend("adjustment_mean", elite_adjustments.mean(axis=0))
+        blend("adjustment_std", np.maximum(elite_adjustments.std(axis=0), 0.5))
+
+    candidates = merge_candidates(*(candidates for candidates, _ in evaluated))
+    metrics = {name: np.concatenate([metrics[name] for _, metrics in evaluated]) for name in OBJECTIVES}
+    return candidates, metrics
+
+
+# Run a search for `formula` and return (config to keep, the metrics of the best candidate
+# and of the current config). The current config is kept when it is the best on the
+# training rounds or the best candidate does worse on the holdout rounds.
+def run_sweep(formatted_results_path, current, mode="random", count=2000, iterations=10, objective="brier",
+              holdout=0.2, workers=1, seed=None, warmup_rounds=WARMUP_ROUNDS, formula="formula"):
+    features = round_features(formatted_results_path, warmup_rounds)
+    rounds = features["both_scored"].size // features["round_size"]
+    train_rounds = rounds - int(rounds * holdout)
+    train = feature_rounds(features, 0, train_rounds)
+    test = feature_rounds(features, train_rounds, rounds)
+    base = default_prediction_config(formula)
+    size = int(max(features["home_ids"].max(initial=0), features["away_ids"].max(initial=0),
+                   *(team_id for config in (current, base)
+                     for name in ("penalty_teams", "strong_teams", "unpredictable_teams") for team_id in config[name]))) + 1
+    rng = np.random.default_rng(seed)
+
+    if mode == "grid":
+        candidates = restrict_to_formula(grid_candidates(base, size, formula == "logikai"), formula)
+        metrics = evaluate_all(candidates, train, workers)
+    elif mode == "random":
+        candidates = restrict_to_formula(random_candidates(rng, count, size), formula)
+        metrics = evaluate_all(candidates, train, workers)
+    else:
+        candidates, metrics = adaptive_candidates(rng, train, workers, count, iterations, objective, size, formula)
+    # The current config always competes
+    baseline = restrict_to_formula(candidates_from_configs([current], size), formula)
+    candidates = merge_candidates(baseline, candidates)
+    baseline_metrics = evaluate_candidates(baseline, train)
+    metrics = {name: np.concatenate((baseline_metrics[name], metrics[name])) for name in OBJECTIVES}
+
+    best = int(np.argmin(OBJECTIVES[objective] * metrics[objective]))
+    best_config = config_from_candidates(candidates, best)
+    chosen = merge_candidates(baseline, {name: values[best:best + 1] for name, values in candidates.items()})
+    holdout_metrics = evaluate_candidates(chosen, test) if test["both_scored"].size else None
+
+    def report(values, row):
+        return {name: float(values[name][row]) for name in OBJECTIVES} if values is not None else None
+
+    result = {
+        "train": report(metrics, best),
+        "holdout": report(holdout_metrics, 1),
+        "current_train": report(metrics, 0),
+        "current_holdout": report(holdout_metrics, 0),
+    }
+    sign = OBJECTIVES[objective]
+    result["improved"] = best > 0 and (holdout_metrics is None
+                                       or sign * holdout_metrics[objective][1] <= sign * holdout_metrics[objective][0])
+    if not result["improved"]:
+        return current, result
+    best_config["search"] = {"mode": mode, "formula": formula, "candidates": int(candidates["strong_boost"].size),
+                             "objective": objective, "train_rounds": train_rounds,
+                             "holdout_rounds": rounds - train_rounds}
+    best_config["metrics"] = {label: values for label, values in result.items() if label != "improved"}
+    return best_config, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune the penalties and team adjustments against the match history.")
+    add_data_arguments(parser)
+    parser.add_argument("--formula", choices=FORMULAS, default="formula",
+                        help="formula to tune: formula (penalties only) or logikai (penalties and team adjustments)")
+    parser.add_argument("--mode", choices=("grid", "random", "adaptive"), default="adaptive")
+    parser.add_argument("--candidates", type=int, default=2000, help="candidates (per iteration in adaptive mode)")
+    parser.add_argument("--iterations", type=int, default=10, help="iterations of the adaptive search")
+    parser.add_argument("--objective", choices=tuple(OBJECTIVES), default="brier")
+    parser.add_argument("--holdout", type=float, default=0.2, help="share of the last rounds kept for validation")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes to evaluate with")
+    parser.add_argument("--seed", type=int, help="random seed for reproducible searches")
+    parser.add_argument("--dry-run", action="store_true", help="report the best config without saving it")
+    args = parser.parse_args()
+
+    files = data_files(data_dir_from_args(args))
+    current = load_prediction_config(files["prediction_config"], args.formula)
+    best_config, result = run_sweep(files["formatted_results"], current, args.mode, args.candidates, args.iterations,
+                                    args.objective, args.holdout, args.workers, args.seed, formula=args.formula)
+
+    for label in ("current_train", "train", "current_holdout", "holdout"):
+        if result[label]:
+            values = result[label]
+            print(f"{label}: Brier {values['brier']:.4f}, log-loss {values['log_loss']:.4f}, "
+                  f"top-3 hit rate {values['top3_hit_rate']:.2f}%")
+    if not result["improved"]:
+        print(f"No candidate beats the current config on both the training and the holdout rounds. "
+              f"Keeping the current {args.formula} config.")
+        return
+    if args.formula == "logikai":
+        print(f"Best config: penalties {best_config['penalty_teams']}, strong {sorted(best_config['strong_teams'])} "
+              f"+{best_config['strong_boost']}, unpredictable {sorted(best_config['unpredictable_teams'])} "
+              f"-{best_config['unpredictable_penalty']}")
+    else:
+        print(f"Best config: penalties {best_config['penalty_teams']}")
+
+    if not args.dry_run:
+        try:
+            revision = save_prediction_config(best_config, files["prediction_config"], args.formula)
+            print(f"Revision {revision} of the prediction config has been saved to {files['prediction_config']}")
+        except IOError as e:
+            print(f"Error: Could not save the prediction config to {files['prediction_config']}. Reason: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from asof_stats import as_of_features
+from btts_matrix import BttsMatrix, write_btts_matrix
+from data_paths import add_data_arguments, data_dir_from_args, data_files, league_dir, list_leagues
+from fixtures import build_match_list, find_pluszpont, load_round_pairings, write_match_list, write_pluszpont
+from incremental_stats import update_snapshot
+from match_store import load_match_store
+from prediction_config import load_prediction_config
+from predictions import score_fixtures, team_esely, write_predictions
+from ratings import update_ratings
+from rivalry_index import RivalryIndex
+from team_aggregates import write_both_teams_score_stats, write_team_statistics_csv
+from teams import load_team_registry
+from windowed_stats import add_window_arguments, windowed_features
+
+# Single-process prediction pipeline.
+#
+# Runs the steps of match_data_generator.py, both_teams_to_score_stats.py,
+# team_statistics_calculator.py and generate_predictions.py as in-memory stages that
+# share the loaded history and aggregates. Only the prediction file is written by
+# default; the intermediate files become optional exports. Several leagues can be run
+# side by side in a process pool, each with its own data directory and team registry.
+
+
+# Write the intermediate files of the standalone scripts from the in-memory state
+def export_intermediates(files, state):
+    exports = [
+        ("upcoming_matches", lambda path: write_match_list(state["match_list"], path)),
+        ("pluszpont", lambda path: write_pluszpont(state["pluszpont"], path)),
+        ("both_teams_score_stats", lambda path: write_both_teams_score_stats(state["aggregates"].pairs, path)),
+        ("both_teams_score_matrix", lambda path: write_btts_matrix(state["btts_matrix"], path)),
+    ]
+    for name, write in exports:
+        try:
+            write(files[name])
+        except IOError as e:
+            print(f"Error: Could not export {files[name]}. Reason: {e}")
+
+    # Ratings are only needed for team_statistics.csv, so they are replayed here
+    try:
+        with load_match_store(files["formatted_results"]) as matches:
+            ratings = update_ratings(matches, files["ratings"])
+        write_team_statistics_csv(state["aggregates"].teams, files["team_statistics"], state["team_id_map"], ratings)
+    except IOError as e:
+        print(f"Error: Could not export {files['team_statistics']}. Reason: {e}")
+
+
+# Run every stage for the data directory and return the shared state.
+# With `window` (last N matches) or `half_life` the predictions use windowed statistics,
+# with `as_of` (a match_ID) the statistics of the history up to that match; the two exclude
+# each other. The penalty table comes from prediction_config.json unless `penalty_teams` is given.
+def run_pipeline(data_dir=None, export=False, penalty_teams=None, window=None, half_life=None, as_of=None):
+    if as_of is not None and (window is not None or half_life is not None):
+        raise ValueError("--as-of cannot be combined with --window or --half-life")
+    files = data_files(data_dir)
+    if penalty_teams is None:
+        penalty_teams = load_prediction_config(files["prediction_config"])["penalty_teams"]
+    state = {"timings": {}}
+
+    def stage(name, function):
+        start = time.perf_counter()
+        result = function()
+        state["timings"][name] = (time.perf_counter() - start) * 1000
+        return result
+
+    # Team registry of the league and the fixtures of the upcoming round
+    state["team_id_map"], state["team_ids"] = stage("teams", lambda: load_team_registry(files["team_data"]))
+    state["match_list"] = stage("fixtures", lambda: build_match_list(
+        load_round_pairings(files["round_pairings"]), state["team_ids"]))
+
+    # History aggregates, folding in only the matches appended since the last run
+    state["aggregates"] = stage("aggregates", lambda: update_snapshot(files["formatted_results"], files["snapshot"]))
+    state["pluszpont"] = stage("pluszpont", lambda: find_pluszpont(
+        state["match_list"], RivalryIndex.from_aggregates(state["aggregates"])))
+    state["btts_matrix"] = stage("btts_matrix", lambda: BttsMatrix.from_pairs(state["aggregates"].pairs))
+    state["esely"] = stage("esely", lambda: team_esely(state["aggregates"].teams))
+    state["head_to_head"] = state["btts_matrix"]
+    if window is not None or half_life is not None:
+        state["esely"], state["head_to_head"] = stage("windowed", lambda: windowed_features(
+            files["formatted_results"], files["windowed_snapshot"], window, half_life))
+    elif as_of is not None:
+        state["esely"], state["head_to_head"] = stage("as_of", lambda: as_of_features(
+            files["formatted_results"], as_of, index_path=files["asof_index"]))
+
+    # Predictions
+    state["predictions"], state["penalty_applied"] = stage("predictions", lambda: score_fixtures(
+        state["match_list"], state["esely"], state["head_to_head"], penalty_teams))
+    try:
+        state["output_file"] = stage("write", lambda: write_predictions(
+            state["predictions"], state["penalty_applied"], files["predictions"], "pipeline"))
+        print(f"Predictions have been saved to {state['output_file']}")
+    except IOError as e:
+        print(f"Error: Could not save predictions. Reason: {e}")
+
+    if export:
+        stage("export", lambda: export_intermediates(files, state))
+    return state
+
+
+# Run the pipeline for one league and keep what the caller needs, so it can cross process boundaries
+def run_league(data_dir, league=None, options=None):
+    if not Path(data_dir).is_dir():
+        return {"league": league, "data_dir": str(data_dir), "error": f"{data_dir} does not exist"}
+    try:
+        state = run_pipeline(data_dir, **(options or {}))
+    except (OSError, ValueError) as e:
+        return {"league": league, "data_dir": str(data_dir), "error": str(e)}
+    esely = state["esely"]
+    return {
+        "league": league,
+        "data_dir": str(data_dir),
+        "predictions": state["predictions"],
+        "penalty_applied": state["penalty_applied"],
+        "output_file": str(state.get("output_file", "")),
+        "team_statistics": {
+            state["team_id_map"].get(team_id, str(team_id)): dict(counts, Esély=esely.get(team_id, 0))
+            for team_id, counts in state["aggregates"].teams.items()
+        },
+        "timings": state["timings"],
+    }
+
+
+# Run the pipeline for several leagues of a data root, one league per worker process.
+# `leagues` holds league names, None standing for the league in the root itself.
+# Returns the per-league results in the order of `leagues`.
+def run_leagues(leagues, data_root=None, workers=None, **options):
+    jobs = [(league_dir(league, data_root), league, options) for league in leagues]
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(run_league, *zip(*jobs)))
+    return [run_league(*job) for job in jobs]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the whole prediction workflow in one process.")
+    add_data_arguments(parser)
+    parser.add_argument("--leagues", nargs="*", metavar="LEAGUE",
+                        help="run these leagues of the data root in parallel (no names: every league found there)")
+    parser.add_argument("--workers", type=int, help="processes for --leagues (default: one per core)")
+    parser.add_argument("--export", action="store_true",
+                        help="also write upcoming_matches.json, pluszpont.txt, team_statistics.csv and the both teams score stats")
+    # The statistics are either windowed or cut at a match_ID, not both
+    add_window_arguments(parser).add_argument("--as-of", type=int, help="only use the matches up to this match_ID")
+    args = parser.parse_args()
+
+    if args.leagues is not None:
+        leagues = args.leagues or list_leagues(args.data_root)
+        start = time.perf_counter()
+        results = run_leagues(leagues, args.data_root, args.workers, export=args.export,
+                              window=args.window, half_life=args.half_life, as_of=args.as_of)
+        elapsed = (time.perf_counter() - start) * 1000
+        for result in results:
+            name = result["league"] or "(root)"
+            if "error" in result:
+                print(f"{name}: Error: {result['error']}")
+            else:
+                print(f"{name}: {len(result['predictions'])} predictions in "
+                      f"{sum(result['timings'].values()):.2f} ms, saved to {result['output_file']}")
+        print(f"{len(results)} leagues finished in {elapsed:.2f} ms")
+        return
+
+    try:
+        state = run_pipeline(data_dir_from_args(args), export=args.export, window=args.window,
+                             half_life=args.half_life, as_of=args.as_of)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
+    timings = ", ".join(f"{name} {elapsed:.2f} ms" for name, elapsed in state["timings"].items())
+    print(f"Pipeline finished in {sum(state['timings'].values()):.2f} ms ({timings})")
+
+
+if __name__ == "__main__":
+    main()
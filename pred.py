@@ -1,8 +1,12 @@
 import json
-import re
 import os
 from collections import defaultdict
-from pathlib import Path
+
+from asof_stats import as_of_features, script_as_of
+from data_paths import script_data_files
+from feature_cache import load_team_features
+from predictions import write_predictions
+from windowed_stats import script_window, windowed_features
 
 # Error-handled file loading
 def load_file(file_path, default_value):
@@ -13,49 +17,27 @@ def load_file(file_path, default_value):
         print(f"Error: Unable to load {file_path}. Reason: {e}")
         return default_value
 
-# Load files with error handling
-both_teams_score_stats = load_file('D:\\2024.10.10-ASZTALMENTÉS!!!!\\pyhton_gyakorlas\\chatgpt\\both_teams_score_stats.txt', "")
-upcoming_matches = load_file('D:\\2024.10.10-ASZTALMENTÉS!!!!\\pyhton_gyakorlas\\chatgpt\\upcoming_matches.json', [])
-past_matches = load_file('D:\\2024.10.10-ASZTALMENTÉS!!!!\\pyhton_gyakorlas\\chatgpt\\formatted_results.json', [])
-
-# Initialize team statistics
-team_stats = defaultdict(lambda: {
-    "OMSZ": 0,  # Total number of matches
-    "MCSGM": 0,  # Matches where both teams scored
-    "Esély": 0   # Probability
-})
-
-# Process each past match to update statistics
-for match in past_matches:
-    try:
-        home_id = int(match["Hazai csapat ID"])
-        away_id = int(match["Vendég Csapat ID"])
-        home_goals = int(match["Hazai csapat gólszám"])
-        away_goals = int(match["Vendég Csapat gólszám"])
-        team_stats[home_id]["OMSZ"] += 1
-        team_stats[away_id]["OMSZ"] += 1
-        if home_goals > 0 and away_goals > 0:
-            team_stats[home_id]["MCSGM"] += 1
-            team_stats[away_id]["MCSGM"] += 1
-    except (KeyError, ValueError) as e:
-        print(f"Warning: Invalid match data {match}. Reason: {e}")
+# Load files with error handling (data folder from --data-dir/--league or the environment)
+files = script_data_files()
+upcoming_matches = load_file(str(files["upcoming_matches"]), [])
 
-# Calculate Esély for each team
-for team_id, stats in team_stats.items():
-    stats["Esély"] = (stats["MCSGM"] / stats["OMSZ"]) * 100 if stats["OMSZ"] > 0 else 0
-
-# Extract percentage from both teams score stats
-def extract_percentage_from_stats(home_team_id, away_team_id):
-    try:
-        pattern = rf"Team ID {home_team_id}:\n.*?Opponent ID {away_team_id}: (\d+)/(\d+) - (\d+\.\d+)%"
-        match = re.search(pattern, both_teams_score_stats, re.DOTALL)
-        if match:
-            both_score = int(match.group(1))
-            total_matches = int(match.group(2))
-            return both_score / total_matches * 100
-    except (ValueError, AttributeError) as e:
-        print(f"Error extracting stats for {home_team_id} vs {away_team_id}. Reason: {e}")
-    return 0
+# Esély of every team and the head-to-head matrix from the feature cache, recomputed only
+# when new results arrived.
+# With --as-of MATCH_ID only the matches up to that match count, head-to-head included.
+# With --window N (or --half-life H) only each team's and pairing's last N matches count.
+as_of = script_as_of()
+window, half_life = script_window()
+if window is not None or half_life is not None:
+    team_esely, btts_matrix = windowed_features(files["formatted_results"], files["windowed_snapshot"],
+                                                window, half_life)
+elif as_of is None:
+    features = load_team_features(files)
+    team_esely, btts_matrix = features["esely"], features["btts_matrix"]
+else:
+    team_esely, btts_matrix = as_of_features(files["formatted_results"], as_of, index_path=files["asof_index"])
+team_stats = defaultdict(lambda: {"Esély": 0})
+for team_id, esely in team_esely.items():
+    team_stats[team_id] = {"Esély": esely}
 
 # Calculate predictions
 predictions = []
@@ -64,7 +46,7 @@ for match in upcoming_matches:
         home_team_id = int(match["home_team_id"])
         away_team_id = int(match["away_team_id"])
         combined_esély = (team_stats[home_team_id]["Esély"] + team_stats[away_team_id]["Esély"]) / 2
-        both_teams_to_score = extract_percentage_from_stats(home_team_id, away_team_id)
+        both_teams_to_score = btts_matrix.percentage(home_team_id, away_team_id)
         final_probability = (combined_esély + both_teams_to_score) / 2
         predictions.append({
             "match": f"{match['home_team']} vs {match['away_team']}",
@@ -76,20 +58,8 @@ for match in upcoming_matches:
 # Sort predictions and write to file
 predictions.sort(key=lambda x: x["percentage"], reverse=True)
 
-base_path = Path('D:/2024.10.10-ASZTALMENTÉS!!!!/pyhton_gyakorlas/chatgpt/')
-output_file = base_path / 'prediction1.txt'
-file_index = 1
-while output_file.exists():
-    file_index += 1
-    output_file = base_path / f'prediction{file_index}.txt'
-
 try:
-    with open(output_file, 'w', encoding='utf-8') as file:
-        for i, prediction in enumerate(predictions):
-            if i < 3:
-                file.write(f"Top {i+1}: {prediction['match']} - {prediction['percentage']:.2f}%\n")
-            else:
-                file.write(f"{prediction['match']} - {prediction['percentage']:.2f}%\n")
+    output_file = write_predictions(predictions, (), files["predictions"], "pred")
     print(f"Predictions have been saved to {output_file}")
 except IOError as e:
-    print(f"Error: Could not save predictions to {output_file}. Reason: {e}")
\ No newline at end of file
+    print(f"Error: Could not save predictions. Reason: {e}")
@@ -0,0 +1,193 @@
+import argparse
+import json
+import os
+import re
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from atomic_files import write_text_atomic
+from data_paths import ARTIFACTS, add_data_arguments, data_dir_from_args, data_files
+
+# Archive of the written predictions.
+#
+# Every prediction gets the next sequence number of its data directory. The number is
+# kept in prediction_sequence.txt and taken under an exclusive lock on that file, so
+# workers running at the same time never pick the same predictionN.txt and no run has
+# to probe the existing files one by one. The text file is written under a temporary
+# name and renamed into place, and the same prediction is appended as one line of
+# prediction_archive.jsonl:
+#
+# {"sequence": 12, "file": "prediction12.txt", "created": "...", "source": "pipeline",
+#  "predictions": [{"match": "...", "percentage": 61.5, "home_team_id": 3, ...}, ...],
+#  "penalty_applied": [["...", 5], ...]}
+
+PREDICTION_FILE = re.compile(r'^prediction(\d+)\.txt$')
+PREDICTION_LINE = re.compile(r'^(?:Top \d+: )?(?P<match>.+) - (?P<percentage>-?[\d.]+)%(?P<penalty>\*?)$')
+PENALTY_LINE = re.compile(r'^(?P<match>.+) - (?P<penalty>-?[\d.]+) %$')
+
+
+@contextmanager
+def _locked(file):
+    if fcntl:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+    else:
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+    try:
+        yield file
+    finally:
+        if fcntl:
+            fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+        else:
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+# Highest N of the predictionN.txt files in a folder, read once to seed a new counter
+def last_prediction_index(base_path):
+    indexes = [int(match.group(1)) for match in map(PREDICTION_FILE.match, os.listdir(base_path)) if match]
+    return max(indexes, default=0)
+
+
+# Take the next sequence number of a folder
+def next_sequence(base_path):
+    base_path = Path(base_path)
+    with open(base_path / ARTIFACTS["prediction_sequence"], 'a+', encoding='utf-8') as counter, _locked(counter):
+        counter.seek(0)
+        content = counter.read().strip()
+        sequence = int(content) + 1 if content.isdigit() else last_prediction_index(base_path) + 1
+        counter.seek(0)
+        counter.truncate()
+        counter.write(f"{sequence}\n")
+        counter.flush()
+        os.fsync(counter.fileno())
+    return sequence
+
+
+def _record_prediction(prediction):
+    record = {"match": prediction["match"], "percentage": round(prediction["percentage"], 4)}
+    for key in ("home_team_id", "away_team_id"):
+        if key in prediction:
+            record[key] = prediction[key]
+    if prediction.get("penalty_applied"):
+        record["penalty_applied"] = True
+    return record
+
+
+# Append one record to the JSONL archive as a single write
+def append_archive_record(archive_path, record):
+    line = (json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8')
+    fd = os.open(archive_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+
+# Write the text of a prediction to the next predictionN.txt, archive it and return the text path
+def archive_prediction(base_path, text, predictions, penalty_applied=(), source=None):
+    base_path = Path(base_path)
+    sequence = next_sequence(base_path)
+    output_file = base_path / f'prediction{sequence}.txt'
+    write_text_atomic(output_file, text)
+    append_archive_record(base_path / ARTIFACTS["prediction_archive"], {
+        "sequence": sequence,
+        "file": output_file.name,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "source": source,
+        "predictions": [_record_prediction(prediction) for prediction in predictions],
+        "penalty_applied": [[match, penalty] for match, penalty in penalty_applied],
+    })
+    return output_file
+
+
+# Records of the JSONL archive in the order they were written; a torn last line is skipped
+def read_prediction_archive(archive_path):
+    try:
+        with open(archive_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"Warning: Skipping unreadable line in {archive_path}")
+    except FileNotFoundError:
+        return
+
+
+# Predictions and penalty deductions of a predictionN.txt in the text layout
+def parse_prediction_file(file_path):
+    predictions, penalty_applied = [], []
+    in_penalties = False
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("*Büntetésből levont érték"):
+                in_penalties = True
+                continue
+            if in_penalties:
+                match = PENALTY_LINE.match(line)
+                if match:
+                    penalty = float(match.group("penalty"))
+                    penalty_applied.append((match.group("match"), int(penalty) if penalty.is_integer() else penalty))
+                continue
+            match = PREDICTION_LINE.match(line)
+            if match:
+                prediction = {"match": match.group("match"), "percentage": float(match.group("percentage"))}
+                if match.group("penalty"):
+                    prediction["penalty_applied"] = True
+                predictions.append(prediction)
+    return predictions, penalty_applied
+
+
+# Add the predictionN.txt files that are not in the archive yet, oldest first
+def import_prediction_files(base_path):
+    base_path = Path(base_path)
+    archive_path = base_path / ARTIFACTS["prediction_archive"]
+    archived = {record.get("sequence") for record in read_prediction_archive(archive_path)}
+    files = sorted((int(match.group(1)), base_path / match.group(0))
+                   for match in map(PREDICTION_FILE.match, os.listdir(base_path)) if match)
+    imported = 0
+    for sequence, file_path in files:
+        if sequence in archived:
+            continue
+        predictions, penalty_applied = parse_prediction_file(file_path)
+        append_archive_record(archive_path, {
+            "sequence": sequence,
+            "file": file_path.name,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(file_path.stat().st_mtime)),
+            "source": "import",
+            "predictions": [_record_prediction(prediction) for prediction in predictions],
+            "penalty_applied": [list(item) for item in penalty_applied],
+        })
+        imported += 1
+    return imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show or fill the prediction archive of a data folder.")
+    add_data_arguments(parser)
+    parser.add_argument("--import-files", action="store_true", help="archive the predictionN.txt files written before the archive existed")
+    args = parser.parse_args()
+    files = data_files(data_dir_from_args(args))
+
+    if args.import_files:
+        print(f"Imported {import_prediction_files(files['predictions'])} prediction files")
+    records = list(read_prediction_archive(files["prediction_archive"]))
+    print(f"{len(records)} predictions in {files['prediction_archive']}")
+    for record in records[-5:]:
+        top = record["predictions"][0] if record["predictions"] else None
+        best = f"{top['match']} - {top['percentage']:.2f}%" if top else "no fixtures"
+        print(f"  #{record['sequence']} {record.get('created', '')} {best}")
+
+
+if __name__ == "__main__":
+    main()
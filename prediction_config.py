@@ -0,0 +1,126 @@
+import json
+import time
+
+from atomic_files import dump_json_atomic
+from predictions import PENALTY_TEAMS, STRONG_BOOST, STRONG_TEAMS, UNPREDICTABLE_PENALTY, UNPREDICTABLE_TEAMS
+
+# Tuned prediction parameters.
+#
+# prediction_config.json holds one section per prediction formula, found by
+# parameter_sweep.py for that formula:
+#   formula   the penalty table of generate_predictions.py, the pipeline, the daemon and the watcher
+#   logikai   the penalty table and strong/unpredictable team adjustments of winmi/logikaiprediction.py
+# The prediction scripts load the section of their formula in place of their hard-coded
+# values and fall back to those values when there is no config or no section.
+#
+# {"version": 2, "revision": 3, "created": "...",
+#  "formula": {"penalty_teams": {"9": 5, ...}, "search": {...}, "metrics": {...}},
+#  "logikai": {"penalty_teams": {...}, "strong_teams": [1, 2, 3], "unpredictable_teams": [4, 5, 6],
+#              "strong_boost": 5, "unpredictable_penalty": 5, "search": {...}, "metrics": {...}}}
+#
+# A version 1 file (one flat section) is read as the section of both formulas.
+
+CONFIG_VERSION = 2
+FORMULAS = ("formula", "logikai")
+
+
+def default_prediction_config(formula="formula"):
+    config = {
+        "version": CONFIG_VERSION,
+        "revision": 0,
+        "penalty_teams": dict(PENALTY_TEAMS),
+        "strong_teams": set(),
+        "unpredictable_teams": set(),
+        "strong_boost": 0,
+        "unpredictable_penalty": 0,
+    }
+    if formula == "logikai":
+        config.update({
+            "strong_teams": set(STRONG_TEAMS),
+            "unpredictable_teams": set(UNPREDICTABLE_TEAMS),
+            "strong_boost": STRONG_BOOST,
+            "unpredictable_penalty": UNPREDICTABLE_PENALTY,
+        })
+    return config
+
+
+def _read_section(config, section, formula):
+    config["penalty_teams"] = {int(team_id): penalty for team_id, penalty in section["penalty_teams"].items()}
+    if formula == "logikai":
+        config.update({
+            "strong_teams": {int(team_id) for team_id in section["strong_teams"]},
+            "unpredictable_teams": {int(team_id) for team_id in section["unpredictable_teams"]},
+            "strong_boost": section["strong_boost"],
+            "unpredictable_penalty": section["unpredictable_penalty"],
+        })
+    for key in ("search", "metrics"):
+        if key in section:
+            config[key] = section[key]
+
+
+# Load the config of a formula, using the built-in defaults when it is missing or unreadable
+def load_prediction_config(file_path, formula="formula"):
+    if formula not in FORMULAS:
+        raise ValueError(f"Unknown prediction formula {formula}")
+    config = default_prediction_config(formula)
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get("version") not in (1, CONFIG_VERSION):
+            raise ValueError(f"unsupported config version {data.get('version')}")
+        config["revision"] = int(data.get("revision", 0))
+        if "created" in data:
+            config["created"] = data["created"]
+        if data["version"] == 1:
+            _read_section(config, data, formula)
+        elif formula in data:
+            _read_section(config, data[formula], formula)
+    except FileNotFoundError:
+        pass
+    except (json.JSONDecodeError, KeyError, ValueError, TypeError, AttributeError) as e:
+        print(f"Warning: Ignoring unreadable prediction config {file_path}. Reason: {e}")
+        config = default_prediction_config(formula)
+    return config
+
+
+def _write_section(config, formula):
+    section = {"penalty_teams": {str(team_id): penalty for team_id, penalty in sorted(config["penalty_teams"].items())}}
+    if formula == "logikai":
+        section.update({
+            "strong_teams": sorted(config["strong_teams"]),
+            "unpredictable_teams": sorted(config["unpredictable_teams"]),
+            "strong_boost": config["strong_boost"],
+            "unpredictable_penalty": config["unpredictable_penalty"],
+        })
+    for key in ("search", "metrics"):
+        if key in config:
+            section[key] = config[key]
+    return section
+
+
+# Write the config of a formula as the next revision of the file, keeping the sections of
+# the other formulas
+def save_prediction_config(config, file_path, formula="formula"):
+    previous = {other: load_prediction_config(file_path, other) for other in FORMULAS}
+    data = {
+        "version": CONFIG_VERSION,
+        "revision": previous[formula]["revision"] + 1,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    for other in FORMULAS:
+        data[other] = _write_section(config if other == formula else previous[other], other)
+    dump_json_atomic(data, file_path, ensure_ascii=False, indent=4)
+    return data["revision"]
+
+
+# BatchScorer options of a config
+def scorer_options(config, adjustments=True):
+    options = {"penalty_teams": config["penalty_teams"]}
+    if adjustments:
+        options.update({
+            "strong_teams": config["strong_teams"],
+            "unpredictable_teams": config["unpredictable_teams"],
+            "strong_boost": config["strong_boost"],
+            "unpredictable_penalty": config["unpredictable_penalty"],
+        })
+    return options
@@ -0,0 +1,253 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import time
+
+from btts_matrix import BttsMatrix
+from data_paths import add_data_arguments, data_dir_from_args, data_files
+from feature_cache import load_team_features
+from fixtures import build_match_list, load_round_pairings
+from head_to_head_index import update_head_to_head_index
+from match_store import load_match_store
+from prediction_config import load_prediction_config
+from predictions import fixture_penalties, fixture_probability, score_fixtures
+from teams import load_team_registry
+
+# Long-running prediction service.
+#
+# Keeps the team Esély values, the head-to-head matrix and the upcoming fixtures in
+# memory and answers requests over a local Unix socket (or localhost TCP where Unix
+# sockets are not available). formatted_results.json and upcoming_round_matches.txt
+# are polled for changes; new results are folded in incrementally.
+#
+# Protocol: one JSON object per line in each direction.
+#   {"op": "predict", "home_id": 2, "away_id": 16}
+#   {"op": "round"}                                  the upcoming fixtures
+#   {"op": "round", "fixtures": [[2, 16], [15, 14]]}
+#   {"op": "head_to_head", "home_id": 10, "away_id": 14, "venue": "both", "last": 10,
+#    "min_goals": 3, "both_scored": true, "until": 8000}   filters are optional
+#   {"op": "status"}
+
+DEFAULT_POLL_INTERVAL = 1.0
+
+
+# File change marker: (size, mtime) or None when the file is missing
+def file_signature(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class PredictionModel:
+    def __init__(self, data_dir, penalty_teams=None):
+        self.files = data_files(data_dir)
+        # Fixed penalty table, or None to follow prediction_config.json
+        self.fixed_penalty_teams = penalty_teams
+        self.penalty_teams = penalty_teams or {}
+        self.results_signature = None
+        self.fixtures_signature = None
+        self.config_signature = None
+        self.esely = {}
+        self.btts_matrix = BttsMatrix()
+        self.top_opponents = {}
+        self.match_list = []
+        self.team_id_map = {}
+        self.last_match_id = 0
+        self.loaded_at = None
+        # Built on the first head-to-head request, extended after new results
+        self.head_to_head_index = None
+        self.head_to_head_stale = True
+
+    # Load the lookup tables from the feature cache, which folds in new results
+    def reload_results(self):
+        self.results_signature = file_signature(self.files["formatted_results"])
+        features = load_team_features(self.files)
+        self.esely = features["esely"]
+        self.btts_matrix = features["btts_matrix"]
+        self.top_opponents = features["top_opponents"]
+        self.last_match_id = features["last_match_id"]
+        self.head_to_head_stale = True
+        self.loaded_at = time.time()
+
+    # Fixtures change with upcoming_round_matches.txt and with the team registry
+    def current_fixtures_signature(self):
+        return file_signature(self.files["round_pairings"]), file_signature(self.files["team_data"])
+
+    def reload_fixtures(self):
+        self.fixtures_signature = self.current_fixtures_signature()
+        self.team_id_map, team_ids = load_team_registry(self.files["team_data"])
+        self.match_list = build_match_list(load_round_pairings(self.files["round_pairings"]), team_ids)
+
+    def reload_config(self):
+        self.config_signature = file_signature(self.files["prediction_config"])
+        if self.fixed_penalty_teams is None:
+            self.penalty_teams = load_prediction_config(self.files["prediction_config"])["penalty_teams"]
+
+    # Reload whatever changed on disk since the last check; returns the names of the reloaded parts
+    def refresh(self):
+        reloaded = set()
+        if self.loaded_at is None or file_signature(self.files["prediction_config"]) != self.config_signature:
+            self.reload_config()
+            reloaded.add("config")
+        if file_signature(self.files["formatted_results"]) != self.results_signature:
+            self.reload_results()
+            reloaded.add("results")
+        if self.current_fixtures_signature() != self.fixtures_signature:
+            self.reload_fixtures()
+            reloaded.add("fixtures")
+        return reloaded
+
+    def predict(self, home_id, away_id):
+        combined_esély, both_teams_to_score, final_probability = fixture_probability(
+            home_id, away_id, self.esely, self.btts_matrix)
+        penalty, _ = fixture_penalties(home_id, away_id, self.penalty_teams)
+        return {
+            "home_id": home_id,
+            "away_id": away_id,
+            "combined_esely": combined_esély,
+            "both_teams_to_score": both_teams_to_score,
+            "percentage": final_probability - penalty,
+            "penalty": penalty,
+        }
+
+    def predict_round(self, fixtures=None):
+        match_list = self.match_list
+        if fixtures is not None:
+            names = self.team_id_map
+            match_list = [
+                {"home_team": names.get(home_id, str(home_id)), "away_team": names.get(away_id, str(away_id)),
+                 "home_team_id": home_id, "away_team_id": away_id}
+                for home_id, away_id in fixtures
+            ]
+        predictions, _ = score_fixtures(match_list, self.esely, self.btts_matrix, self.penalty_teams)
+        return predictions
+
+    def head_to_head(self, home_id, away_id, venue="both", until=None, min_goals=None, both_scored=None, last=None):
+        if self.head_to_head_stale:
+            with load_match_store(self.files["formatted_results"]) as matches:
+                self.head_to_head_index = update_head_to_head_index(matches, self.head_to_head_index)
+            self.head_to_head_stale = False
+        summary = self.head_to_head_index.summary(home_id, away_id, venue, until, min_goals, both_scored, last)
+        return {"home_id": home_id, "away_id": away_id, "venue": venue, **summary}
+
+    def status(self):
+        return {
+            "last_match_id": self.last_match_id,
+            "fixtures": len(self.match_list),
+            "loaded_at": self.loaded_at,
+        }
+
+
+# Answer a single decoded request
+def handle_request(model, request):
+    if not isinstance(request, dict):
+        raise ValueError("A request must be a JSON object")
+    op = request.get("op")
+    if op == "predict":
+        return model.predict(int(request["home_id"]), int(request["away_id"]))
+    if op == "round":
+        fixtures = request.get("fixtures")
+        if fixtures is not None:
+            fixtures = [(int(home_id), int(away_id)) for home_id, away_id in fixtures]
+        return {"predictions": model.predict_round(fixtures)}
+    if op == "head_to_head":
+        filters = {key: int(request[key]) for key in ("until", "min_goals", "last") if request.get(key) is not None}
+        if request.get("both_scored") is not None:
+            filters["both_scored"] = bool(request["both_scored"])
+        return model.head_to_head(int(request["home_id"]), int(request["away_id"]), request.get("venue", "both"), **filters)
+    if op == "status":
+        return model.status()
+    raise ValueError(f"Unknown op: {op}")
+
+
+async def serve_client(model, reader, writer):
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                response = handle_request(model, json.loads(line))
+            except (ValueError, KeyError, TypeError) as e:
+                response = {"error": str(e)}
+            writer.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b"\n")
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+# Poll the input files and hot-reload the model when they change
+async def watch_files(model, interval):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            model.refresh()
+        except (OSError, ValueError) as e:
+            print(f"Error: Could not reload the model. Reason: {e}")
+
+
+async def run_daemon(data_dir, socket_path=None, host="127.0.0.1", port=None, poll_interval=DEFAULT_POLL_INTERVAL):
+    model = PredictionModel(data_dir)
+    model.refresh()
+
+    def handler(reader, writer):
+        return serve_client(model, reader, writer)
+
+    if port is None and hasattr(socket, "AF_UNIX"):
+        socket_path = socket_path or os.path.join(model.files["data_dir"], 'prediction.sock')
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = await asyncio.start_unix_server(handler, path=socket_path)
+        print(f"Prediction daemon listening on {socket_path}")
+    else:
+        socket_path = None
+        server = await asyncio.start_server(handler, host=host, port=port or 8765)
+        print(f"Prediction daemon listening on {host}:{port or 8765}")
+
+    watcher = asyncio.create_task(watch_files(model, poll_interval))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        watcher.cancel()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+# Send one request to a running daemon and return the decoded response
+def send_request(payload, socket_path=None, host="127.0.0.1", port=None):
+    if socket_path:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(socket_path)
+    else:
+        client = socket.create_connection((host, port or 8765))
+    with client, client.makefile('rwb') as stream:
+        stream.write(json.dumps(payload, ensure_ascii=False).encode('utf-8') + b"\n")
+        stream.flush()
+        return json.loads(stream.readline())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve predictions from memory over a local socket.")
+    add_data_arguments(parser)
+    parser.add_argument("--socket", help="Unix socket path (default: prediction.sock in the data folder)")
+    parser.add_argument("--host", default="127.0.0.1", help="TCP host when serving over TCP")
+    parser.add_argument("--port", type=int, help="serve over localhost TCP on this port instead of a Unix socket")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL,
+                        help="seconds between checks for new results and fixtures")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run_daemon(data_dir_from_args(args), args.socket, args.host, args.port, args.poll_interval))
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
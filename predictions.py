@@ -0,0 +1,99 @@
+from prediction_archive import archive_prediction
+
+# Both-teams-to-score predictions for a round of fixtures, as computed by
+# generate_predictions.py: the average of the two teams' Esély and the head-to-head
+# percentage, minus the penalties of specific teams. winmi/logikaiprediction.py also
+# moves the combined Esély of fixtures with strong or unpredictable teams.
+
+# team_id: penalty_percentage
+PENALTY_TEAMS = {9: 5, 10: 9, 14: 4}
+
+# Strong and unpredictable teams of winmi/logikaiprediction.py and how much they move
+# the combined Esély when either side of a fixture belongs to them
+STRONG_TEAMS = {1, 2, 3}
+UNPREDICTABLE_TEAMS = {4, 5, 6}
+STRONG_BOOST = 5
+UNPREDICTABLE_PENALTY = 5
+
+
+# Esély per team: share of its matches where both teams scored
+def team_esely(team_counts):
+    return {
+        team_id: (counts["MCSGM"] / counts["OMSZ"]) * 100 if counts["OMSZ"] > 0 else 0
+        for team_id, counts in team_counts.items()
+    }
+
+
+# Combined Esély, head-to-head percentage and final probability of one fixture.
+# `adjustments` (a logikai prediction config) holds the strong/unpredictable teams and
+# how much they move the combined Esély.
+def fixture_probability(home_team_id, away_team_id, esely, btts_matrix, adjustments=None):
+    combined_esély = (esely.get(home_team_id, 0) + esely.get(away_team_id, 0)) / 2
+    if adjustments:
+        if home_team_id in adjustments["strong_teams"] or away_team_id in adjustments["strong_teams"]:
+            combined_esély += adjustments["strong_boost"]
+        if home_team_id in adjustments["unpredictable_teams"] or away_team_id in adjustments["unpredictable_teams"]:
+            combined_esély -= adjustments["unpredictable_penalty"]
+    both_teams_to_score = btts_matrix.percentage(home_team_id, away_team_id)
+    return combined_esély, both_teams_to_score, (combined_esély + both_teams_to_score) / 2
+
+
+# Total penalty of a fixture and the penalties that make it up, home team first
+def fixture_penalties(home_team_id, away_team_id, penalty_teams):
+    penalties = [penalty_teams[team_id] for team_id in (home_team_id, away_team_id)
+                 if penalty_teams and team_id in penalty_teams]
+    return sum(penalties), penalties
+
+
+# Score the fixtures and apply the penalty deductions, best first.
+# Returns the predictions and the (match, penalty) deductions that were applied.
+def score_fixtures(match_list, esely, btts_matrix, penalty_teams=None, adjustments=None):
+    predictions = []
+    for match in match_list:
+        try:
+            home_team_id = int(match["home_team_id"])
+            away_team_id = int(match["away_team_id"])
+            _, _, final_probability = fixture_probability(
+                home_team_id, away_team_id, esely, btts_matrix, adjustments)
+            predictions.append({
+                "match": f"{match['home_team']} vs {match['away_team']}",
+                "percentage": final_probability,
+                "home_team_id": home_team_id,
+                "away_team_id": away_team_id
+            })
+        except KeyError as e:
+            print(f"Warning: Missing data for match {match}. Reason: {e}")
+
+    # Apply penalty deductions for specific teams
+    penalty_applied = []
+    for prediction in predictions:
+        _, penalties = fixture_penalties(prediction["home_team_id"], prediction["away_team_id"], penalty_teams)
+        for penalty in penalties:
+            prediction["percentage"] -= penalty
+            penalty_applied.append((prediction["match"], penalty))
+            prediction["penalty_applied"] = True
+
+    predictions.sort(key=lambda x: x["percentage"], reverse=True)
+    return predictions, penalty_applied
+
+
+# Text layout of a prediction file
+def format_predictions(predictions, penalty_applied=()):
+    lines = []
+    for i, prediction in enumerate(predictions):
+        penalty_marker = '*' if prediction.get("penalty_applied") else ''
+        if i < 3:
+            lines.append(f"Top {i+1}: {prediction['match']} - {prediction['percentage']:.2f}%{penalty_marker}\n")
+        else:
+            lines.append(f"{prediction['match']} - {prediction['percentage']:.2f}%{penalty_marker}\n")
+    if penalty_applied:
+        lines.append("\n*Büntetésből levont érték:\n")
+        for match, penalty in penalty_applied:
+            lines.append(f"{match} - {penalty} %\n")
+    return "".join(lines)
+
+
+# Write predictions to the next predictionN.txt, add them to the archive and return the text path
+def write_predictions(predictions, penalty_applied, base_path, source=None):
+    return archive_prediction(base_path, format_predictions(predictions, penalty_applied),
+                              predictions, penalty_applied, source)
@@ -0,0 +1,171 @@
+import json
+import math
+
+from atomic_files import dump_json_atomic
+
+# Sequential ELO and Glicko-2 ratings replayed over the match history in match_ID order.
+#
+# The rating state is checkpointed every CHECKPOINT_INTERVAL matches, so bringing the
+# ratings up to date after a new round replays only the matches since the latest
+# checkpoint instead of the whole history.
+
+ELO_START = 1500
+ELO_K = 20  # Maximum ELO change per match
+
+GLICKO_START = 1500
+GLICKO_RD_START = 350
+GLICKO_VOLATILITY_START = 0.06
+GLICKO_TAU = 0.5  # Constrains how fast the volatility changes
+GLICKO_SCALE = 173.7178  # Glicko-2 internal scale factor
+GLICKO_EPSILON = 0.000001  # Convergence tolerance of the volatility iteration
+
+CHECKPOINT_INTERVAL = 1000
+CHECKPOINTS_KEPT = 5
+
+
+# One Glicko-2 update of a player against a single opponent (score 1 = win, 0.5 = draw, 0 = loss)
+def glicko2_update(rating, rd, volatility, opponent_rating, opponent_rd, score):
+    mu = (rating - GLICKO_START) / GLICKO_SCALE
+    phi = rd / GLICKO_SCALE
+    opponent_mu = (opponent_rating - GLICKO_START) / GLICKO_SCALE
+    opponent_phi = opponent_rd / GLICKO_SCALE
+
+    g = 1 / math.sqrt(1 + 3 * opponent_phi ** 2 / math.pi ** 2)
+    expected = 1 / (1 + math.exp(-g * (mu - opponent_mu)))
+    variance = 1 / (g ** 2 * expected * (1 - expected))
+    delta = variance * g * (score - expected)
+
+    # New volatility via the Illinois algorithm (Glickman, step 5)
+    a = math.log(volatility ** 2)
+
+    def f(x):
+        ex = math.exp(x)
+        return (ex * (delta ** 2 - phi ** 2 - variance - ex) / (2 * (phi ** 2 + variance + ex) ** 2)
+                - (x - a) / GLICKO_TAU ** 2)
+
+    lower = a
+    if delta ** 2 > phi ** 2 + variance:
+        upper = math.log(delta ** 2 - phi ** 2 - variance)
+    else:
+        k = 1
+        while f(a - k * GLICKO_TAU) < 0:
+            k += 1
+        upper = a - k * GLICKO_TAU
+    f_lower = f(lower)
+    f_upper = f(upper)
+    while abs(upper - lower) > GLICKO_EPSILON:
+        middle = lower + (lower - upper) * f_lower / (f_upper - f_lower)
+        f_middle = f(middle)
+        if f_middle * f_upper <= 0:
+            lower, f_lower = upper, f_upper
+        else:
+            f_lower /= 2
+        upper, f_upper = middle, f_middle
+    new_volatility = math.exp(lower / 2)
+
+    pre_phi = math.sqrt(phi ** 2 + new_volatility ** 2)
+    new_phi = 1 / math.sqrt(1 / pre_phi ** 2 + 1 / variance)
+    new_mu = mu + new_phi ** 2 * g * (score - expected)
+    return GLICKO_START + GLICKO_SCALE * new_mu, GLICKO_SCALE * new_phi, new_volatility
+
+
+class RatingState:
+    def __init__(self):
+        # team_id -> {"elo", "rating", "rd", "volatility"}
+        self.teams = {}
+        # Number of store rows replayed and the match_ID of the last one
+        self.rows = 0
+        self.last_match_id = 0
+
+    def _team(self, team_id):
+        team = self.teams.get(team_id)
+        if team is None:
+            team = self.teams[team_id] = {
+                "elo": ELO_START,
+                "rating": GLICKO_START,
+                "rd": GLICKO_RD_START,
+                "volatility": GLICKO_VOLATILITY_START,
+            }
+        return team
+
+    # Update both teams' ratings with the result of a single match
+    def add_match(self, match_id, home_id, away_id, home_goals, away_goals):
+        home = self._team(home_id)
+        away = self._team(away_id)
+        score = 1.0 if home_goals > away_goals else 0.0 if home_goals < away_goals else 0.5
+
+        # ELO
+        expected = 1 / (1 + 10 ** ((away["elo"] - home["elo"]) / 400))
+        change = ELO_K * (score - expected)
+        home["elo"] += change
+        away["elo"] -= change
+
+        # Glicko-2, each match is its own rating period for both teams
+        home_update = glicko2_update(home["rating"], home["rd"], home["volatility"], away["rating"], away["rd"], score)
+        away_update = glicko2_update(away["rating"], away["rd"], away["volatility"], home["rating"], home["rd"], 1 - score)
+        home["rating"], home["rd"], home["volatility"] = home_update
+        away["rating"], away["rd"], away["volatility"] = away_update
+
+        self.rows += 1
+        self.last_match_id = match_id
+
+    def to_dict(self):
+        return {
+            "rows": self.rows,
+            "last_match_id": self.last_match_id,
+            "teams": [[team_id, dict(team)] for team_id, team in self.teams.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls()
+        state.rows = int(data["rows"])
+        state.last_match_id = int(data["last_match_id"])
+        for team_id, team in data["teams"]:
+            state.teams[int(team_id)] = {key: float(team[key]) for key in ("elo", "rating", "rd", "volatility")}
+        return state
+
+
+# Load the saved checkpoints, oldest first
+def load_checkpoints(file_path):
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return [RatingState.from_dict(checkpoint) for checkpoint in json.load(f)["checkpoints"]]
+    except FileNotFoundError:
+        return []
+    except (json.JSONDecodeError, KeyError, ValueError, TypeError) as e:
+        print(f"Warning: Ignoring unreadable rating checkpoints {file_path}. Reason: {e}")
+        return []
+
+
+def save_checkpoints(checkpoints, file_path):
+    dump_json_atomic({"checkpoints": [checkpoint.to_dict() for checkpoint in checkpoints]}, file_path)
+
+
+# Whether a checkpoint was taken from the first rows of this match history
+def checkpoint_matches(checkpoint, matches):
+    return checkpoint.rows > 0 and matches.has_prefix(checkpoint.rows, checkpoint.last_match_id)
+
+
+# Replay the history from the latest usable checkpoint and return the current ratings
+def update_ratings(matches, checkpoint_path, interval=CHECKPOINT_INTERVAL):
+    checkpoints = load_checkpoints(checkpoint_path)
+    saved = len(checkpoints)
+    # Checkpoints past a change in the history are useless
+    while checkpoints and not checkpoint_matches(checkpoints[-1], matches):
+        checkpoints.pop()
+    changed = len(checkpoints) != saved
+
+    state = RatingState.from_dict(checkpoints[-1].to_dict()) if checkpoints else RatingState()
+    for match in matches.iter_from(state.rows):
+        state.add_match(*match)
+        if state.rows % interval == 0:
+            checkpoints.append(RatingState.from_dict(state.to_dict()))
+            changed = True
+
+    if changed:
+        try:
+            save_checkpoints(checkpoints[-CHECKPOINTS_KEPT:], checkpoint_path)
+        except IOError as e:
+            print(f"Error: Could not save rating checkpoints to {checkpoint_path}. Reason: {e}")
+    return state
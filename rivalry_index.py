@@ -0,0 +1,91 @@
+import json
+
+from atomic_files import write_text_atomic
+from data_paths import script_data_files
+from feature_cache import TOP_OPPONENTS, load_team_features
+from teams import load_team_registry
+
+# Top opponents ("rivals") of every team.
+#
+# The k most frequent opponents of a team are selected with a heap from the opponent
+# counts of the aggregate snapshot (TeamAggregates.top_opponents), so they follow new
+# results without a rescan of the history. Each team's rivals are also kept as a bitset of team IDs, which makes
+# the "+ 5 %" rivalry check of a fixture a single bit test.
+#
+# The fixture scripts build the index from the live aggregates or the feature cache, so
+# the rivalry check follows new results. vsport_teamdata.json is generated from the
+# index (write_team_data) rather than maintained by hand.
+
+
+class RivalryIndex:
+    def __init__(self, top_opponents):
+        # team_id -> [(opponent_id, matches), ...], most frequent first
+        self.top_opponents = {team_id: list(opponents) for team_id, opponents in top_opponents.items()}
+        # team_id -> bitset of the rival team IDs
+        self.rivals = {
+            team_id: sum(1 << opponent_id for opponent_id, _ in opponents)
+            for team_id, opponents in self.top_opponents.items()
+        }
+
+    @classmethod
+    def from_aggregates(cls, aggregates, count=TOP_OPPONENTS):
+        return cls({team_id: aggregates.top_opponents(team_id, count) for team_id in aggregates.teams})
+
+    def is_rival(self, team_id, opponent_id):
+        return bool(self.rivals.get(team_id, 0) >> opponent_id & 1)
+
+
+# vsport_teamdata.json records of every team. Teams keep the position they have in
+# `previous_teams` (the current file) so regenerating it only changes what changed.
+def team_data_records(index, esely, team_id_map, previous_teams=()):
+    order = [team["team_id"] for team in previous_teams if team.get("team_id") in index.top_opponents]
+    listed = set(order)
+    order += sorted(team_id for team_id in index.top_opponents if team_id not in listed)
+    return [
+        {
+            "team_name": team_id_map.get(team_id, str(team_id)),
+            "team_id": team_id,
+            "win_probability": round(esely.get(team_id, 0), 2),
+            "top_opponents": [
+                {"opponent_name": team_id_map.get(opponent_id, str(opponent_id)),
+                 "opponent_id": opponent_id, "matches": matches}
+                for opponent_id, matches in index.top_opponents[team_id]
+            ],
+        }
+        for team_id in order
+    ]
+
+
+# Lay out the team records the way vsport_teamdata.json is written, one opponent per line
+def format_team_data(records):
+    blocks = []
+    for record in records:
+        fields = [f'            {json.dumps(key)}: {json.dumps(record[key], ensure_ascii=False)}'
+                  for key in ("team_name", "team_id", "win_probability")]
+        opponents = ",\n".join(f"                {json.dumps(entry, ensure_ascii=False)}"
+                               for entry in record["top_opponents"])
+        fields.append(f'            "top_opponents": [\n{opponents}\n            ]')
+        blocks.append("        {\n" + ",\n".join(fields) + "\n        }")
+    return '{\n    "teams": [\n' + ",\n".join(blocks) + "\n    ]\n}"
+
+
+# Regenerate vsport_teamdata.json from the rivalry index, via a temporary file
+def write_team_data(index, esely, team_id_map, team_data_path):
+    try:
+        with open(team_data_path, 'r', encoding='utf-8') as f:
+            previous_teams = json.load(f).get("teams", [])
+    except (FileNotFoundError, json.JSONDecodeError, AttributeError):
+        previous_teams = []
+    write_text_atomic(team_data_path, format_team_data(team_data_records(index, esely, team_id_map, previous_teams)))
+
+
+if __name__ == "__main__":
+    # Data folder from --data-dir/--league or the environment
+    files = script_data_files()
+    features = load_team_features(files)
+    team_id_map, _ = load_team_registry(files["team_data"])
+    try:
+        write_team_data(RivalryIndex(features["top_opponents"]), features["esely"], team_id_map, files["team_data"])
+        print(f"Team data has been saved to {files['team_data']}")
+    except IOError as e:
+        print(f"Error writing team data: {e}")
@@ -0,0 +1,219 @@
+import argparse
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+
+from data_paths import add_data_arguments, data_dir_from_args
+from fixtures import find_pluszpont, write_match_list, write_pluszpont
+from ingest_results import ingest_feed
+from prediction_daemon import PredictionModel, file_signature
+from predictions import score_fixtures, write_predictions
+from rivalry_index import RivalryIndex
+
+# Event-driven runner for a new round.
+#
+# Watches the data folder for saves of upcoming_round_matches.txt, formatted_results.json,
+# the team data and prediction_config.json (inotify on Linux, polling elsewhere), and with
+# --ingest also the results feed. A burst of writes is collected until the folder is quiet
+# for the debounce time, then only the stages whose inputs changed run:
+#   results feed        ingest its new records into formatted_results.json (--ingest only)
+#   match history       fold the new results into the cached team features
+#   fixtures/team data  reparse the round
+#   history or fixtures write upcoming_matches.json and pluszpont.txt (rivals from the features)
+#   any of the above    score the round and write the next predictionN.txt
+# The model stays in memory between rounds, so a new round costs a parse and a scoring pass.
+
+DEFAULT_DEBOUNCE = 0.2
+DEFAULT_POLL_INTERVAL = 0.1
+# A steady stream of writes is handled at least this often
+MAX_DEBOUNCE_WAIT = 2.0
+
+WATCHED = ("round_pairings", "formatted_results", "team_data", "prediction_config")
+
+# inotify(7) constants
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+EVENT_HEADER = struct.Struct("iIII")
+
+
+# Changes of the watched files through inotify; raises OSError where it is not available
+class InotifyWatcher:
+    def __init__(self, files, names=WATCHED):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        # Editors save by replacing the file, so the folder is watched rather than the files
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_MODIFY
+        if libc.inotify_add_watch(self.fd, os.fsencode(files["data_dir"]), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"Cannot watch {files['data_dir']}")
+        self.names = {os.fsencode(files[name].name): name for name in names}
+
+    # Names of the watched files that changed, waiting up to `timeout` seconds (None: forever)
+    def wait(self, timeout=None):
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return set()
+        changed = set()
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = self.names.get(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if name:
+                changed.add(name)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+# Changes of the watched files found by comparing their size and mtime
+class PollingWatcher:
+    def __init__(self, files, names=WATCHED, interval=DEFAULT_POLL_INTERVAL):
+        self.paths = {name: files[name] for name in names}
+        self.interval = interval
+        self.signatures = {name: file_signature(path) for name, path in self.paths.items()}
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            changed = set()
+            for name, path in self.paths.items():
+                signature = file_signature(path)
+                if signature != self.signatures[name]:
+                    self.signatures[name] = signature
+                    changed.add(name)
+            if changed:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return changed
+            time.sleep(self.interval if deadline is None else max(0, min(self.interval, deadline - time.monotonic())))
+
+    def close(self):
+        pass
+
+
+# inotify where the platform has it, polling otherwise (or when `poll` is set)
+def open_watcher(files, names=WATCHED, poll=False, poll_interval=DEFAULT_POLL_INTERVAL):
+    if not poll:
+        try:
+            return InotifyWatcher(files, names)
+        except (OSError, AttributeError, TypeError) as e:
+            print(f"Warning: inotify is not available ({e}). Polling for changes instead.")
+    return PollingWatcher(files, names, poll_interval)
+
+
+# Wait for a change and collect the burst of writes that follows it
+def collect_changes(watcher, debounce=DEFAULT_DEBOUNCE, max_wait=MAX_DEBOUNCE_WAIT):
+    changed = watcher.wait()
+    deadline = time.monotonic() + max_wait
+    while changed and time.monotonic() < deadline:
+        more = watcher.wait(min(debounce, max(0, deadline - time.monotonic())))
+        if not more:
+            break
+        changed |= more
+    return changed
+
+
+class RoundRunner:
+    # With `ingest` a change of the results feed ingests its new records
+    def __init__(self, data_dir, ingest=False):
+        self.model = PredictionModel(data_dir)
+        self.files = self.model.files
+        self.ingest = ingest
+        self.watched = WATCHED + ("results_feed",) if ingest else WATCHED
+        self.feed_signature = file_signature(self.files["results_feed"])
+        self.model.refresh()
+
+    # Run the stages whose inputs are among `changed`; returns the written prediction file or None
+    def run(self, changed):
+        start = time.perf_counter()
+        if self.ingest and "results_feed" in changed and file_signature(self.files["results_feed"]) != self.feed_signature:
+            self.feed_signature = file_signature(self.files["results_feed"])
+            count = ingest_feed(self.files["results_feed"], self.files["formatted_results"])
+            print(f"Ingested {count} new matches from {self.files['results_feed']}")
+
+        previous_match_list = self.model.match_list
+        reloaded = self.model.refresh()
+        if "fixtures" in reloaded:
+            if not self.model.match_list:
+                # Keep the last good round while the file is half-written or invalid
+                print("Warning: The upcoming round has no valid fixtures. Keeping the previous round.")
+                self.model.match_list = previous_match_list
+                reloaded.discard("fixtures")
+            elif self.model.match_list == previous_match_list:
+                reloaded.discard("fixtures")
+        if not reloaded or not self.model.match_list:
+            return None
+        if reloaded & {"fixtures", "results"}:
+            # pluszpont.txt follows the rivals of the current history as well as the fixtures
+            self.export_fixtures()
+
+        predictions, penalty_applied = score_fixtures(
+            self.model.match_list, self.model.esely, self.model.btts_matrix, self.model.penalty_teams)
+        output_file = write_predictions(predictions, penalty_applied, self.files["predictions"], "watcher")
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"Predictions have been saved to {output_file} in {elapsed:.2f} ms "
+              f"({', '.join(sorted(reloaded))} changed)")
+        return output_file
+
+    # Write upcoming_matches.json and pluszpont.txt as match_data_generator.py does
+    def export_fixtures(self):
+        rivals = RivalryIndex(self.model.top_opponents)
+        for name, write in (("upcoming_matches", lambda path: write_match_list(self.model.match_list, path)),
+                            ("pluszpont", lambda path: write_pluszpont(find_pluszpont(self.model.match_list, rivals), path))):
+            try:
+                write(self.files[name])
+            except IOError as e:
+                print(f"Error: Could not write {self.files[name]}. Reason: {e}")
+
+
+def run_watcher(data_dir, debounce=DEFAULT_DEBOUNCE, poll=False, poll_interval=DEFAULT_POLL_INTERVAL, ingest=False):
+    runner = RoundRunner(data_dir, ingest)
+    watcher = open_watcher(runner.files, runner.watched, poll, poll_interval)
+    print(f"Watching {runner.files['data_dir']} for new rounds and results "
+          f"({'polling' if isinstance(watcher, PollingWatcher) else 'inotify'})")
+    try:
+        while True:
+            changed = collect_changes(watcher, debounce)
+            try:
+                runner.run(changed)
+            except (OSError, ValueError) as e:
+                print(f"Error: Could not process the changes to {', '.join(sorted(changed))}. Reason: {e}")
+    finally:
+        watcher.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Predict each new round as soon as its pairings are saved.")
+    add_data_arguments(parser)
+    parser.add_argument("--debounce", type=float, default=DEFAULT_DEBOUNCE,
+                        help="seconds without writes before a burst of changes is processed")
+    parser.add_argument("--ingest", action="store_true",
+                        help="also watch the results feed and ingest its new records (progress is kept in ingest_state.json)")
+    parser.add_argument("--poll", action="store_true", help="poll the files instead of using inotify")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL,
+                        help="seconds between checks when polling")
+    args = parser.parse_args()
+    try:
+        run_watcher(data_dir_from_args(args), args.debounce, args.poll, args.poll_interval, args.ingest)
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+import argparse
+import json
+
+import numpy as np
+
+from atomic_files import dump_json_atomic
+from data_paths import add_data_arguments, data_dir_from_args, data_files
+from fixtures import build_match_list, load_round_pairings
+from match_store import load_match_store, reuse_or_rebuild
+from simulator import OVER_UNDER_LINES
+from stats_kernel import count_scores, store_arrays
+from teams import load_team_registry
+
+# Empirical score distribution of every pairing and the betting markets read from it.
+#
+# The history is kept as a count cube [home_id, away_id, home_goals, away_goals] that
+# new results are added to. The over/under, correct score, 1X2 and BTTS probabilities
+# of a fixture are sums over masked slices of its [home_goals, away_goals] plane, and a
+# whole round is answered by one gather and a few tensor contractions.
+#
+# score_cube.json: {"rows": n, "last_match_id": id, "shape": [...], "cells": [[h, a, hg, ag, count], ...]}
+
+TOP_SCORES = 5
+
+
+class ScoreCube:
+    def __init__(self, counts=None):
+        self.counts = np.zeros((0, 0, 0, 0), dtype=np.int64) if counts is None else counts
+        self.rows = 0
+        self.last_match_id = 0
+
+    # Grow the cube so it covers team IDs below `size` and goal counts below `goals`
+    def _reserve(self, size, goals):
+        shape = self.counts.shape
+        if size <= shape[0] and goals <= shape[2]:
+            return
+        size, goals = max(size, shape[0]), max(goals, shape[2])
+        grown = np.zeros((size, size, goals, goals), dtype=np.int64)
+        grown[:shape[0], :shape[1], :shape[2], :shape[3]] = self.counts
+        self.counts = grown
+
+    # Add the rows of a match store from row `start` on
+    def extend(self, matches, start=None):
+        start = self.rows if start is None else start
+        match_ids, home_ids, away_ids, home_goals, away_goals = (column[start:] for column in store_arrays(matches))
+        if not match_ids.size:
+            return self
+        self._reserve(int(max(home_ids.max(), away_ids.max())) + 1, int(max(home_goals.max(), away_goals.max())) + 1)
+        size, goals = self.counts.shape[0], self.counts.shape[2]
+        self.counts += count_scores(home_ids, away_ids, home_goals, away_goals, size, goals)
+        self.rows = start + match_ids.size
+        self.last_match_id = int(match_ids[-1])
+        return self
+
+    # Score count planes [fixture, home_goals, away_goals] of a round; with `reverse`
+    # the reverse fixtures are added, seen from the listed home team
+    def planes(self, home_ids, away_ids, reverse=False):
+        home_ids = np.asarray(home_ids, dtype=np.intp)
+        away_ids = np.asarray(away_ids, dtype=np.intp)
+        size, goals = self.counts.shape[0], self.counts.shape[2]
+        known = (home_ids < size) & (away_ids < size)
+        planes = np.zeros((home_ids.size, goals, goals), dtype=np.int64)
+        planes[known] = self.counts[home_ids[known], away_ids[known]]
+        if reverse:
+            planes[known] += self.counts[away_ids[known], home_ids[known]].transpose(0, 2, 1)
+        return planes
+
+    def to_dict(self):
+        cells = np.argwhere(self.counts)
+        return {
+            "rows": self.rows,
+            "last_match_id": self.last_match_id,
+            "shape": list(self.counts.shape),
+            "cells": [[*map(int, cell), int(self.counts[tuple(cell)])] for cell in cells],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        counts = np.zeros(tuple(int(n) for n in data["shape"]), dtype=np.int64)
+        for *cell, count in data["cells"]:
+            counts[tuple(cell)] = count
+        cube = cls(counts)
+        cube.rows = int(data["rows"])
+        cube.last_match_id = int(data["last_match_id"])
+        return cube
+
+
+# Market probabilities (in percent) of every fixture of a round, in one vectorised pass
+def market_board(cube, home_ids, away_ids, reverse=False, lines=OVER_UNDER_LINES, top_scores=TOP_SCORES):
+    planes = cube.planes(home_ids, away_ids, reverse)
+    fixtures, goals = planes.shape[0], planes.shape[1]
+    matches = planes.sum(axis=(1, 2))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        probabilities = np.where(matches[:, None, None] > 0, planes / matches[:, None, None], 0.0)
+
+    home_goal_values, away_goal_values = np.meshgrid(np.arange(goals), np.arange(goals), indexing='ij')
+    total_goals = home_goal_values + away_goal_values
+    masks = np.stack([
+        (home_goal_values > 0) & (away_goal_values > 0),
+        home_goal_values > away_goal_values,
+        home_goal_values == away_goal_values,
+        home_goal_values < away_goal_values,
+        *(total_goals > line for line in lines),
+    ]).astype(float)
+    markets = np.tensordot(probabilities, masks, axes=([1, 2], [1, 2])) * 100
+    flat = probabilities.reshape(fixtures, -1)
+    best = np.argsort(-flat, axis=1, kind='stable')[:, :top_scores]
+
+    board = []
+    for fixture in range(fixtures):
+        values = markets[fixture].tolist()
+        board.append({
+            "home_team_id": int(home_ids[fixture]),
+            "away_team_id": int(away_ids[fixture]),
+            "matches": int(matches[fixture]),
+            "both_teams_to_score": values[0],
+            "home_win": values[1],
+            "draw": values[2],
+            "away_win": values[3],
+            "over": {str(line): value for line, value in zip(lines, values[4:])},
+            "under": {str(line): 100 - value if matches[fixture] else 0 for line, value in zip(lines, values[4:])},
+            "exact_scores": {f"{cell // goals}:{cell % goals}": float(flat[fixture, cell]) * 100
+                             for cell in best[fixture].tolist() if flat[fixture, cell] > 0},
+        })
+    return board
+
+
+# Load the persisted cube, starting empty when there is none
+def load_score_cube(file_path):
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return ScoreCube.from_dict(json.load(f))
+    except FileNotFoundError:
+        return ScoreCube()
+    except (json.JSONDecodeError, KeyError, ValueError, TypeError, IndexError) as e:
+        print(f"Warning: Ignoring unreadable score cube {file_path}. Reason: {e}")
+        return ScoreCube()
+
+
+def save_score_cube(cube, file_path):
+    dump_json_atomic(cube.to_dict(), file_path)
+
+
+# Bring the score cube of a formatted_results.json up to date and return it
+def update_score_cube(formatted_results_path, cube_path):
+    loaded = load_score_cube(cube_path)
+    previous_rows = loaded.rows
+    with load_match_store(formatted_results_path) as matches:
+        cube = reuse_or_rebuild(loaded, matches, ScoreCube, "score cube")
+        cube.extend(matches)
+    if cube is not loaded or cube.rows != previous_rows:
+        try:
+            save_score_cube(cube, cube_path)
+        except IOError as e:
+            print(f"Error: Could not save score cube to {cube_path}. Reason: {e}")
+    return cube
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Market probabilities of the upcoming round from past scores.")
+    add_data_arguments(parser)
+    parser.add_argument("--reverse", action="store_true", help="also count the reverse fixtures of each pairing")
+    args = parser.parse_args()
+
+    files = data_files(data_dir_from_args(args))
+    cube = update_score_cube(files["formatted_results"], files["score_cube"])
+    team_id_map, team_ids = load_team_registry(files["team_data"])
+    match_list = build_match_list(load_round_pairings(files["round_pairings"]), team_ids)
+    board = market_board(cube, [match["home_team_id"] for match in match_list],
+                         [match["away_team_id"] for match in match_list], args.reverse)
+    for fixture in board:
+        print(f"{team_id_map.get(fixture['home_team_id'])} vs {team_id_map.get(fixture['away_team_id'])}"
+              f" ({fixture['matches']} matches) - 1X2 {fixture['home_win']:.1f}/{fixture['draw']:.1f}/"
+              f"{fixture['away_win']:.1f}%, BTTS {fixture['both_teams_to_score']:.2f}%, over 2.5 {fixture['over']['2.5']:.2f}%")
+
+    try:
+        with open(files["market_board"], 'w', encoding='utf-8') as f:
+            json.dump(board, f, ensure_ascii=False, indent=4)
+        print(f"Market board has been saved to {files['market_board']}")
+    except IOError as e:
+        print(f"Error: Could not save the market board to {files['market_board']}. Reason: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+import argparse
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from batch_scorer import all_pairings
+from data_paths import add_data_arguments, data_dir_from_args, data_files
+from fixtures import build_match_list, load_round_pairings
+from match_store import load_match_store
+from stats_kernel import score_cube
+from teams import load_team_registry
+
+# Monte Carlo simulation of rounds and whole virtual seasons.
+#
+# Every team gets an attack and a defence strength fitted from the goal columns of the
+# history (the multiplicative Poisson model, optionally with the Dixon-Coles low-score
+# correction). Fixtures are then played out many times with vectorised random draws and
+# the simulated scores are reduced to count arrays, from which the BTTS, exact score,
+# over/under and final table position distributions are read.
+
+# Scores above MAX_GOALS are counted as MAX_GOALS
+MAX_GOALS = 10
+OVER_UNDER_LINES = (0.5, 1.5, 2.5, 3.5, 4.5)
+# Simulations per vectorised batch; keeps a season batch around 20 MB
+CHUNK_SIZE = 10_000
+FIT_ITERATIONS = 200
+FIT_TOLERANCE = 1e-10
+
+
+# Poisson probabilities of 0..max_goals goals, the last one holding the tail
+def poisson_pmf(rates, max_goals):
+    rates = np.asarray(rates, dtype=float)[..., None]
+    goals = np.arange(max_goals + 1)
+    log_factorials = np.array([math.lgamma(k + 1) for k in goals])
+    pmf = np.exp(goals * np.log(np.maximum(rates, 1e-300)) - rates - log_factorials)
+    pmf[..., -1] += np.clip(1 - pmf.sum(axis=-1), 0, None)
+    return pmf
+
+
+# Dixon-Coles correction factors for the 0:0, 0:1, 1:0 and 1:1 cells
+def dixon_coles_tau(home_rates, away_rates, rho):
+    return {
+        (0, 0): 1 - home_rates * away_rates * rho,
+        (0, 1): 1 + home_rates * rho,
+        (1, 0): 1 + away_rates * rho,
+        (1, 1): 1 - rho,
+    }
+
+
+class GoalModel:
+    def __init__(self, attack, defence, home_rate, away_rate, rho=0.0, max_goals=MAX_GOALS):
+        # Strengths indexed by team ID, 1.0 for teams without history
+        self.attack = np.asarray(attack, dtype=float)
+        self.defence = np.asarray(defence, dtype=float)
+        self.home_rate = home_rate
+        self.away_rate = away_rate
+        self.rho = rho
+        self.max_goals = max_goals
+
+    # Fit the strengths from a match store.
+    # Expected home goals of home_id against away_id are home_rate * attack[home_id] * defence[away_id].
+    @classmethod
+    def fit(cls, matches, dixon_coles=True, max_goals=MAX_GOALS):
+        cube = score_cube(matches).astype(float)
+        size, _, goals, _ = cube.shape
+        goal_values = np.arange(goals)
+        played = cube.sum(axis=(2, 3))
+        home_goals = (cube.sum(axis=3) * goal_values).sum(axis=2)
+        away_goals = (cube.sum(axis=2) * goal_values).sum(axis=2)
+
+        # Goals scored and conceded per team, home and away together
+        scored = home_goals.sum(axis=1) + away_goals.sum(axis=0)
+        conceded = home_goals.sum(axis=0) + away_goals.sum(axis=1)
+        active = played.sum(axis=1) + played.sum(axis=0) > 0
+
+        attack = np.ones(size)
+        defence = np.ones(size)
+        home_rate = away_rate = 1.0
+        for _ in range(FIT_ITERATIONS):
+            previous = np.concatenate((attack, defence))
+            home_rate = home_goals.sum() / max((played * np.outer(attack, defence)).sum(), 1e-300)
+            away_rate = away_goals.sum() / max((played * np.outer(defence, attack)).sum(), 1e-300)
+            exposure = home_rate * played @ defence + away_rate * played.T @ defence
+            attack = np.where(active & (exposure > 0), scored / np.where(exposure > 0, exposure, 1), 1.0)
+            attack[active] /= attack[active].mean()
+            exposure = home_rate * played.T @ attack + away_rate * played @ attack
+            defence = np.where(active & (exposure > 0), conceded / np.where(exposure > 0, exposure, 1), 1.0)
+            if np.abs(np.concatenate((attack, defence)) - previous).max() < FIT_TOLERANCE:
+                break
+
+        model = cls(attack, defence, home_rate, away_rate, max_goals=max_goals)
+        if dixon_coles and goals > 1:
+            model.rho = model.fit_rho(cube)
+        return model
+
+    # Dixon-Coles rho maximising the likelihood of the low-score cells, on a grid
+    def fit_rho(self, cube):
+        size = cube.shape[0]
+        team_range = np.arange(size)
+        home_rates, away_rates = self.rates(*np.meshgrid(team_range, team_range, indexing='ij'))
+        grid = np.linspace(-0.3, 0.3, 601)[:, None, None]
+        likelihood = np.zeros(grid.shape[0])
+        for (home_goals, away_goals), tau in dixon_coles_tau(home_rates, away_rates, grid).items():
+            counts = cube[:, :, home_goals, away_goals]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                terms = np.where(counts > 0, counts * np.log(np.where(tau > 0, tau, np.nan)), 0)
+            likelihood += terms.sum(axis=(1, 2))
+        likelihood = np.where(np.isnan(likelihood), -np.inf, likelihood)
+        return float(grid.ravel()[np.argmax(likelihood)])
+
+    # Expected home and away goals of each fixture
+    def rates(self, home_ids, away_ids):
+        home_ids = np.asarray(home_ids, dtype=np.intp)
+        away_ids = np.asarray(away_ids, dtype=np.intp)
+        return (self.home_rate * self._strength(self.attack, home_ids) * self._strength(self.defence, away_ids),
+                self.away_rate * self._strength(self.attack, away_ids) * self._strength(self.defence, home_ids))
+
+    @staticmethod
+    def _strength(values, team_ids):
+        known = (team_ids >= 0) & (team_ids < values.size)
+        return np.where(known, values[np.where(known, team_ids, 0)], 1.0)
+
+    # Exact score probabilities [fixture, home_goals, away_goals]
+    def score_probabilities(self, home_ids, away_ids):
+        home_rates, away_rates = self.rates(home_ids, away_ids)
+        probabilities = poisson_pmf(home_rates, self.max_goals)[:, :, None] * poisson_pmf(away_rates, self.max_goals)[:, None, :]
+        if self.rho:
+            for (home_goals, away_goals), tau in dixon_coles_tau(home_rates, away_rates, self.rho).items():
+                probabilities[:, home_goals, away_goals] *= np.clip(tau, 0, None)
+            probabilities /= probabilities.sum(axis=(1, 2), keepdims=True)
+        return probabilities
+
+    # Draw `count` simulated scores of every fixture, shaped [simulation, fixture]
+    def sample(self, home_ids, away_ids, count, rng):
+        if not self.rho:
+            home_rates, away_rates = self.rates(home_ids, away_ids)
+            home_goals = np.minimum(rng.poisson(home_rates, (count, home_rates.size)), self.max_goals)
+            away_goals = np.minimum(rng.poisson(away_rates, (count, away_rates.size)), self.max_goals)
+            return home_goals.astype(np.int8), away_goals.astype(np.int8)
+
+        # Inverse CDF over the flattened score grid of each fixture
+        goals = self.max_goals + 1
+        cdf = self.score_probabilities(home_ids, away_ids).reshape(-1, goals * goals).cumsum(axis=1)
+        cdf[:, -1] = 1.0
+        uniforms = rng.random((count, cdf.shape[0]))
+        cells = np.empty(uniforms.shape, dtype=np.intp)
+        for fixture in range(cdf.shape[0]):
+            cells[:, fixture] = np.searchsorted(cdf[fixture], uniforms[:, fixture], side='right')
+        np.minimum(cells, goals * goals - 1, out=cells)
+        return (cells // goals).astype(np.int8), (cells % goals).astype(np.int8)
+
+    def to_dict(self):
+        return {
+            "attack": self.attack.tolist(),
+            "defence": self.defence.tolist(),
+            "home_rate": self.home_rate,
+            "away_rate": self.away_rate,
+            "rho": self.rho,
+            "max_goals": self.max_goals,
+        }
+
+
+# Exact score counts [fixture, home_goals, away_goals] of one batch of simulated rounds
+def simulate_round_chunk(model, home_ids, away_ids, count, seed):
+    rng = np.random.default_rng(seed)
+    home_goals, away_goals = model.sample(home_ids, away_ids, count, rng)
+    goals = model.max_goals + 1
+    fixtures = len(home_ids)
+    index = np.arange(fixtures, dtype=np.int64) * goals * goals + home_goals.astype(np.int64) * goals + away_goals
+    scores = np.bincount(index.ravel(), minlength=fixtures * goals * goals)
+    return {"simulations": count, "scores": scores.reshape(fixtures, goals, goals)}
+
+
+# Final position counts [team, position] and summed points of one batch of simulated seasons.
+# A season is the double round robin of the teams; ties are broken on goal difference,
+# goals scored and then at random.
+def simulate_season_chunk(model, season_team_ids, count, seed):
+    rng = np.random.default_rng(seed)
+    season_team_ids = np.asarray(sorted(season_team_ids), dtype=np.intp)
+    home_ids, away_ids = all_pairings(season_team_ids)
+    home_goals, away_goals = model.sample(home_ids, away_ids, count, rng)
+
+    # Fixture -> team incidence, so per-team totals are matrix products
+    teams = season_team_ids.size
+    slots = np.searchsorted(season_team_ids, home_ids), np.searchsorted(season_team_ids, away_ids)
+    home_incidence = np.zeros((home_ids.size, teams))
+    home_incidence[np.arange(home_ids.size), slots[0]] = 1
+    away_incidence = np.zeros((away_ids.size, teams))
+    away_incidence[np.arange(away_ids.size), slots[1]] = 1
+
+    home_points = np.where(home_goals > away_goals, 3, np.where(home_goals == away_goals, 1, 0)).astype(float)
+    away_points = np.where(away_goals > home_goals, 3, np.where(home_goals == away_goals, 1, 0)).astype(float)
+    points = home_points @ home_incidence + away_points @ away_incidence
+    goals_for = home_goals.astype(float) @ home_incidence + away_goals.astype(float) @ away_incidence
+    goals_against = away_goals.astype(float) @ home_incidence + home_goals.astype(float) @ away_incidence
+
+    # Last key sorts first; negated so the best team comes first
+    order = np.lexsort((rng.random(points.shape), -goals_for, goals_against - goals_for, -points), axis=1)
+    positions = np.empty_like(order)
+    np.put_along_axis(positions, order, np.broadcast_to(np.arange(teams), order.shape), axis=1)
+    index = np.arange(teams) * teams + positions
+    position_counts = np.bincount(index.ravel(), minlength=teams * teams).reshape(teams, teams)
+    return {"simulations": count, "positions": position_counts, "points": points.sum(axis=0)}
+
+
+# Run `count` simulations in batches, optionally spread over a process pool, and sum the counts
+def run_simulations(chunk_function, model, fixtures, count, workers=1, seed=None, chunk_size=CHUNK_SIZE):
+    sizes = [chunk_size] * (count // chunk_size)
+    if count % chunk_size:
+        sizes.append(count % chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [(model, *fixtures, size, chunk_seed) for size, chunk_seed in zip(sizes, seeds)]
+
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(chunk_function, *zip(*jobs)))
+    else:
+        results = [chunk_function(*job) for job in jobs]
+
+    totals = {}
+    for result in results:
+        for key, value in result.items():
+            totals[key] = totals[key] + value if key in totals else value
+    return totals
+
+
+def simulate_round(model, home_ids, away_ids, count, workers=1, seed=None):
+    home_ids = np.asarray(home_ids, dtype=np.intp)
+    away_ids = np.asarray(away_ids, dtype=np.intp)
+    return run_simulations(simulate_round_chunk, model, (home_ids, away_ids), count, workers, seed)
+
+
+def simulate_season(model, season_team_ids, count, workers=1, seed=None):
+    return run_simulations(simulate_season_chunk, model, (list(season_team_ids),), count, workers, seed)
+
+
+# BTTS, 1X2, over/under and the most likely exact scores per fixture
+def summarize_round(totals, home_ids, away_ids, lines=OVER_UNDER_LINES, top_scores=5):
+    probabilities = totals["scores"] / max(totals["simulations"], 1)
+    goals = probabilities.shape[1]
+    home_goal_values, away_goal_values = np.meshgrid(np.arange(goals), np.arange(goals), indexing='ij')
+    total_goals = home_goal_values + away_goal_values
+    summary = []
+    for fixture, (home_id, away_id) in enumerate(zip(home_ids, away_ids)):
+        grid = probabilities[fixture]
+        best = np.argsort(-grid, axis=None, kind='stable')[:top_scores]
+        summary.append({
+            "home_team_id": int(home_id),
+            "away_team_id": int(away_id),
+            "both_teams_to_score": float(grid[1:, 1:].sum()) * 100,
+            "home_win": float(grid[home_goal_values > away_goal_values].sum()) * 100,
+            "draw": float(grid[home_goal_values == away_goal_values].sum()) * 100,
+            "away_win": float(grid[home_goal_values < away_goal_values].sum()) * 100,
+            "over": {str(line): float(grid[total_goals > line].sum()) * 100 for line in lines},
+            "exact_scores": {f"{cell // goals}:{cell % goals}": float(grid.flat[cell]) * 100 for cell in best},
+        })
+    return summary
+
+
+# Expected points and final position probabilities per team
+def summarize_season(totals, season_team_ids):
+    simulations = max(totals["simulations"], 1)
+    return [
+        {
+            "team_id": int(team_id),
+            "expected_points": float(totals["points"][slot]) / simulations,
+            "positions": [float(count) / simulations * 100 for count in totals["positions"][slot]],
+        }
+        for slot, team_id in enumerate(sorted(season_team_ids))
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate the upcoming round and whole virtual seasons.")
+    add_data_arguments(parser)
+    parser.add_argument("--round-simulations", type=int, default=1_000_000)
+    parser.add_argument("--season-simulations", type=int, default=100_000)
+    parser.add_argument("--model", choices=("poisson", "dixon-coles"), default="dixon-coles")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes to simulate with")
+    parser.add_argument("--seed", type=int, help="random seed for reproducible runs")
+    args = parser.parse_args()
+
+    files = data_files(data_dir_from_args(args))
+    with load_match_store(files["formatted_results"]) as matches:
+        model = GoalModel.fit(matches, dixon_coles=args.model == "dixon-coles")
+    team_id_map, team_ids = load_team_registry(files["team_data"])
+    match_list = build_match_list(load_round_pairings(files["round_pairings"]), team_ids)
+    home_ids = [match["home_team_id"] for match in match_list]
+    away_ids = [match["away_team_id"] for match in match_list]
+
+    result = {"model": model.to_dict()}
+    if home_ids and args.round_simulations > 0:
+        totals = simulate_round(model, home_ids, away_ids, args.round_simulations, args.workers, args.seed)
+        result["round"] = summarize_round(totals, home_ids, away_ids)
+        for fixture in result["round"]:
+            print(f"{team_id_map.get(fixture['home_team_id'])} vs {team_id_map.get(fixture['away_team_id'])}"
+                  f" - BTTS {fixture['both_teams_to_score']:.2f}%, over 2.5 {fixture['over']['2.5']:.2f}%")
+    if args.season_simulations > 0:
+        totals = simulate_season(model, team_id_map, args.season_simulations, args.workers, args.seed)
+        result["season"] = summarize_season(totals, team_id_map)
+
+    try:
+        with open(files["simulation"], 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=4)
+        print(f"Simulation results have been saved to {files['simulation']}")
+    except IOError as e:
+        print(f"Error: Could not save the simulation results to {files['simulation']}. Reason: {e}")
+
+
+if __name__ == "__main__":
+    main()
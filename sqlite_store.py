@@ -0,0 +1,213 @@
+import argparse
+import json
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+from atomic_files import atomic_file
+from data_paths import add_data_arguments, data_dir_from_args, data_files
+from match_store import Match, format_record, load_match_store, open_match_store
+from prediction_archive import read_prediction_archive
+from ratings import RatingState
+from team_aggregates import TeamAggregates, write_team_statistics_csv
+from teams import load_team_registry
+
+# Optional SQLite storage of the matches, the team registry and the prediction archive.
+#
+# matches.db lives in the data folder next to the JSON files. It runs in WAL mode, so
+# the predictor can read while an ingestion writes, and every bulk insert is a single
+# transaction. Matches are indexed by match_ID (the primary key), by pairing and by
+# away team (the pairing index covers home team lookups). The legacy files are kept
+# working through exporters: formatted_results.json and team_statistics.csv can be
+# written from the database at any time.
+#
+#   python sqlite_store.py sync      copy new matches, the teams and new predictions in
+#   python sqlite_store.py export    rewrite formatted_results.json and team_statistics.csv
+#                                    (refused while the database is behind the history)
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS matches (
+    match_id INTEGER PRIMARY KEY,
+    home_id INTEGER NOT NULL,
+    away_id INTEGER NOT NULL,
+    home_goals INTEGER NOT NULL,
+    away_goals INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS matches_pairing ON matches (home_id, away_id);
+CREATE INDEX IF NOT EXISTS matches_away ON matches (away_id);
+CREATE TABLE IF NOT EXISTS teams (
+    team_id INTEGER PRIMARY KEY,
+    team_name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS predictions (
+    sequence INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    created TEXT,
+    source TEXT,
+    match TEXT NOT NULL,
+    home_team_id INTEGER,
+    away_team_id INTEGER,
+    percentage REAL NOT NULL,
+    penalty_applied INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (sequence, position)
+);
+"""
+
+MATCH_COLUMNS = "match_id, home_id, away_id, home_goals, away_goals"
+
+
+# Open (and create) a database in WAL mode
+def open_database(db_path):
+    connection = sqlite3.connect(db_path, timeout=30)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    version = connection.execute("PRAGMA user_version").fetchone()[0]
+    if version not in (0, SCHEMA_VERSION):
+        connection.close()
+        raise ValueError(f"Unsupported database schema version {version} in {db_path}")
+    with connection:
+        connection.executescript(SCHEMA)
+        connection.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+    return connection
+
+
+def last_match_id(connection):
+    return connection.execute("SELECT COALESCE(MAX(match_id), 0) FROM matches").fetchone()[0]
+
+
+# Insert Match records (or tuples in the same order) in one transaction
+def insert_matches(connection, matches):
+    with connection:
+        cursor = connection.executemany(f"INSERT INTO matches ({MATCH_COLUMNS}) VALUES (?, ?, ?, ?, ?)",
+                                        (tuple(match) for match in matches))
+    return cursor.rowcount
+
+
+# Matches in match order, optionally only those after match_ID `since` or of one team
+def iter_matches(connection, since=0, team_id=None):
+    if team_id is None:
+        cursor = connection.execute(f"SELECT {MATCH_COLUMNS} FROM matches WHERE match_id > ? ORDER BY match_id",
+                                    (since,))
+    else:
+        cursor = connection.execute(
+            f"SELECT {MATCH_COLUMNS} FROM matches WHERE match_id > ? AND home_id = ? "
+            f"UNION ALL SELECT {MATCH_COLUMNS} FROM matches WHERE match_id > ? AND away_id = ? ORDER BY match_id",
+            (since, team_id, since, team_id))
+    for row in cursor:
+        yield Match(*row)
+
+
+# Matches of a home/away pairing in match order
+def pairing_matches(connection, home_id, away_id):
+    cursor = connection.execute(
+        f"SELECT {MATCH_COLUMNS} FROM matches WHERE home_id = ? AND away_id = ? ORDER BY match_id", (home_id, away_id))
+    return [Match(*row) for row in cursor]
+
+
+# Copy the matches of formatted_results.json past the last one in the database
+def sync_matches(connection, formatted_results_path):
+    since = last_match_id(connection)
+    with load_match_store(formatted_results_path) as matches:
+        new_rows = [row for row in matches if row[0] > since]
+    return insert_matches(connection, new_rows) if new_rows else 0
+
+
+# Replace the team table with a registry {team_id: name}
+def write_teams(connection, team_id_map):
+    with connection:
+        connection.execute("DELETE FROM teams")
+        connection.executemany("INSERT INTO teams (team_id, team_name) VALUES (?, ?)", sorted(team_id_map.items()))
+
+
+# (team_id_map, team_ids) from the team table, as teams.load_team_registry returns them
+def load_team_registry_db(connection):
+    team_id_map = dict(connection.execute("SELECT team_id, team_name FROM teams ORDER BY team_id"))
+    return team_id_map, {name: team_id for team_id, name in team_id_map.items()}
+
+
+# Copy the records of the prediction archive that are not in the database yet
+def sync_predictions(connection, archive_path):
+    known = {row[0] for row in connection.execute("SELECT DISTINCT sequence FROM predictions")}
+    rows = []
+    for record in read_prediction_archive(archive_path):
+        if record.get("sequence") in known:
+            continue
+        known.add(record["sequence"])
+        for position, prediction in enumerate(record["predictions"], start=1):
+            rows.append((record["sequence"], position, record.get("created"), record.get("source"),
+                         prediction["match"], prediction.get("home_team_id"), prediction.get("away_team_id"),
+                         prediction["percentage"], int(bool(prediction.get("penalty_applied")))))
+    with connection:
+        connection.executemany("INSERT INTO predictions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    return len(known)
+
+
+# Bring the database of a data folder up to date with its files
+def sync_database(files):
+    with closing(open_database(files["database"])) as connection:
+        matches = sync_matches(connection, files["formatted_results"])
+        team_id_map, _ = load_team_registry(files["team_data"])
+        write_teams(connection, team_id_map)
+        predictions = sync_predictions(connection, files["prediction_archive"])
+    return matches, len(team_id_map), predictions
+
+
+# Write formatted_results.json from the database, in the layout json.dump(indent=4) gives.
+# Refuses to replace a history that goes further than the database.
+def export_formatted_results(connection, json_path):
+    if Path(json_path).exists():
+        with open_match_store(json_path) as matches:
+            history_match_id = matches.last_match_id()
+        database_match_id = last_match_id(connection)
+        if database_match_id < history_match_id:
+            raise ValueError(f"The database ends at match_ID {database_match_id} but {json_path} goes up to "
+                             f"{history_match_id}. Run the sync first; not overwriting the history.")
+    with atomic_file(json_path) as f:
+        f.write("[")
+        separator = "\n"
+        for match in iter_matches(connection):
+            f.write(separator + format_record(match.to_record()))
+            separator = ",\n"
+        f.write("\n]" if separator == ",\n" else "]")
+
+
+# Write team_statistics.csv from the database, replaying the ratings over its matches.
+# Team names come from the team table, or from `team_data_path` while that is empty.
+def export_team_statistics(connection, csv_path, team_data_path=None):
+    aggregates = TeamAggregates()
+    ratings = RatingState()
+    for match in iter_matches(connection):
+        aggregates.add_match(*match)
+        ratings.add_match(*match)
+    team_id_map, _ = load_team_registry_db(connection)
+    if not team_id_map and team_data_path:
+        team_id_map, _ = load_team_registry(team_data_path)
+    write_team_statistics_csv(aggregates.teams, csv_path, team_id_map, ratings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep the optional SQLite copy of the match history.")
+    add_data_arguments(parser)
+    parser.add_argument("command", choices=("sync", "export"),
+                        help="sync: copy new matches, teams and predictions in; export: write the legacy files")
+    args = parser.parse_args()
+    files = data_files(data_dir_from_args(args))
+
+    try:
+        if args.command == "sync":
+            matches, teams, predictions = sync_database(files)
+            print(f"Added {matches} matches to {files['database']} ({teams} teams, {predictions} predictions archived)")
+        else:
+            with closing(open_database(files["database"])) as connection:
+                export_formatted_results(connection, files["formatted_results"])
+                print(f"Match history has been saved to {files['formatted_results']}")
+                export_team_statistics(connection, files["team_statistics"], files["team_data"])
+                print(f"Team statistics have been saved to {files['team_statistics']}")
+    except (sqlite3.Error, ValueError, OSError, json.JSONDecodeError) as e:
+        print(f"Error: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import numpy as np
+
+from team_aggregates import TeamAggregates
+
+# Vectorised computation of the TeamAggregates counters.
+#
+# The history is reduced in a single bincount to a count cube indexed by
+# [home_id, away_id, home_goals, away_goals]. Every per-team and head-to-head counter
+# is then a masked sum over that small cube instead of a Python loop over matches.
+
+
+# Column views of a match store as NumPy arrays (no copy for memory-mapped stores)
+def store_arrays(matches):
+    return (
+        np.frombuffer(matches.match_id, dtype=np.int32),
+        np.frombuffer(matches.home_id, dtype=np.int8),
+        np.frombuffer(matches.away_id, dtype=np.int8),
+        np.frombuffer(matches.home_goals, dtype=np.int8),
+        np.frombuffer(matches.away_goals, dtype=np.int8),
+    )
+
+
+# Count cube [home_id, away_id, home_goals, away_goals] of a match store
+def score_cube(matches, size=None, goals=None):
+    _, home_ids, away_ids, home_goals, away_goals = store_arrays(matches)
+    return count_scores(home_ids, away_ids, home_goals, away_goals, size, goals)
+
+
+# Count cube [home_id, away_id, home_goals, away_goals] of column arrays
+def count_scores(home_ids, away_ids, home_goals, away_goals, size=None, goals=None):
+    if size is None:
+        size = int(max(home_ids.max(initial=0), away_ids.max(initial=0))) + 1
+    if goals is None:
+        goals = int(max(home_goals.max(initial=0), away_goals.max(initial=0))) + 1
+    index = home_ids.astype(np.int64) * size
+    index += away_ids
+    index *= goals
+    index += home_goals
+    index *= goals
+    index += away_goals
+    cube = np.bincount(index, minlength=size * size * goals * goals)
+    return cube.reshape(size, size, goals, goals)
+
+
+# Team IDs in order of first appearance (home before away), as the per-match loop sees them
+def _team_order(home_ids, away_ids, present):
+    # Every team normally shows up within the first rounds, so grow the scanned prefix
+    prefix = 1024
+    while True:
+        interleaved = np.empty(min(prefix, home_ids.size) * 2, dtype=np.int8)
+        interleaved[0::2] = home_ids[:prefix]
+        interleaved[1::2] = away_ids[:prefix]
+        team_ids, first_seen = np.unique(interleaved, return_index=True)
+        if team_ids.size == present or prefix >= home_ids.size:
+            return team_ids[np.argsort(first_seen, kind='stable')]
+        prefix *= 4
+
+
+# Compute the same aggregates as folding every match into TeamAggregates
+def compute_aggregates(matches):
+    aggregates = TeamAggregates()
+    if not len(matches):
+        return aggregates
+    match_ids, home_ids, away_ids, _, _ = store_arrays(matches)
+    cube = score_cube(matches)
+    goals = cube.shape[2]
+
+    # Outcome masks and goal values over the [home_goals, away_goals] plane
+    home_goal_values, away_goal_values = np.meshgrid(np.arange(goals), np.arange(goals), indexing='ij')
+    home_win = home_goal_values > away_goal_values
+    away_win = home_goal_values < away_goal_values
+    draw = home_goal_values == away_goal_values
+    both_scored = (home_goal_values > 0) & (away_goal_values > 0)
+
+    # Per-team results as home side [team, home_goals, away_goals] and as away side
+    as_home = cube.sum(axis=1)
+    as_away = cube.sum(axis=0)
+
+    def team_sum(home_weights, away_weights):
+        return (as_home * home_weights).sum(axis=(1, 2)) + (as_away * away_weights).sum(axis=(1, 2))
+
+    counts = {
+        "OMSZ": team_sum(1, 1),
+        "MCSGM": team_sum(both_scored, both_scored),
+        "GMCMGY": team_sum(both_scored & home_win, both_scored & away_win),
+        "GMCMDS": team_sum(both_scored & draw, both_scored & draw),
+        "GMCMVS": team_sum(both_scored & away_win, both_scored & home_win),
+        # Goals scored count once in every match and again when both teams scored
+        "GMCMRG": team_sum(home_goal_values * (1 + both_scored), away_goal_values * (1 + both_scored)),
+        "GMCMKG": team_sum(away_goal_values * both_scored, home_goal_values * both_scored),
+        "TotalWins": team_sum(home_win, away_win),
+        "TotalLosses": team_sum(away_win, home_win),
+        "TotalDraws": team_sum(draw, draw),
+        "GoalsFor": team_sum(home_goal_values, away_goal_values),
+        "GoalsAgainst": team_sum(away_goal_values, home_goal_values),
+    }
+    present = int(np.count_nonzero(counts["OMSZ"]))
+    for team_id in _team_order(home_ids, away_ids, present).tolist():
+        aggregates.teams[team_id] = {field: int(values[team_id]) for field, values in counts.items()}
+
+    # Head-to-head counts per (home_id, away_id), in order of first meeting
+    pair_matches = cube.sum(axis=(2, 3))
+    pair_both_score = (cube * both_scored).sum(axis=(2, 3))
+    pair_index, first_seen = np.unique(home_ids.astype(np.int64) * cube.shape[0] + away_ids, return_index=True)
+    for index in pair_index[np.argsort(first_seen, kind='stable')].tolist():
+        home_id, away_id = divmod(index, cube.shape[0])
+        aggregates.pairs[(home_id, away_id)] = {
+            "matches": int(pair_matches[home_id, away_id]),
+            "both_score": int(pair_both_score[home_id, away_id]),
+        }
+
+    aggregates.rows = len(matches)
+    aggregates.last_match_id = int(match_ids[-1])
+    return aggregates
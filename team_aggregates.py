@@ -0,0 +1,214 @@
+import csv
+import heapq
+
+# Running per-team and head-to-head aggregates over the match history.
+#
+# The aggregates are folded one match at a time, so they can be persisted and later
+# extended with only the newly appended results instead of a full recomputation.
+# Every statistics script reads its numbers from them (team totals, win/draw/loss
+# splits, goal sums, opponent counts and the head-to-head counts) rather than scanning
+# the history again.
+
+# Counters kept for each team (see team_statistics_calculator.py for their meaning)
+TEAM_FIELDS = (
+    "OMSZ",  # Total number of matches
+    "MCSGM",  # Matches where both teams scored
+    "GMCMGY",  # Wins in matches where both teams scored
+    "GMCMDS",  # Draws in matches where both teams scored
+    "GMCMVS",  # Losses in matches where both teams scored
+    "GMCMRG",  # Goals scored (all matches plus again in matches where both teams scored)
+    "GMCMKG",  # Goals conceded in matches where both teams scored
+    "TotalWins",  # Total wins in all matches
+    "TotalLosses",  # Total losses in all matches
+    "TotalDraws",  # Total draws in all matches
+    "GoalsFor",  # Goals scored in all matches
+    "GoalsAgainst",  # Goals conceded in all matches
+)
+
+# Layout of the persisted aggregates; older snapshots are rebuilt from the history
+SNAPSHOT_VERSION = 2
+
+TEAM_STATISTICS_FIELDNAMES = [
+    "Rank", "TID", "CN", "OMSZ", "MCSGM", "GMCMGY", "GMCMDS", "GMCMVS",
+    "GMCMRG", "GMCMKG", "GMCMGKE", "TotalWins", "TotalLosses", "ELO", "SRS", "PR", "GR", "GPI"
+]
+
+
+class TeamAggregates:
+    def __init__(self):
+        # team_id -> {field: count}, in order of first appearance
+        self.teams = {}
+        # (home_id, away_id) -> {"matches": n, "both_score": n}, in order of first meeting
+        self.pairs = {}
+        # Number of store rows folded in and the match_ID of the last one
+        self.rows = 0
+        self.last_match_id = 0
+
+    def _team(self, team_id):
+        stats = self.teams.get(team_id)
+        if stats is None:
+            stats = self.teams[team_id] = dict.fromkeys(TEAM_FIELDS, 0)
+        return stats
+
+    # Fold a single match into the aggregates
+    def add_match(self, match_id, home_id, away_id, home_goals, away_goals):
+        home = self._team(home_id)
+        away = self._team(away_id)
+
+        home["OMSZ"] += 1
+        away["OMSZ"] += 1
+        home["GMCMRG"] += home_goals
+        away["GMCMRG"] += away_goals
+        home["GoalsFor"] += home_goals
+        home["GoalsAgainst"] += away_goals
+        away["GoalsFor"] += away_goals
+        away["GoalsAgainst"] += home_goals
+
+        if home_goals > away_goals:
+            home["TotalWins"] += 1
+            away["TotalLosses"] += 1
+        elif home_goals < away_goals:
+            away["TotalWins"] += 1
+            home["TotalLosses"] += 1
+        else:
+            home["TotalDraws"] += 1
+            away["TotalDraws"] += 1
+
+        pair = self.pairs.get((home_id, away_id))
+        if pair is None:
+            pair = self.pairs[(home_id, away_id)] = {"matches": 0, "both_score": 0}
+        pair["matches"] += 1
+
+        if home_goals > 0 and away_goals > 0:
+            pair["both_score"] += 1
+            home["MCSGM"] += 1
+            away["MCSGM"] += 1
+            home["GMCMRG"] += home_goals
+            home["GMCMKG"] += away_goals
+            away["GMCMRG"] += away_goals
+            away["GMCMKG"] += home_goals
+            if home_goals > away_goals:
+                home["GMCMGY"] += 1
+                away["GMCMVS"] += 1
+            elif home_goals < away_goals:
+                away["GMCMGY"] += 1
+                home["GMCMVS"] += 1
+            else:
+                home["GMCMDS"] += 1
+                away["GMCMDS"] += 1
+
+        self.rows += 1
+        self.last_match_id = match_id
+
+    # Fold every match of an iterable of (match_id, home_id, away_id, home_goals, away_goals)
+    def add_matches(self, matches):
+        for match in matches:
+            self.add_match(*match)
+
+    # Matches against each opponent, home and away together, in order of first meeting
+    def opponents(self, team_id):
+        counts = {}
+        for (home_id, away_id), pair in self.pairs.items():
+            if home_id == team_id:
+                counts[away_id] = counts.get(away_id, 0) + pair["matches"]
+            elif away_id == team_id:
+                counts[home_id] = counts.get(home_id, 0) + pair["matches"]
+        return counts
+
+    # The `count` most frequent opponents as (opponent_id, matches), earlier meetings first on ties
+    def top_opponents(self, team_id, count=3):
+        # nlargest keeps the order of sorted(..., reverse=True) on ties without sorting every opponent
+        return heapq.nlargest(count, self.opponents(team_id).items(), key=lambda x: x[1])
+
+    def to_dict(self):
+        return {
+            "version": SNAPSHOT_VERSION,
+            "rows": self.rows,
+            "last_match_id": self.last_match_id,
+            "teams": [[team_id, stats] for team_id, stats in self.teams.items()],
+            "pairs": [[home_id, away_id, pair["matches"], pair["both_score"]]
+                      for (home_id, away_id), pair in self.pairs.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"snapshot version {data.get('version')} is outdated")
+        aggregates = cls()
+        aggregates.rows = int(data["rows"])
+        aggregates.last_match_id = int(data["last_match_id"])
+        for team_id, stats in data["teams"]:
+            aggregates.teams[int(team_id)] = {field: int(stats[field]) for field in TEAM_FIELDS}
+        for home_id, away_id, matches, both_score in data["pairs"]:
+            aggregates.pairs[(int(home_id), int(away_id))] = {"matches": int(matches), "both_score": int(both_score)}
+        return aggregates
+
+
+# Derived team statistics as written to team_statistics.csv
+# `rating` is the team's entry of a ratings.RatingState, None for initial ratings
+def derive_team_statistics(counts, rating=None):
+    stats = dict(counts)
+    stats["ELO"] = 1500  # Initial ELO Rating
+    stats["PR"] = 1500  # Power Ranking
+    stats["GR"] = 1500  # Initial Glicko Rating
+    stats["SRS"] = 0  # Simple Ranking System
+    stats["GPI"] = 0  # Goal-Based Performance Index
+
+    # Goal difference in matches where both teams scored
+    stats["GMCMGKE"] = stats["GMCMRG"] - stats["GMCMKG"]
+
+    # Calculate SRS (Simple Ranking System)
+    if stats["OMSZ"] > 0:
+        stats["SRS"] = (stats["GMCMRG"] - stats["GMCMKG"]) / stats["OMSZ"]
+
+    if rating is not None:
+        stats["ELO"] = round(rating["elo"], 2)
+        stats["GR"] = round(rating["rating"], 2)
+        # PR (Power Ranking) is the conservative Glicko-2 estimate, rating minus two deviations
+        stats["PR"] = round(rating["rating"] - 2 * rating["rd"], 2)
+
+    # Calculate GPI (Goal-Based Performance Index)
+    if stats["OMSZ"] > 0:
+        stats["GPI"] = (stats["GMCMRG"] - stats["GMCMKG"]) / stats["OMSZ"]
+    return stats
+
+
+# Write team_statistics.csv, teams sorted by total wins and total losses
+def write_team_statistics_csv(team_counts, csv_file_path, team_id_map, ratings=None):
+    team_stats = {
+        team_id: derive_team_statistics(counts, ratings.teams.get(team_id) if ratings else None)
+        for team_id, counts in team_counts.items()
+    }
+    sorted_teams = sorted(
+        team_stats.items(),
+        key=lambda x: (x[1]["TotalWins"], -x[1]["TotalLosses"]),
+        reverse=True
+    )
+    with open(csv_file_path, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=TEAM_STATISTICS_FIELDNAMES, extrasaction='ignore')
+        writer.writeheader()
+        for rank, (team_id, stats) in enumerate(sorted_teams, start=1):
+            row = {
+                "Rank": rank,
+                "TID": team_id,
+                "CN": team_id_map[team_id],
+                **stats
+            }
+            writer.writerow(row)
+
+
+# Write both_teams_score_stats.txt, grouped by home team
+def write_both_teams_score_stats(pairs, text_file_path):
+    by_team = {}
+    for (home_id, away_id), pair in pairs.items():
+        by_team.setdefault(home_id, {})[away_id] = pair
+    with open(text_file_path, 'w', encoding='utf-8') as textfile:
+        for team_id in sorted(by_team.keys()):
+            if team_id < 1:
+                continue
+            textfile.write(f"Team ID {team_id}:\n")
+            for opponent_id in sorted(by_team[team_id].keys()):
+                matches = by_team[team_id][opponent_id]["matches"]
+                both_score = by_team[team_id][opponent_id]["both_score"]
+                percentage = (both_score / matches) * 100 if matches > 0 else 0
+                textfile.write(f"  Opponent ID {opponent_id}: {both_score}/{matches} - {percentage:.2f}%\n")
@@ -0,0 +1,30 @@
+import json
+
+# Team registry of the Virtual Premier League, ordered by team ID
+team_names = [
+    "Aston Oroszlán", "Brentford", "Brighton", "Chelsea", "Crystal Palace",
+    "Everton", "Fulham", "London Ágyúk", "Liverpool", "Manchester Kék",
+    "Newcastle", "Nottingham", "Tottenham", "Vörös Ördögök", "West Ham", "Wolverhampton"
+]
+
+# Team ID -> name and name -> team ID
+team_id_map = {idx + 1: name for idx, name in enumerate(team_names)}
+team_ids = {name: team_id for team_id, name in team_id_map.items()}
+
+
+# Team registry of a league from its vsport_teamdata.json ({"teams": [{"team_id", "team_name", ...}]}).
+# Returns (team_id_map, team_ids); leagues without team data use the Virtual Premier League.
+def load_team_registry(team_data_path):
+    try:
+        with open(team_data_path, 'r', encoding='utf-8') as f:
+            teams = json.load(f)["teams"]
+        registry = {int(team["team_id"]): team["team_name"] for team in teams}
+        if not registry:
+            raise ValueError("no teams listed")
+    except FileNotFoundError:
+        return dict(team_id_map), dict(team_ids)
+    except (json.JSONDecodeError, KeyError, ValueError, TypeError) as e:
+        print(f"Warning: Using the default team list, {team_data_path} is unreadable. Reason: {e}")
+        return dict(team_id_map), dict(team_ids)
+    registry = dict(sorted(registry.items()))
+    return registry, {name: team_id for team_id, name in registry.items()}
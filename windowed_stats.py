@@ -0,0 +1,222 @@
+import argparse
+import json
+
+from atomic_files import dump_json_atomic
+from match_store import load_match_store, reuse_or_rebuild
+from predictions import team_esely
+
+# Rolling-window and exponentially decayed both-teams-scored statistics.
+#
+# Every team and head-to-head pairing keeps a ring of its running both-scored count
+# after each of its last MAX_WINDOW matches, so the count over its last N matches is a
+# difference of two ring slots for any N up to MAX_WINDOW. Decayed counts are running
+# sums multiplied by a per-match factor for each configured half-life. Adding a result
+# is O(1) per team and the window can be picked per query without recomputing anything.
+
+MAX_WINDOW = 200
+# Half-lives, in matches of the team (or the pairing), of the decayed statistics
+HALF_LIVES = (10, 50, 200)
+
+
+# Counters of one team or pairing
+def new_series(max_window, half_lives):
+    return {
+        "played": 0,
+        # Running both-scored count after the team's k-th match, at slot k % (max_window + 1)
+        "ring": [0] * (max_window + 1),
+        # half_life -> [decayed both-scored count, decayed match count]
+        "decayed": {half_life: [0.0, 0.0] for half_life in half_lives},
+    }
+
+
+class WindowedAggregates:
+    def __init__(self, max_window=MAX_WINDOW, half_lives=HALF_LIVES):
+        self.max_window = max_window
+        self.half_lives = tuple(half_lives)
+        self.factors = {half_life: 0.5 ** (1 / half_life) for half_life in self.half_lives}
+        # team_id -> series, in order of first appearance
+        self.teams = {}
+        # (home_id, away_id) -> series
+        self.pairs = {}
+        self.rows = 0
+        self.last_match_id = 0
+
+    def _add(self, series, both_scored):
+        ring = series["ring"]
+        size = len(ring)
+        played = series["played"]
+        ring[(played + 1) % size] = ring[played % size] + both_scored
+        series["played"] = played + 1
+        for half_life, totals in series["decayed"].items():
+            factor = self.factors[half_life]
+            totals[0] = totals[0] * factor + both_scored
+            totals[1] = totals[1] * factor + 1
+
+    def _series(self, table, key):
+        series = table.get(key)
+        if series is None:
+            series = table[key] = new_series(self.max_window, self.half_lives)
+        return series
+
+    # Fold a single match into the aggregates
+    def add_match(self, match_id, home_id, away_id, home_goals, away_goals):
+        both_scored = 1 if home_goals > 0 and away_goals > 0 else 0
+        self._add(self._series(self.teams, home_id), both_scored)
+        self._add(self._series(self.teams, away_id), both_scored)
+        self._add(self._series(self.pairs, (home_id, away_id)), both_scored)
+        self.rows += 1
+        self.last_match_id = match_id
+
+    def add_matches(self, matches):
+        for match in matches:
+            self.add_match(*match)
+
+    # (both-scored count, match count) of a series over its last `window` matches,
+    # or decayed with `half_life`; the whole history when neither is given
+    def _counts(self, series, window=None, half_life=None):
+        if half_life is not None:
+            if half_life not in series["decayed"]:
+                raise ValueError(f"Half-life {half_life} is not tracked, choose one of {self.half_lives}")
+            return tuple(series["decayed"][half_life])
+        ring = series["ring"]
+        played = series["played"]
+        if window is None:
+            # The running count is the full-history count
+            return ring[played % len(ring)], played
+        if window < 1:
+            raise ValueError(f"Window {window} must be at least one match")
+        if window > self.max_window:
+            raise ValueError(f"Window {window} is longer than the {self.max_window} matches kept")
+        window = min(window, played)
+        return ring[played % len(ring)] - ring[(played - window) % len(ring)], window
+
+    # {team_id: {"OMSZ": n, "MCSGM": n}} over the chosen window, usable with predictions.team_esely
+    def team_counts(self, window=None, half_life=None):
+        counts = {}
+        for team_id, series in self.teams.items():
+            both_score, played = self._counts(series, window, half_life)
+            counts[team_id] = {"OMSZ": played, "MCSGM": both_score}
+        return counts
+
+    # Share of the pairing's meetings where both teams scored, 0 if it was never played
+    def pair_percentage(self, home_id, away_id, window=None, half_life=None):
+        series = self.pairs.get((home_id, away_id))
+        if series is None:
+            return 0
+        both_score, played = self._counts(series, window, half_life)
+        return both_score / played * 100 if played > 0 else 0
+
+    def to_dict(self):
+        def series_dict(series):
+            return {"played": series["played"], "ring": series["ring"],
+                    "decayed": [[half_life, totals] for half_life, totals in series["decayed"].items()]}
+
+        return {
+            "rows": self.rows,
+            "last_match_id": self.last_match_id,
+            "max_window": self.max_window,
+            "half_lives": list(self.half_lives),
+            "teams": [[team_id, series_dict(series)] for team_id, series in self.teams.items()],
+            "pairs": [[home_id, away_id, series_dict(series)] for (home_id, away_id), series in self.pairs.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        aggregates = cls(int(data["max_window"]), data["half_lives"])
+
+        def series_from(series):
+            ring = [int(count) for count in series["ring"]]
+            if len(ring) != aggregates.max_window + 1:
+                raise ValueError("ring size does not match the window")
+            return {"played": int(series["played"]), "ring": ring,
+                    "decayed": {half_life: [float(both_score), float(played)]
+                                for half_life, (both_score, played) in series["decayed"]}}
+
+        aggregates.rows = int(data["rows"])
+        aggregates.last_match_id = int(data["last_match_id"])
+        for team_id, series in data["teams"]:
+            aggregates.teams[int(team_id)] = series_from(series)
+        for home_id, away_id, series in data["pairs"]:
+            aggregates.pairs[(int(home_id), int(away_id))] = series_from(series)
+        return aggregates
+
+
+# Head-to-head lookups over a window, with the BttsMatrix.percentage interface
+class WindowedHeadToHead:
+    def __init__(self, aggregates, window=None, half_life=None):
+        self.aggregates = aggregates
+        self.window = window
+        self.half_life = half_life
+
+    def percentage(self, home_id, away_id):
+        return self.aggregates.pair_percentage(home_id, away_id, self.window, self.half_life)
+
+    def percentages(self, pairs):
+        return [self.percentage(home_id, away_id) for home_id, away_id in pairs]
+
+
+def load_windowed_snapshot(file_path, max_window=MAX_WINDOW, half_lives=HALF_LIVES):
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            aggregates = WindowedAggregates.from_dict(json.load(f))
+    except FileNotFoundError:
+        return WindowedAggregates(max_window, half_lives)
+    except (json.JSONDecodeError, KeyError, ValueError, TypeError) as e:
+        print(f"Warning: Ignoring unreadable windowed snapshot {file_path}. Reason: {e}")
+        return WindowedAggregates(max_window, half_lives)
+    if aggregates.max_window != max_window or aggregates.half_lives != tuple(half_lives):
+        print("Warning: Window settings changed. Rebuilding windowed statistics from scratch.")
+        return WindowedAggregates(max_window, half_lives)
+    return aggregates
+
+
+def save_windowed_snapshot(aggregates, file_path):
+    dump_json_atomic(aggregates.to_dict(), file_path)
+
+
+# Bring the windowed snapshot for a formatted_results.json up to date and return it
+def update_windowed_snapshot(formatted_results_path, snapshot_path, max_window=MAX_WINDOW, half_lives=HALF_LIVES):
+    loaded = load_windowed_snapshot(snapshot_path, max_window, half_lives)
+    previous_rows = loaded.rows
+    with load_match_store(formatted_results_path) as matches:
+        aggregates = reuse_or_rebuild(loaded, matches, lambda: WindowedAggregates(max_window, half_lives),
+                                      "windowed snapshot")
+        aggregates.add_matches(matches.iter_from(aggregates.rows))
+    if aggregates is not loaded or aggregates.rows != previous_rows:
+        try:
+            save_windowed_snapshot(aggregates, snapshot_path)
+        except IOError as e:
+            print(f"Error: Could not save windowed snapshot to {snapshot_path}. Reason: {e}")
+    return aggregates
+
+
+# Esély per team and the head-to-head lookups of a formatted_results.json over the last
+# `window` matches or decayed with `half_life`
+def windowed_features(formatted_results_path, snapshot_path, window=None, half_life=None):
+    windowed = update_windowed_snapshot(formatted_results_path, snapshot_path)
+    return team_esely(windowed.team_counts(window, half_life)), WindowedHeadToHead(windowed, window, half_life)
+
+
+# argparse type for a window of 1 to MAX_WINDOW matches
+def window_length(value):
+    window = int(value)
+    if not 1 <= window <= MAX_WINDOW:
+        raise argparse.ArgumentTypeError(f"{value} is not a window of 1 to {MAX_WINDOW} matches")
+    return window
+
+
+# --window and --half-life, which exclude each other; returns their group
+def add_window_arguments(parser):
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--window", type=window_length, help="only use the last N matches of each team and pairing")
+    group.add_argument("--half-life", type=int, choices=HALF_LIVES,
+                       help="weigh matches with this half-life (in matches) instead")
+    return group
+
+
+# (window, half_life) of a plain script's command line, None for those not given
+def script_window():
+    parser = argparse.ArgumentParser(add_help=False)
+    add_window_arguments(parser)
+    args, _ = parser.parse_known_args()
+    return args.window, args.half_life